@@ -1,21 +1,207 @@
-"""Chart agent: generates chart configuration JSON from query results."""
+"""Chart agent: generates chart configuration JSON from query results.
+
+Most result sets have an obvious chart (one label column, one measure), so
+``build_chart`` derives it locally from column types and cardinality. The LLM
+chain is only a fallback for shapes the heuristics aren't sure about, and even
+then the ``data`` array is filled from the full result set, never echoed back
+by the model.
+"""
+
+import re
 
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 
+from app.agents.llm import chat_model
 from app.config import settings
 from app.rag.prompts import CHART_GENERATION_PROMPT
 
 _prompt = ChatPromptTemplate.from_template(CHART_GENERATION_PROMPT)
-_llm = ChatOpenAI(model=settings.openai_model, api_key=settings.openai_api_key, temperature=0)
+_llm = chat_model(settings.chart_model_tier)
 
 chart_chain = _prompt | _llm | JsonOutputParser()
 
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Human-readable labels for the columns that show up most in charts
+COLUMN_LABELS = {
+    "train_vs_truck_co2e_reduction_percent": "CO2 reduction vs truck (%)",
+    "truck_emission_co2e_wtw_ton": "Truck CO2e (t)",
+    "train_emission_co2e_wtw_ton": "Train CO2e (t)",
+    "transit_hours": "Transit time (h)",
+    "transit_time_hours": "Transit time (h)",
+    "total_distance": "Total distance (km)",
+    "distance": "Distance (km)",
+    "operator_name": "Operator",
+    "from_terminal_city": "Origin",
+    "to_terminal_city": "Destination",
+    "from_terminal_country": "Origin country",
+    "to_terminal_country": "Destination country",
+    "route": "Route",
+}
+
+# Columns that are numeric but never meaningful as a chart measure
+_IGNORED_COLUMNS = re.compile(
+    r"(^|_)(uid|id|latitude|longitude|lat|lon|lng|hash_key|sequence_number)$"
+    r"|iso_weekday$|^capacities_left$"
+)
+
+# Question words that point at a specific measure, in priority order, and the
+# snake_case tokens of the columns that hold it
+_MEASURE_HINTS = [
+    (
+        re.compile(r"\b(?:co2|emissions?|green(?:er|est)?|eco|carbon|sav(?:e[sd]?|ings?))\b"),
+        ("co2e_reduction", "emission", "co2"),
+    ),
+    (
+        re.compile(r"\b(?:fast(?:er|est)?|slow(?:er|est)?|transit|time|hours?|duration)\b"),
+        ("transit",),
+    ),
+    (re.compile(r"\b(?:distances?|far(?:ther|thest)?|long(?:er|est)?|km)\b"), ("distance",)),
+    (
+        re.compile(r"\b(?:how many|count|number|busiest|most)\b"),
+        ("count", "trains", "routes", "total"),
+    ),
+]
+
+_PIE_WORDS = ("share", "proportion", "breakdown", "distribution", "percentage of", "split")
+
+MAX_CATEGORIES = 60
+
+
+def _label(column: str) -> str:
+    return COLUMN_LABELS.get(column, column.replace("_", " ").capitalize())
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, int | float) and not isinstance(value, bool)
+
+
+def _classify_columns(results: list[dict]) -> tuple[list[str], list[str]]:
+    """Split columns into (categorical, numeric), skipping ids, coordinates and flags."""
+    categorical, numeric = [], []
+    for column in results[0]:
+        values = [r.get(column) for r in results if r.get(column) is not None]
+        if not values or _IGNORED_COLUMNS.search(column):
+            continue
+        if all(_is_number(v) for v in values):
+            # 0/1 columns are cargo flags, not measures
+            if not set(values) <= {0, 1}:
+                numeric.append(column)
+        elif all(isinstance(v, str) for v in values):
+            categorical.append(column)
+    return categorical, numeric
+
+
+def _has_tokens(column: str, part: str) -> bool:
+    """Whether ``part``'s snake_case words appear in a row in ``column``'s."""
+    words, wanted = column.lower().split("_"), part.split("_")
+    return any(
+        words[i : i + len(wanted)] == wanted for i in range(len(words) - len(wanted) + 1)
+    )
+
+
+def _pick_measure(question: str, numeric: list[str]) -> str | None:
+    q = question.lower()
+    for keywords, column_parts in _MEASURE_HINTS:
+        if keywords.search(q):
+            for part in column_parts:
+                for column in numeric:
+                    if _has_tokens(column, part):
+                        return column
+    # A column named in the question wins; otherwise a single measure is unambiguous
+    for column in numeric:
+        if column.lower().replace("_", " ") in q:
+            return column
+    return numeric[0] if len(numeric) == 1 else None
+
+
+def _pick_category(question: str, results: list[dict], categorical: list[str]) -> str | None:
+    """Choose the label column: weekdays first, then the most distinctive text column."""
+    q = question.lower()
+    best, best_score = None, -1.0
+    for column in categorical:
+        distinct = {r.get(column) for r in results}
+        if len(distinct) < 2 or len(distinct) > MAX_CATEGORIES:
+            continue
+        if distinct <= set(WEEKDAYS) | {None}:
+            return column
+        score = len(distinct) / len(results)
+        if _label(column).lower() in q or column.replace("_", " ") in q:
+            score += 1.0
+        if score > best_score:
+            best, best_score = column, score
+    return best
+
+
+def build_chart(question: str, results: list[dict]) -> dict | None:
+    """Build a chart config from result shape, or return ``None`` when unsure."""
+    if len(results) < 2:
+        return None
+
+    if "from_terminal_city" in results[0] and "to_terminal_city" in results[0]:
+        # Origin/destination pairs read better as a single "A → B" label
+        results = [
+            {"route": f"{r['from_terminal_city']} → {r['to_terminal_city']}", **r}
+            for r in results
+        ]
+
+    categorical, numeric = _classify_columns(results)
+    y_key = _pick_measure(question, numeric)
+    if y_key is None:
+        return None
+
+    x_key = _pick_category(question, results, categorical)
+    if x_key is None:
+        # No label column: two measures make a scatter, anything else is a guess
+        others = [c for c in numeric if c != y_key]
+        if len(others) != 1:
+            return None
+        x_key, chart_type = others[0], "scatter"
+        rows = results
+    else:
+        rows = [r for r in results if r.get(x_key) is not None and r.get(y_key) is not None]
+        if len({r[x_key] for r in rows}) != len(rows):
+            # Repeated labels (e.g. several trains per city) don't chart as bars
+            return None
+        is_weekday = {r[x_key] for r in rows} <= set(WEEKDAYS)
+        if is_weekday:
+            rows = sorted(rows, key=lambda r: WEEKDAYS.index(r[x_key]))
+            chart_type = "line"
+        elif any(w in question.lower() for w in _PIE_WORDS) and len(rows) <= 8:
+            chart_type = "pie"
+        else:
+            chart_type = "bar"
+
+    data = [
+        {
+            x_key: r.get(x_key),
+            y_key: round(r[y_key], 2) if _is_number(r.get(y_key)) else r.get(y_key),
+        }
+        for r in rows
+    ]
+    return {
+        "chart_type": chart_type,
+        "title": f"{_label(y_key)} by {_label(x_key).lower()}",
+        "x_key": x_key,
+        "y_key": y_key,
+        "data": data,
+        "x_label": _label(x_key),
+        "y_label": _label(y_key),
+    }
+
+
+async def generate_chart(question: str, results: str, rows: list[dict] | None = None) -> dict:
+    """Generate a chart configuration from query results using the LLM.
 
-async def generate_chart(question: str, results: str) -> dict:
-    """Generate a chart configuration from query results."""
-    return await chart_chain.ainvoke({
+    When ``rows`` is given, the chart ``data`` is taken from it rather than
+    from the model's output.
+    """
+    chart = await chart_chain.ainvoke({
         "question": question,
         "results": results,
     })
+    if rows is not None:
+        keys = [k for k in (chart.get("x_key"), chart.get("y_key")) if k]
+        chart["data"] = [{k: r.get(k) for k in keys} for r in rows]
+    return chart
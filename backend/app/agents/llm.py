@@ -0,0 +1,357 @@
+"""Shared LLM client: model tiers, usage accounting and one pooled HTTP client.
+
+Every agent builds its chat model with ``chat_model()``, so all OpenAI calls go
+through a single keep-alive ``httpx.AsyncClient``. Its transport
+(``ResilientTransport``) handles the policy that the OpenAI SDK would
+otherwise apply per model:
+
+- a deadline for each call to get its response headers, across all attempts
+  (streamed bodies are then bounded by the client's read timeout);
+- retries with jittered exponential backoff on connection errors, timeouts,
+  429 and 5xx, honouring ``Retry-After``;
+- optional hedging: if no response has arrived after the recent p95 latency,
+  a duplicate request is sent and whichever answers first is used.
+
+``OPENAI_BASE_URL`` points the client at any OpenAI-compatible server, and
+tests pass an ``httpx.MockTransport`` in its place.
+
+Models come in two tiers: ``small`` (``OPENAI_SMALL_MODEL``) for routine
+steps and ``large`` (``OPENAI_MODEL``) for hard ones; each agent's tier is a
+setting. Calls are tallied per tier (latency, tokens and cost from
+``LLM_PRICES``) by a callback attached to every model, which also reports
+each call to ``app.telemetry``.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Literal
+from uuid import UUID
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_openai import ChatOpenAI
+
+from app.config import settings
+from app.telemetry import record_llm_call
+
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Latencies (seconds to response headers) used for the p95 estimate
+_LATENCY_WINDOW = 200
+_MAX_RETRY_AFTER_SECONDS = 10.0
+
+Tier = Literal["small", "large"]
+
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """Wraps a pooled transport with per-call deadlines, retries and hedging."""
+
+    def __init__(
+        self,
+        inner: httpx.AsyncBaseTransport,
+        deadline_seconds: float = 60.0,
+        max_retries: int = 2,
+        retry_base_seconds: float = 0.5,
+        hedge: bool = False,
+        hedge_min_samples: int = 20,
+    ) -> None:
+        self.inner = inner
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies: deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    def hedge_delay(self) -> float | None:
+        """Seconds to wait before sending a duplicate, or ``None`` to not hedge."""
+        if not self.hedge or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return _percentile(self.latencies, 0.95)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            async with asyncio.timeout(self.deadline_seconds):
+                return await self._with_retries(request)
+        except TimeoutError:
+            self.failures += 1
+            raise httpx.ReadTimeout(
+                f"No response within {self.deadline_seconds:g}s", request=request
+            ) from None
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    async def _with_retries(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        attempt = 0
+        while True:
+            try:
+                response = await self._hedged(request)
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                delay = None
+            else:
+                if response.status_code not in _RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_after(response)
+                await response.aclose()
+            attempt += 1
+            self.retries += 1
+            if delay is None:
+                delay = self.retry_base_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> float | None:
+        try:
+            return min(float(response.headers["retry-after"]), _MAX_RETRY_AFTER_SECONDS)
+        except (KeyError, ValueError):
+            return None
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        # A fresh copy per attempt, so a hedge never shares a request stream
+        copy = httpx.Request(
+            request.method,
+            request.url,
+            headers=request.headers,
+            content=request.content,
+            extensions=request.extensions,
+        )
+        response = await self.inner.handle_async_request(copy)
+        if response.status_code < 400:
+            self.latencies.append(time.perf_counter() - start)
+        return response
+
+    async def _hedged(self, request: httpx.Request) -> httpx.Response:
+        delay = self.hedge_delay()
+        primary = asyncio.ensure_future(self._send(request))
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self.hedges += 1
+        backup = asyncio.ensure_future(self._send(request))
+        attempts = [primary, backup]
+        try:
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                answered = [t for t in attempts if t in done and t.exception() is None]
+                if answered:
+                    for extra in answered[1:]:
+                        await extra.result().aclose()
+                    if answered[0] is backup:
+                        self.hedge_wins += 1
+                    return answered[0].result()
+            # Both attempts failed: raise the primary's error
+            return primary.result()
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failures": self.failures,
+            "p50_ms": 1000 * _percentile(self.latencies, 0.5),
+            "p95_ms": 1000 * _percentile(self.latencies, 0.95),
+        }
+
+
+def _connection_pool() -> httpx.AsyncHTTPTransport:
+    return httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_connections,
+            keepalive_expiry=60.0,
+        ),
+    )
+
+
+def build_transport(inner: httpx.AsyncBaseTransport | None = None) -> ResilientTransport:
+    """A ``ResilientTransport`` configured from settings.
+
+    ``inner`` defaults to a keep-alive connection pool; tests pass a mock.
+    """
+    return ResilientTransport(
+        inner or _connection_pool(),
+        deadline_seconds=settings.llm_deadline_seconds,
+        max_retries=settings.llm_max_retries,
+        retry_base_seconds=settings.llm_retry_base_seconds,
+        hedge=settings.llm_hedge,
+        hedge_min_samples=settings.llm_hedge_min_samples,
+    )
+
+
+_client: httpx.AsyncClient | None = None
+_transport: ResilientTransport | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The process-wide client shared by every chat model, created on first use."""
+    global _client, _transport
+    if _client is None or _client.is_closed:
+        _transport = build_transport()
+        _client = httpx.AsyncClient(
+            transport=_transport, timeout=httpx.Timeout(settings.llm_deadline_seconds)
+        )
+    return _client
+
+
+def current_transport() -> ResilientTransport | None:
+    """Return the shared transport if the client exists (for stats)."""
+    return _transport
+
+
+def use_transport(inner: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+    """Send the shared client's requests through ``inner``; returns the one it replaces.
+
+    The chat models hold the client itself, so swapping what is under the
+    resilience layer is how the benchmark points every agent at a fake server.
+    """
+    get_http_client()
+    previous, _transport.inner = _transport.inner, inner
+    return previous
+
+
+async def close_http_client() -> None:
+    """Close the shared client's connections at shutdown.
+
+    The chat models are built at import and keep the client for the life of
+    the process, so the client stays open and only the connection pool under
+    it is replaced; the next request opens new connections.
+    """
+    if _transport is not None:
+        inner, _transport.inner = _transport.inner, _connection_pool()
+        await inner.aclose()
+
+
+def model_name(tier: Tier) -> str:
+    return settings.openai_small_model if tier == "small" else settings.openai_model
+
+
+class TierUsage(BaseCallbackHandler):
+    """Latency, token and cost totals for the calls made on one model tier."""
+
+    run_inline = True
+
+    def __init__(self, tier: Tier, model: str) -> None:
+        self.tier = tier
+        self.model = model
+        self._started: dict[UUID, float] = {}
+        self.latencies: deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self.calls = 0
+        self.errors = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs) -> None:
+        seconds = self._elapsed(run_id)
+        self.latencies.append(seconds)
+        self.calls += 1
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    input_tokens += usage.get("input_tokens", 0)
+                    output_tokens += usage.get("output_tokens", 0)
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        record_llm_call(self.model, seconds, input_tokens, output_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self.errors += 1
+        record_llm_call(self.model, self._elapsed(run_id), 0, 0, error=True)
+
+    def _elapsed(self, run_id: UUID) -> float:
+        started = self._started.pop(run_id, None)
+        return time.perf_counter() - started if started is not None else 0.0
+
+    @property
+    def cost_usd(self) -> float:
+        input_price, output_price = settings.llm_prices.get(self.model, (0.0, 0.0))
+        return (self.input_tokens * input_price + self.output_tokens * output_price) / 1e6
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_ms": 1000 * _percentile(self.latencies, 0.5),
+            "p95_ms": 1000 * _percentile(self.latencies, 0.95),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": round(self.cost_usd, 8),
+        }
+
+
+_usage: dict[Tier, TierUsage] = {}
+
+
+def tier_usage(tier: Tier) -> TierUsage:
+    """The usage tally for ``tier``, created on first use."""
+    if tier not in _usage:
+        _usage[tier] = TierUsage(tier, model_name(tier))
+    return _usage[tier]
+
+
+def usage_stats() -> dict:
+    return {tier: usage.stats() for tier, usage in _usage.items()}
+
+
+def chat_model(
+    tier: Tier = "large", temperature: float = 0, http_client: httpx.AsyncClient | None = None
+) -> ChatOpenAI:
+    """A chat model for ``tier`` on the shared client.
+
+    Retries are the transport's, not the SDK's, and streamed calls report
+    their token usage so the tier's accounting covers them too.
+    """
+    return ChatOpenAI(
+        model=model_name(tier),
+        api_key=settings.openai_api_key,
+        base_url=settings.openai_base_url or None,
+        temperature=temperature,
+        timeout=settings.llm_deadline_seconds,
+        max_retries=0,
+        stream_usage=True,
+        http_async_client=http_client or get_http_client(),
+        callbacks=[tier_usage(tier)],
+    )
@@ -1,21 +1,121 @@
-"""Map agent: generates GeoJSON from query results containing coordinates."""
+"""Map agent: builds GeoJSON from query results without an LLM call.
 
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+Rows are joined to the in-memory terminal registry by uid or city, so every
+coordinate on the map comes from the terminals table. Terminals become Point
+features and ``from``→``to`` legs become LineStrings, deduplicated so result
+sets with thousands of rows still produce a compact FeatureCollection.
+"""
 
-from app.config import settings
-from app.rag.prompts import MAP_GENERATION_PROMPT
+from app.geo.terminals import Terminal, TerminalRegistry, get_terminal_registry
 
-_prompt = ChatPromptTemplate.from_template(MAP_GENERATION_PROMPT)
-_llm = ChatOpenAI(model=settings.openai_model, api_key=settings.openai_api_key, temperature=0)
+# Columns that let a row be placed on the map
+GEO_COLUMNS = {
+    "latitude",
+    "longitude",
+    "from_terminal_uid",
+    "to_terminal_uid",
+    "from_terminal_city",
+    "to_terminal_city",
+    "terminal_uid",
+    "city",
+}
 
-map_chain = _prompt | _llm | JsonOutputParser()
+# Row fields copied onto route features when present
+_ROUTE_PROPERTIES = (
+    "operator_name",
+    "transit_hours",
+    "transit_time_hours",
+    "distance",
+    "train_vs_truck_co2e_reduction_percent",
+)
 
 
-async def generate_map(question: str, results: str) -> dict:
-    """Generate GeoJSON from query results with coordinates."""
-    return await map_chain.ainvoke({
-        "question": question,
-        "results": results,
-    })
+def has_geo_columns(results: list[dict]) -> bool:
+    """Whether the results carry anything that can be placed on a map."""
+    return bool(results) and not GEO_COLUMNS.isdisjoint(results[0])
+
+
+def _point(lat: float, lon: float, properties: dict) -> dict:
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [round(lon, 6), round(lat, 6)]},
+        "properties": properties,
+    }
+
+
+def _terminal_properties(t: Terminal) -> dict:
+    return {"name": t.name, "city": t.city, "country": t.country, "uid": t.uid}
+
+
+def _locate(
+    registry: TerminalRegistry, uid: str | None, city: str | None
+) -> tuple[tuple[float, float], dict] | None:
+    """Resolve a terminal uid (preferred) or city name to coordinates and properties."""
+    terminal = registry.get(uid)
+    if terminal:
+        return (terminal.latitude, terminal.longitude), _terminal_properties(terminal)
+    location = registry.city_location(city)
+    if location:
+        known = registry.in_city(city)[0]
+        return location, {"name": known.city, "city": known.city, "country": known.country}
+    return None
+
+
+def build_geojson(results: list[dict], registry: TerminalRegistry) -> dict | None:
+    """Turn result rows into a FeatureCollection, or ``None`` if nothing is locatable."""
+    points: dict[tuple[float, float], dict] = {}
+    routes: dict[tuple, dict] = {}
+
+    for row in results:
+        origin = _locate(registry, row.get("from_terminal_uid"), row.get("from_terminal_city"))
+        destination = _locate(registry, row.get("to_terminal_uid"), row.get("to_terminal_city"))
+
+        if origin and destination:
+            (start, start_props), (end, end_props) = origin, destination
+            points.setdefault(start, start_props)
+            points.setdefault(end, end_props)
+            route = routes.get((start, end))
+            if route is None:
+                route = routes[(start, end)] = {
+                    "type": "Feature",
+                    "geometry": {
+                        "type": "LineString",
+                        "coordinates": [
+                            [round(start[1], 6), round(start[0], 6)],
+                            [round(end[1], 6), round(end[0], 6)],
+                        ],
+                    },
+                    "properties": {
+                        "name": f"{start_props['city']} → {end_props['city']}",
+                        "trains": 0,
+                        **{k: row[k] for k in _ROUTE_PROPERTIES if row.get(k) is not None},
+                    },
+                }
+            route["properties"]["trains"] += 1
+            continue
+
+        for located in (origin, destination):
+            if located:
+                points.setdefault(*located)
+
+        lat, lon = row.get("latitude"), row.get("longitude")
+        if isinstance(lat, int | float) and isinstance(lon, int | float):
+            props = {k: v for k, v in row.items() if k not in ("latitude", "longitude")}
+            points.setdefault((lat, lon), props)
+        elif not (origin or destination):
+            located = _locate(registry, row.get("terminal_uid") or row.get("uid"), row.get("city"))
+            if located:
+                points.setdefault(*located)
+
+    if not points and not routes:
+        return None
+
+    features = list(routes.values())
+    features.extend(_point(lat, lon, props) for (lat, lon), props in points.items())
+    return {"type": "FeatureCollection", "features": features}
+
+
+async def generate_map(question: str, results: list[dict]) -> dict | None:
+    """Generate GeoJSON for the full result set from terminal coordinates."""
+    registry = await get_terminal_registry()
+    return build_geojson(results, registry)
@@ -1,21 +1,30 @@
 """Markdown summary agent: formats query results as readable markdown."""
 
+from collections.abc import Callable
+
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 
+from app.agents.llm import chat_model
 from app.config import settings
 from app.rag.prompts import MARKDOWN_SUMMARY_PROMPT
 
 _prompt = ChatPromptTemplate.from_template(MARKDOWN_SUMMARY_PROMPT)
-_llm = ChatOpenAI(model=settings.openai_model, api_key=settings.openai_api_key, temperature=0.3)
+_llm = chat_model(settings.markdown_model_tier, temperature=0.3)
 
 markdown_chain = _prompt | _llm | StrOutputParser()
 
 
-async def generate_markdown(question: str, results: str) -> str:
-    """Generate a markdown summary of query results."""
-    return await markdown_chain.ainvoke({
+async def generate_markdown(
+    question: str, results: str, on_token: Callable[[str], None] | None = None
+) -> str:
+    """Generate a markdown summary of query results, passing each token to ``on_token``."""
+    parts = []
+    async for token in markdown_chain.astream({
         "question": question,
         "results": results,
-    })
+    }):
+        parts.append(token)
+        if on_token:
+            on_token(token)
+    return "".join(parts)
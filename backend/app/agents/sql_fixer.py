@@ -2,14 +2,14 @@
 
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 
+from app.agents.llm import chat_model
 from app.config import settings
 from app.rag.prompts import SQL_FIX_PROMPT
 from app.rag.schema import STATIC_SCHEMA
 
 _prompt = ChatPromptTemplate.from_template(SQL_FIX_PROMPT)
-_llm = ChatOpenAI(model=settings.openai_model, api_key=settings.openai_api_key, temperature=0)
+_llm = chat_model(settings.sql_fix_model_tier)
 
 sql_fix_chain = _prompt | _llm | StrOutputParser()
 
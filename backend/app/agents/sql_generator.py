@@ -1,22 +1,45 @@
 """SQL generation agent: translates natural language to PostgreSQL queries."""
 
+from collections.abc import Callable
+
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 
+from app.agents.llm import Tier, chat_model
 from app.config import settings
+from app.rag.examples import SEED_EXAMPLES, render_examples
 from app.rag.prompts import SQL_GENERATION_PROMPT
 from app.rag.schema import STATIC_SCHEMA
 
 _prompt = ChatPromptTemplate.from_template(SQL_GENERATION_PROMPT)
-_llm = ChatOpenAI(model=settings.openai_model, api_key=settings.openai_api_key, temperature=0)
+# One chain per tier; the workflow escalates to "large" when "small" falls short
+sql_generation_chains = {
+    tier: _prompt | chat_model(tier) | StrOutputParser() for tier in ("small", "large")
+}
+
+
+_SEED_EXAMPLES_TEXT = render_examples(SEED_EXAMPLES)
 
-sql_generation_chain = _prompt | _llm | StrOutputParser()
 
+async def generate_sql(
+    question: str,
+    schema: str | None = None,
+    examples: str | None = None,
+    on_token: Callable[[str], None] | None = None,
+    tier: Tier | None = None,
+) -> str:
+    """Generate a SQL query from a natural language question, streaming it to ``on_token``.
 
-async def generate_sql(question: str, schema: str | None = None) -> str:
-    """Generate a SQL query from a natural language question."""
-    return await sql_generation_chain.ainvoke({
+    ``tier`` defaults to ``settings.sql_model_tier``.
+    """
+    parts = []
+    chain = sql_generation_chains[tier or settings.sql_model_tier]
+    async for token in chain.astream({
         "question": question,
         "schema": schema or STATIC_SCHEMA,
-    })
+        "examples": examples or _SEED_EXAMPLES_TEXT,
+    }):
+        parts.append(token)
+        if on_token:
+            on_token(token)
+    return "".join(parts)
@@ -1,14 +1,13 @@
-"""API key authentication and rate limiting for the chat endpoint."""
+"""API key authentication and rate limiting for the chat and stats endpoints."""
 
-import time
-from collections import defaultdict
+import hashlib
+import hmac
+import math
 
 from fastapi import HTTPException, Request
 
 from app.config import settings
-
-# In-memory rate limiter: IP -> list of request timestamps
-_request_log: dict[str, list[float]] = defaultdict(list)
+from app.ratelimit import get_rate_limiter
 
 
 def verify_api_key(request: Request) -> None:
@@ -21,24 +20,33 @@ def verify_api_key(request: Request) -> None:
         raise HTTPException(status_code=401, detail="Invalid or missing API key")
 
 
-def check_rate_limit(request: Request) -> None:
-    """Enforce per-IP rate limiting (sliding window, 1 minute)."""
-    limit = settings.rate_limit_rpm
-    if limit <= 0:
-        return
+def _client_identity(request: Request) -> tuple[str, int]:
+    """The rate limit key and requests-per-minute for this request.
 
+    Requests carrying the configured API key share one budget wherever they
+    come from; anonymous requests are limited per client IP.
+    """
+    key = request.headers.get("X-API-Key", "")
+    if settings.api_secret_key and hmac.compare_digest(
+        key.encode(), settings.api_secret_key.encode()
+    ):
+        digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+        return f"key:{digest}", settings.rate_limit_key_rpm
     ip = request.client.host if request.client else "unknown"
-    now = time.monotonic()
-    window = 60.0
+    return f"ip:{ip}", settings.rate_limit_rpm
 
-    # Prune old entries
-    timestamps = _request_log[ip]
-    _request_log[ip] = [t for t in timestamps if now - t < window]
 
-    if len(_request_log[ip]) >= limit:
+def check_rate_limit(request: Request) -> None:
+    """Enforce the per-client rate limit (GCRA, see ``app.ratelimit``)."""
+    identity, limit = _client_identity(request)
+    if limit <= 0:
+        return
+
+    burst = settings.rate_limit_burst or limit
+    decision = get_rate_limiter().check(identity, limit, burst)
+    if not decision.allowed:
         raise HTTPException(
             status_code=429,
             detail=f"Rate limit exceeded. Max {limit} requests per minute.",
+            headers={"Retry-After": str(max(1, math.ceil(decision.retry_after)))},
         )
-
-    _request_log[ip].append(now)
@@ -0,0 +1,279 @@
+"""Caches for chat responses and query results.
+
+The response cache is keyed on normalized questions. Entries hold everything
+needed to replay a chat answer (SQL, results and the formatted
+markdown/chart/map) and are stamped with the data version, so a reseed via
+``data/seed.py`` invalidates them. It is an in-memory LRU with a TTL,
+optionally backed by a SQLite file so it survives restarts; the chat route
+calls it through ``asyncio.to_thread`` so those writes stay off the event loop.
+
+The result cache sits under ``app.db``: rows are keyed on canonicalized SQL
+plus parameters, so differently worded questions (or a retry) that produce the
+same query, and repeated data endpoint calls, share one database round-trip.
+It is bounded by an estimate of the rows' memory rather than an entry count,
+and is likewise dropped when the data version changes (noticed within
+``DATA_VERSION_CHECK_SECONDS``). Hits are re-checked against the caller's row
+budget, since chat and data endpoint budgets differ.
+"""
+
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import settings
+from app.sql_tokens import canonical_sql
+
+logger = logging.getLogger(__name__)
+
+CREATE_CACHE_SQL = """
+CREATE TABLE IF NOT EXISTS response_cache (
+    key TEXT PRIMARY KEY,
+    data_version INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    payload TEXT NOT NULL
+)
+"""
+
+
+class ResponseCache:
+    """LRU + TTL cache of workflow outputs with optional SQLite persistence."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, path: str = "") -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[int, float, dict]] = OrderedDict()
+        self._conn: sqlite3.Connection | None = None
+        # Calls come from worker threads; the dict and connection are shared
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path and max_entries > 0:
+            self._open(path)
+
+    def _open(self, path: str) -> None:
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(CREATE_CACHE_SQL)
+        rows = self._conn.execute(
+            "SELECT key, data_version, created_at, payload FROM response_cache "
+            "ORDER BY created_at DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for key, version, created_at, payload in reversed(rows):
+            self._entries[key] = (version, created_at, json.loads(payload))
+        logger.info("Loaded %d cached responses from %s", len(rows), path)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str, data_version: int) -> dict | None:
+        """Return the cached entry for ``key`` if it is fresh and matches the data version."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            version, created_at, entry = item
+            if version != data_version:
+                # The data was reseeded: everything cached before is stale
+                self.clear()
+                self.misses += 1
+                return None
+            if time.time() - created_at > self.ttl_seconds:
+                self._delete(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, data_version: int, entry: dict) -> None:
+        """Store an entry, evicting the least recently used ones beyond capacity."""
+        with self._lock:
+            if not self.enabled:
+                return
+            created_at = time.time()
+            self._entries[key] = (data_version, created_at, entry)
+            self._entries.move_to_end(key)
+            if self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?)",
+                    (key, data_version, created_at, json.dumps(entry)),
+                )
+                self._conn.commit()
+            while len(self._entries) > self.max_entries:
+                oldest, _ = self._entries.popitem(last=False)
+                self.evictions += 1
+                if self._conn:
+                    self._conn.execute("DELETE FROM response_cache WHERE key = ?", (oldest,))
+                    self._conn.commit()
+
+    def _delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self._conn:
+            self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Drop every cached entry (memory and disk)."""
+        with self._lock:
+            self._entries.clear()
+            if self._conn:
+                self._conn.execute("DELETE FROM response_cache")
+                self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def estimate_bytes(rows: list[dict]) -> int:
+    """Approximate memory held by result rows (dicts, values and the list)."""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values())
+    return size
+
+
+class ResultCache:
+    """LRU cache of query results, bounded in bytes and stamped with the data version."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        # Results bigger than this would flush most of the cache for one query
+        self.max_entry_bytes = max_bytes // 16
+        self._entries: OrderedDict[tuple, tuple[list[dict], int]] = OrderedDict()
+        self.data_version: int | None = None
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.skipped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(sql: str, params: tuple | list = ()) -> tuple:
+        return canonical_sql(sql), tuple(params)
+
+    def _check_version(self, data_version: int) -> None:
+        if data_version != self.data_version:
+            if self._entries:
+                self.invalidations += 1
+            self.clear()
+            self.data_version = data_version
+
+    def get(self, key: tuple, data_version: int) -> list[dict] | None:
+        """Cached rows for ``key``, copied so callers can't modify the cached ones."""
+        self._check_version(data_version)
+        item = self._entries.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return [dict(row) for row in item[0]]
+
+    def put(self, key: tuple, data_version: int, rows: list[dict]) -> None:
+        """Store rows, evicting the least recently used results beyond the byte budget."""
+        if not self.enabled:
+            return
+        self._check_version(data_version)
+        size = estimate_bytes(rows)
+        if size > self.max_entry_bytes:
+            self.skipped += 1
+            return
+        previous = self._entries.pop(key, None)
+        if previous:
+            self.bytes -= previous[1]
+        self._entries[key] = ([dict(row) for row in rows], size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "too_large": self.skipped,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_cache: ResponseCache | None = None
+
+
+def init_response_cache() -> ResponseCache:
+    global _cache
+    _cache = ResponseCache(
+        settings.response_cache_size,
+        settings.response_cache_ttl_seconds,
+        settings.response_cache_path,
+    )
+    return _cache
+
+
+def close_response_cache() -> None:
+    global _cache
+    if _cache:
+        _cache.close()
+        _cache = None
+
+
+def get_response_cache() -> ResponseCache | None:
+    """Return the response cache, or ``None`` if it hasn't been initialized."""
+    return _cache
+
+
+_results: ResultCache | None = None
+
+
+def init_result_cache() -> ResultCache:
+    global _results
+    _results = ResultCache(settings.result_cache_bytes)
+    return _results
+
+
+def close_result_cache() -> None:
+    global _results
+    _results = None
+
+
+def get_result_cache() -> ResultCache | None:
+    """Return the result cache, or ``None`` if it hasn't been initialized."""
+    return _results
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic_settings import BaseSettings
 
@@ -8,10 +9,63 @@ _DEFAULT_DB = str(Path(__file__).resolve().parent.parent / "data" / "fr8tools.db
 class Settings(BaseSettings):
     openai_api_key: str = ""
     openai_model: str = "gpt-4o"
+    openai_small_model: str = "gpt-4o-mini"
+    openai_base_url: str = ""
+    sql_model_tier: Literal["small", "large"] = "small"
+    sql_fix_model_tier: Literal["small", "large"] = "large"
+    markdown_model_tier: Literal["small", "large"] = "small"
+    chart_model_tier: Literal["small", "large"] = "small"
+    llm_escalate_empty_results: bool = True
+    # USD per million input/output tokens
+    llm_prices: dict[str, tuple[float, float]] = {
+        "gpt-4o": (2.5, 10.0),
+        "gpt-4o-mini": (0.15, 0.6),
+    }
+    llm_deadline_seconds: float = 60.0
+    llm_max_retries: int = 2
+    llm_retry_base_seconds: float = 0.5
+    llm_hedge: bool = False
+    llm_hedge_min_samples: int = 20
+    llm_max_connections: int = 20
     database_path: str = _DEFAULT_DB
+    db_pool_size: int = 4
+    chat_query_timeout_seconds: float = 5.0
+    chat_query_max_steps: int = 50_000_000
+    chat_query_max_rows: int = 5000
+    chat_query_limit: int = 1000
+    chat_query_max_scan_rows: int = 1000
+    api_query_timeout_seconds: float = 2.0
+    api_query_max_steps: int = 20_000_000
+    api_query_max_rows: int = 1000
+    export_max_concurrent: int = 2
     cors_origins: list[str] = ["http://localhost:3000"]
     api_secret_key: str = ""
     rate_limit_rpm: int = 20
+    rate_limit_key_rpm: int = 60
+    # Requests a client may make at once; 0 means a full minute's worth
+    rate_limit_burst: int = 0
+    rate_limit_max_keys: int = 10_000
+    rate_limit_path: str = ""
+    format_timeout_seconds: float = 20.0
+    response_cache_size: int = 512
+    response_cache_ttl_seconds: float = 3600.0
+    response_cache_path: str = ""
+    result_cache_bytes: int = 64 * 1024 * 1024
+    planner_min_connection_minutes: int = 60
+    planner_transfer_minutes: int = 120
+    planner_transfer_radius_km: float = 30.0
+    planner_cache_size: int = 10_000
+    tile_precompute_max_zoom: int = 6
+    tile_cache_size: int = 4096
+    tile_max_age_seconds: int = 3600
+    data_version_check_seconds: float = 1.0
+    few_shot_size: int = 500
+    few_shot_k: int = 3
+    few_shot_min_score: float = 0.2
+    few_shot_verify_seconds: float = 300.0
+    few_shot_path: str = ""
+    trace_export_path: str = ""
+    trace_export_url: str = ""
     debug: bool = False
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
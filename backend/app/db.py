@@ -1,45 +1,264 @@
+import asyncio
+import sqlite3
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
 import aiosqlite
 
+from app.cache import get_result_cache
 from app.config import settings
+from app.telemetry import DB_QUERY_SECONDS, DB_ROWS, span
+
+
+class ConnectionPool:
+    """A bounded pool of read-only SQLite connections.
+
+    Each aiosqlite connection runs on its own thread, so checking one out per
+    query lets reads proceed in parallel instead of queueing behind a single
+    connection. Connections are opened with ``mode=ro`` and ``query_only`` so
+    nothing executed through the pool can modify the database.
+    """
+
+    def __init__(self, path: str, size: int) -> None:
+        self.path = path
+        self.size = size
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._connections: list[aiosqlite.Connection] = []
+        self.acquisitions = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def open(self) -> None:
+        # An escaped file: URI, so paths with spaces, '?' or '#' open the right file
+        uri = f"{Path(self.path).absolute().as_uri()}?mode=ro"
+        for _ in range(self.size):
+            conn = await aiosqlite.connect(uri, uri=True)
+            conn.row_factory = aiosqlite.Row
+            await conn.execute("PRAGMA query_only=ON")
+            self._connections.append(conn)
+            self._idle.put_nowait(conn)
+
+    async def close(self) -> None:
+        for conn in self._connections:
+            await conn.close()
+        self._connections.clear()
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Check out a connection for the duration of the ``async with`` block."""
+        start = time.perf_counter()
+        if self._idle.empty():
+            self.waits += 1
+        conn = await self._idle.get()
+        waited = time.perf_counter() - start
+        self.acquisitions += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "in_use": self.size - self._idle.qsize(),
+            "acquisitions": self.acquisitions,
+            "waits": self.waits,
+            "avg_wait_ms": 1000 * self.total_wait / self.acquisitions if self.acquisitions else 0.0,
+            "max_wait_ms": 1000 * self.max_wait,
+        }
 
-_db: aiosqlite.Connection | None = None
 
+_pool: ConnectionPool | None = None
+# Last data version read and when (monotonic seconds)
+_version: tuple[int, float] | None = None
 
-async def init_db() -> aiosqlite.Connection:
-    global _db
-    _db = await aiosqlite.connect(settings.database_path)
-    _db.row_factory = aiosqlite.Row
-    await _db.execute("PRAGMA journal_mode=WAL")
-    await _db.execute("PRAGMA foreign_keys=ON")
-    return _db
+
+async def init_db() -> ConnectionPool:
+    global _pool, _version
+    _version = None
+    _pool = ConnectionPool(settings.database_path, max(1, settings.db_pool_size))
+    await _pool.open()
+    return _pool
 
 
 async def close_db() -> None:
-    global _db
-    if _db:
-        await _db.close()
-        _db = None
+    global _pool, _version
+    _version = None
+    if _pool:
+        await _pool.close()
+        _pool = None
 
 
-async def get_db() -> aiosqlite.Connection:
-    if _db is None:
+def get_pool() -> ConnectionPool:
+    if _pool is None:
         raise RuntimeError("Database not initialized. Call init_db() first.")
-    return _db
+    return _pool
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    """Limits applied to a single query: wall-clock time, VM steps and rows."""
+
+    timeout_seconds: float
+    max_steps: int
+    max_rows: int
+
+
+def chat_budget() -> QueryBudget:
+    """Budget for LLM-generated SQL from the chat workflow."""
+    return QueryBudget(
+        settings.chat_query_timeout_seconds,
+        settings.chat_query_max_steps,
+        settings.chat_query_max_rows,
+    )
+
+
+def api_budget() -> QueryBudget:
+    """Budget for the parameterized queries behind the data endpoints."""
+    return QueryBudget(
+        settings.api_query_timeout_seconds,
+        settings.api_query_max_steps,
+        settings.api_query_max_rows,
+    )
 
 
-async def execute_query(sql: str) -> list[dict]:
+class QueryBudgetError(Exception):
+    """Raised when a query runs over its time, step or row budget."""
+
+    def __init__(self, limit: str, budget: QueryBudget) -> None:
+        self.limit = limit
+        self.budget = budget
+        detail = {
+            "timeout": f"ran longer than {budget.timeout_seconds:g}s",
+            "steps": f"needed more than {budget.max_steps:,} VM steps",
+            "rows": f"returned more than {budget.max_rows:,} rows",
+        }[limit]
+        super().__init__(
+            f"Query too expensive: it {detail}. Add WHERE filters on indexed columns "
+            f"(cities, countries, operators), avoid joins without join conditions, "
+            f"aggregate instead of listing raw rows, or add a LIMIT."
+        )
+
+
+# Number of SQLite VM instructions between progress handler calls
+_PROGRESS_INTERVAL = 1000
+_FETCH_CHUNK = 256
+
+
+async def _run_budgeted(
+    conn: aiosqlite.Connection, sql: str, params: tuple | list, budget: QueryBudget
+) -> list[dict]:
+    """Run a query under ``budget``, fetching incrementally and interrupting on overrun."""
+    deadline = time.monotonic() + budget.timeout_seconds
+    max_calls = max(1, budget.max_steps // _PROGRESS_INTERVAL)
+    state = {"calls": 0, "exceeded": None}
+
+    def progress() -> int:
+        # Runs on the connection's thread; a non-zero return interrupts the query
+        state["calls"] += 1
+        if state["calls"] > max_calls:
+            state["exceeded"] = "steps"
+        elif time.monotonic() > deadline:
+            state["exceeded"] = "timeout"
+        return 1 if state["exceeded"] else 0
+
+    await conn.set_progress_handler(progress, _PROGRESS_INTERVAL)
+    try:
+        async with conn.execute(sql, params) as cursor:
+            columns = [d[0] for d in cursor.description]
+            rows: list[dict] = []
+            while chunk := await cursor.fetchmany(_FETCH_CHUNK):
+                rows.extend(dict(zip(columns, row)) for row in chunk)
+                if len(rows) > budget.max_rows:
+                    raise QueryBudgetError("rows", budget)
+            return rows
+    except sqlite3.OperationalError:
+        if state["exceeded"]:
+            raise QueryBudgetError(state["exceeded"], budget) from None
+        raise
+    except asyncio.CancelledError:
+        # The client went away: stop the query on the database thread too
+        await conn.interrupt()
+        raise
+    finally:
+        await conn.set_progress_handler(None, 0)
+
+
+async def _run_cached(sql: str, params: tuple | list, budget: QueryBudget) -> list[dict]:
+    """Serve a query from the result cache, running and caching it on a miss."""
+    start = time.perf_counter()
+    with span("db.query") as current:
+        cache = get_result_cache()
+        if cache is None or not cache.enabled:
+            outcome = "off"
+            async with get_pool().acquire() as db:
+                rows = await _run_budgeted(db, sql, params, budget)
+        else:
+            key = cache.key(sql, params)
+            # Hits skip the pool entirely while the last version read is recent
+            version = await get_data_version(settings.data_version_check_seconds)
+            rows = cache.get(key, version)
+            if rows is not None and len(rows) > budget.max_rows:
+                # Cached under a larger budget than this caller's
+                raise QueryBudgetError("rows", budget)
+            outcome = "hit" if rows is not None else "miss"
+            if rows is None:
+                async with get_pool().acquire() as db:
+                    rows = await _run_budgeted(db, sql, params, budget)
+                cache.put(key, version, rows)
+        current.set(**{"db.statement": sql, "db.rows": len(rows), "db.cache": outcome})
+    DB_QUERY_SECONDS.observe(time.perf_counter() - start, cache=outcome)
+    DB_ROWS.inc(len(rows), cache=outcome)
+    return rows
+
+
+async def execute_query(sql: str, budget: QueryBudget | None = None) -> list[dict]:
     """Execute a read-only SQL query and return results as list of dicts."""
-    db = await get_db()
-    async with db.execute(sql) as cursor:
-        columns = [d[0] for d in cursor.description]
-        rows = await cursor.fetchall()
-        return [dict(zip(columns, row)) for row in rows]
+    return await _run_cached(sql, (), budget or chat_budget())
 
 
-async def execute_parameterized(sql: str, params: tuple | list = ()) -> list[dict]:
+async def execute_parameterized(
+    sql: str, params: tuple | list = (), budget: QueryBudget | None = None
+) -> list[dict]:
     """Execute a parameterized query safely."""
-    db = await get_db()
-    async with db.execute(sql, params) as cursor:
-        columns = [d[0] for d in cursor.description]
-        rows = await cursor.fetchall()
-        return [dict(zip(columns, row)) for row in rows]
+    return await _run_cached(sql, params, budget or api_budget())
+
+
+async def stream_rows(
+    sql: str, params: tuple | list = (), chunk_size: int = _FETCH_CHUNK
+) -> AsyncIterator[list[sqlite3.Row]]:
+    """Yield a query's rows in chunks, for results too large to hold in memory.
+
+    Unlike ``execute_parameterized`` nothing is cached or capped: one pooled
+    connection is held until the iteration ends, and cancelling it interrupts
+    the query.
+    """
+    async with get_pool().acquire() as conn, conn.execute(sql, params) as cursor:
+        try:
+            while chunk := await cursor.fetchmany(chunk_size):
+                yield chunk
+        except asyncio.CancelledError:
+            await conn.interrupt()
+            raise
+
+
+async def get_data_version(max_age: float = 0.0) -> int:
+    """Return the data version stamp, bumped by ``data/seed.py`` on every reload.
+
+    A stamp read less than ``max_age`` seconds ago is reused instead of asking
+    the database again.
+    """
+    global _version
+    now = time.monotonic()
+    if max_age > 0 and _version is not None and now - _version[1] < max_age:
+        return _version[0]
+    async with get_pool().acquire() as db, db.execute("PRAGMA user_version") as cursor:
+        row = await cursor.fetchone()
+    _version = (row[0], now)
+    return row[0]
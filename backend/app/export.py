@@ -0,0 +1,146 @@
+"""Encoders for streaming bulk exports of the trains and terminals tables.
+
+Each encoder turns the row chunks of ``db.stream_rows`` into bytes as they
+arrive, so an export never holds more than one chunk in memory:
+
+- ``ndjson``: one JSON object per line;
+- ``csv``: a header row, then the data;
+- ``arrow``: an Arrow IPC stream, one record batch per chunk;
+- ``parquet``: one row group per chunk, zstd-compressed.
+
+Arrow and Parquet need the optional ``pyarrow`` package
+(``pip install -e ".[export]"``); column types come from the table's
+declared SQLite types. Text formats can be gzipped on the fly with ``gzip_stream``.
+"""
+
+import csv
+import io
+import json
+import zlib
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    media_type: str
+    extension: str
+    # Columnar formats are already compressed and read in larger chunks
+    columnar: bool = False
+
+
+FORMATS = {
+    "ndjson": ExportFormat("application/x-ndjson", "ndjson"),
+    "csv": ExportFormat("text/csv; charset=utf-8", "csv"),
+    "arrow": ExportFormat("application/vnd.apache.arrow.stream", "arrow", columnar=True),
+    "parquet": ExportFormat("application/vnd.apache.parquet", "parquet", columnar=True),
+}
+
+
+class ExportUnavailableError(RuntimeError):
+    """Raised when a format's optional dependency is not installed."""
+
+
+async def encode_ndjson(columns: list[str], chunks: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    async for rows in chunks:
+        lines = (json.dumps(dict(zip(columns, row)), ensure_ascii=False) for row in rows)
+        yield ("\n".join(lines) + "\n").encode()
+
+
+async def encode_csv(columns: list[str], chunks: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode()
+    async for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+
+
+class _Drain(io.RawIOBase):
+    """A write-only file that hands back what was written since the last drain."""
+
+    def __init__(self) -> None:
+        self._parts: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ExportUnavailableError(
+            'Arrow and Parquet exports need pyarrow: pip install -e ".[export]"'
+        ) from None
+    return pyarrow
+
+
+def arrow_schema(columns: list[str], types: dict[str, str]):
+    """An Arrow schema for ``columns`` from their declared SQLite types."""
+    pa = _pyarrow()
+    arrow_types = {"INTEGER": pa.int64(), "REAL": pa.float64()}
+    return pa.schema([(c, arrow_types.get(types.get(c, "").upper(), pa.string())) for c in columns])
+
+
+async def encode_columnar(
+    columns: list[str], types: dict[str, str], chunks: AsyncIterator[list], parquet: bool
+) -> AsyncIterator[bytes]:
+    pa = _pyarrow()
+    schema = arrow_schema(columns, types)
+    sink = _Drain()
+    if parquet:
+        writer = pa.parquet.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    try:
+        async for rows in chunks:
+            arrays = [
+                pa.array([row[i] for row in rows], type=field.type)
+                for i, field in enumerate(schema)
+            ]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def encoder(
+    name: str, columns: list[str], types: dict[str, str]
+) -> Callable[[AsyncIterator[list]], AsyncIterator[bytes]]:
+    """The encoder for format ``name``; raises if its dependency is missing."""
+    if name == "ndjson":
+        return lambda chunks: encode_ndjson(columns, chunks)
+    if name == "csv":
+        return lambda chunks: encode_csv(columns, chunks)
+    _pyarrow()
+    parquet = name == "parquet"
+    return lambda chunks: encode_columnar(columns, types, chunks, parquet)
+
+
+async def gzip_stream(data: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """Gzip a byte stream incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for block in data:
+        if compressed := compressor.compress(block):
+            yield compressed
+    yield compressor.flush()
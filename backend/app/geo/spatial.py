@@ -0,0 +1,147 @@
+"""Grid spatial index over terminal coordinates.
+
+Terminals are bucketed into fixed-size latitude/longitude cells. Radius and
+bounding-box queries only visit the cells that overlap the query area, and
+k-nearest searches expand ring by ring around the query cell until no
+unvisited cell can hold anything closer. With the 508 terminals in the data
+every query touches a handful of cells and finishes in microseconds.
+"""
+
+import heapq
+import math
+from collections.abc import Iterable, Iterator
+from typing import Protocol
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Cell size in degrees; about 55 km north-south
+DEFAULT_CELL_DEGREES = 0.5
+
+
+class Located(Protocol):
+    """Anything with a uid and coordinates, e.g. ``app.geo.terminals.Terminal``."""
+
+    uid: str
+    latitude: float
+    longitude: float
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """Uniform grid of terminals supporting k-nearest, radius and bbox queries."""
+
+    def __init__(
+        self, terminals: Iterable[Located], cell_degrees: float = DEFAULT_CELL_DEGREES
+    ) -> None:
+        self.cell = cell_degrees
+        self.cells: dict[tuple[int, int], list[Located]] = {}
+        for t in terminals:
+            if t.latitude is None or t.longitude is None:
+                continue
+            self.cells.setdefault(self._cell_of(t.latitude, t.longitude), []).append(t)
+        self.size = sum(len(bucket) for bucket in self.cells.values())
+        rows = [i for i, _ in self.cells] or [0]
+        cols = [j for _, j in self.cells] or [0]
+        self._extent = (min(rows), max(rows), min(cols), max(cols))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _cell_of(self, lat: float, lon: float) -> tuple[int, int]:
+        return math.floor(lat / self.cell), math.floor(lon / self.cell)
+
+    def _cells_in(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+        lo_i, lo_j = self._cell_of(min_lat, min_lon)
+        hi_i, hi_j = self._cell_of(max_lat, max_lon)
+        if (hi_i - lo_i + 1) * (hi_j - lo_j + 1) > len(self.cells):
+            # The area covers more cells than are occupied: walk the occupied ones
+            for (i, j), bucket in self.cells.items():
+                if lo_i <= i <= hi_i and lo_j <= j <= hi_j:
+                    yield bucket
+            return
+        for i in range(lo_i, hi_i + 1):
+            for j in range(lo_j, hi_j + 1):
+                bucket = self.cells.get((i, j))
+                if bucket:
+                    yield bucket
+
+    def _ring(self, ci: int, cj: int, r: int) -> Iterator[list[Located]]:
+        """Occupied cells at Chebyshev distance exactly ``r`` from ``(ci, cj)``."""
+        if r == 0:
+            cells = [(ci, cj)]
+        else:
+            cells = [(ci + di, cj + dj) for di in (-r, r) for dj in range(-r, r + 1)]
+            cells += [(ci + di, cj + dj) for dj in (-r, r) for di in range(-r + 1, r)]
+        for key in cells:
+            bucket = self.cells.get(key)
+            if bucket:
+                yield bucket
+
+    def _ring_clearance_km(self, lat: float, r: int) -> float:
+        """Lower bound on the distance to any terminal outside rings ``0..r``."""
+        degrees = r * self.cell
+        # East-west degrees shrink towards the poles; use the worst case in reach
+        widest = min(89.0, abs(lat) + degrees)
+        return degrees * KM_PER_DEGREE * math.cos(math.radians(widest))
+
+    def nearest(
+        self, lat: float, lon: float, k: int = 5, max_km: float | None = None
+    ) -> list[tuple[Located, float]]:
+        """The ``k`` terminals closest to a point, optionally within ``max_km``."""
+        if k <= 0 or not self.cells:
+            return []
+        ci, cj = self._cell_of(lat, lon)
+        # Bound on rings needed to cover every occupied cell
+        lo_i, hi_i, lo_j, hi_j = self._extent
+        max_ring = max(ci - lo_i, hi_i - ci, cj - lo_j, hi_j - cj, 0)
+        found: list[tuple[float, str, Located]] = []  # max-heap via negated distance
+        for r in range(max_ring + 1):
+            for bucket in self._ring(ci, cj, r):
+                for t in bucket:
+                    km = haversine_km(lat, lon, t.latitude, t.longitude)
+                    if max_km is not None and km > max_km:
+                        continue
+                    if len(found) < k:
+                        heapq.heappush(found, (-km, t.uid, t))
+                    elif km < -found[0][0]:
+                        heapq.heapreplace(found, (-km, t.uid, t))
+            clearance = self._ring_clearance_km(lat, r)
+            if max_km is not None and clearance > max_km:
+                break
+            if len(found) == k and clearance >= -found[0][0]:
+                break
+        return [(t, km) for km, _, t in sorted((-d, uid, t) for d, uid, t in found)]
+
+    def within(self, lat: float, lon: float, radius_km: float) -> list[tuple[Located, float]]:
+        """All terminals within ``radius_km`` of a point, nearest first."""
+        dlat = radius_km / KM_PER_DEGREE
+        reach = min(89.0, abs(lat) + dlat)
+        dlon = min(180.0, radius_km / (KM_PER_DEGREE * math.cos(math.radians(reach))))
+        hits = []
+        for bucket in self._cells_in(lat - dlat, lon - dlon, lat + dlat, lon + dlon):
+            for t in bucket:
+                km = haversine_km(lat, lon, t.latitude, t.longitude)
+                if km <= radius_km:
+                    hits.append((t, km))
+        hits.sort(key=lambda hit: (hit[1], hit[0].uid))
+        return hits
+
+    def in_bbox(
+        self, min_lat: float, min_lon: float, max_lat: float, max_lon: float
+    ) -> list[Located]:
+        """All terminals inside a latitude/longitude rectangle."""
+        return [
+            t
+            for bucket in self._cells_in(min_lat, min_lon, max_lat, max_lon)
+            for t in bucket
+            if min_lat <= t.latitude <= max_lat and min_lon <= t.longitude <= max_lon
+        ]
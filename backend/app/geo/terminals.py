@@ -0,0 +1,111 @@
+"""In-memory terminal registry for coordinate lookups by uid or city.
+
+The terminals table is small (508 terminals; ``terminals.csv`` repeats them
+across about 12,800 rows, which the seed deduplicates on uid), so it is loaded
+once and kept in memory. It is rebuilt whenever the data version changes, i.e. after
+``data/seed.py`` reloads the database.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from app.config import settings
+from app.db import QueryBudget, execute_parameterized, get_data_version
+from app.geo.spatial import SpatialIndex
+from app.rag.utils import CITY_ALIASES, fold_accents
+
+logger = logging.getLogger(__name__)
+
+# Loading the whole table is expected to return every row
+_LOAD_BUDGET = QueryBudget(timeout_seconds=30.0, max_steps=10**9, max_rows=10**7)
+
+
+@dataclass(frozen=True, slots=True)
+class Terminal:
+    uid: str
+    name: str
+    city: str
+    country: str
+    latitude: float
+    longitude: float
+
+
+def city_key(city: str) -> str:
+    """Normalize a city name for lookups ("München", "Munich" → "munchen")."""
+    key = fold_accents(city).strip().lower()
+    return CITY_ALIASES.get(key, key)
+
+
+def country_key(country: str) -> str:
+    """Normalize a country name for lookups."""
+    return fold_accents(country).strip().lower()
+
+
+class TerminalRegistry:
+    """Terminals indexed by uid, by normalized city name and spatially."""
+
+    def __init__(self, terminals: list[Terminal], data_version: int = 0) -> None:
+        self.data_version = data_version
+        self.terminals = terminals
+        self.by_uid = {t.uid: t for t in terminals}
+        self.by_city: dict[str, list[Terminal]] = {}
+        # Folded country name → the spelling in the data ("osterreich" → "Österreich")
+        self.countries: dict[str, str] = {}
+        for t in terminals:
+            self.by_city.setdefault(city_key(t.city), []).append(t)
+            self.countries.setdefault(country_key(t.country), t.country)
+        self.spatial = SpatialIndex(terminals)
+
+    def __len__(self) -> int:
+        return len(self.terminals)
+
+    def get(self, uid: str | None) -> Terminal | None:
+        return self.by_uid.get(uid) if uid else None
+
+    def in_city(self, city: str | None) -> list[Terminal]:
+        return self.by_city.get(city_key(city), []) if city else []
+
+    def country(self, name: str | None) -> str | None:
+        """The country name used in the data for ``name``, or ``None``."""
+        return self.countries.get(country_key(name)) if name else None
+
+    def city_location(self, city: str | None) -> tuple[float, float] | None:
+        """Return the (latitude, longitude) centroid of a city's terminals."""
+        terminals = self.in_city(city)
+        if not terminals:
+            return None
+        lat = sum(t.latitude for t in terminals) / len(terminals)
+        lon = sum(t.longitude for t in terminals) / len(terminals)
+        return lat, lon
+
+
+_registry: TerminalRegistry | None = None
+_reload = asyncio.Lock()
+
+
+async def load_terminal_registry() -> TerminalRegistry:
+    """Load all terminals from the database into a fresh registry."""
+    global _registry
+    version = await get_data_version()
+    rows = await execute_parameterized(
+        "SELECT uid, name, city, country, latitude, longitude FROM terminals",
+        budget=_LOAD_BUDGET,
+    )
+    _registry = await asyncio.to_thread(
+        lambda: TerminalRegistry([Terminal(**row) for row in rows], version)
+    )
+    logger.info("Loaded %d terminals (data version %d)", len(_registry), version)
+    return _registry
+
+
+async def get_terminal_registry() -> TerminalRegistry:
+    """Return the terminal registry, reloading it if the data was reseeded."""
+    version = await get_data_version(settings.data_version_check_seconds)
+    if _registry is not None and _registry.data_version == version:
+        return _registry
+    async with _reload:
+        # Another request may have reloaded it while this one waited
+        if _registry is None or _registry.data_version != await get_data_version():
+            await load_terminal_registry()
+    return _registry
@@ -0,0 +1,330 @@
+"""Clustered GeoJSON map tiles for the full terminal and corridor network.
+
+Tiles use the standard XYZ web-mercator scheme. For each zoom level,
+terminals are clustered on a fixed pixel grid, and corridors (all trains
+between two terminals) are merged between clusters, so one tile never holds
+more than a few hundred features. The upper zoom levels that cover the whole
+network are rendered when the tile set is loaded. Deeper tiles are rendered
+on first request and kept in an LRU. Everything is rebuilt when the data
+version changes, i.e. after ``data/seed.py`` reloads the database.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.config import settings
+from app.db import QueryBudget, execute_parameterized, get_data_version
+from app.geo.terminals import Terminal, TerminalRegistry, get_terminal_registry
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+MAX_ZOOM = 18
+# Terminals closer than this many pixels at a zoom level share a cluster
+CLUSTER_PIXELS = 64
+# From this zoom on every terminal is drawn on its own
+MAX_CLUSTER_ZOOM = 11
+
+_LOAD_BUDGET = QueryBudget(timeout_seconds=30.0, max_steps=10**9, max_rows=10**7)
+
+
+def mercator(lat: float, lon: float) -> tuple[float, float]:
+    """Project a coordinate to normalized web-mercator ``(x, y)`` in ``[0, 1)``."""
+    lat = max(-85.05112878, min(85.05112878, lat))
+    x = (lon + 180.0) / 360.0
+    phi = math.radians(lat)
+    y = (1.0 - math.log(math.tan(phi) + 1.0 / math.cos(phi)) / math.pi) / 2.0
+    return x, y
+
+
+@dataclass(frozen=True, slots=True)
+class Corridor:
+    """All trains between an ordered pair of terminals."""
+
+    from_uid: str
+    to_uid: str
+    trains: int
+    operators: int
+
+
+@dataclass(slots=True)
+class _Cluster:
+    members: list[Terminal]
+    latitude: float = 0.0
+    longitude: float = 0.0
+    x: float = 0.0
+    y: float = 0.0
+
+    def feature(self) -> dict:
+        coordinates = [round(self.longitude, 5), round(self.latitude, 5)]
+        if len(self.members) == 1:
+            t = self.members[0]
+            properties = {
+                "kind": "terminal", "uid": t.uid, "name": t.name,
+                "city": t.city, "country": t.country,
+            }
+        else:
+            cities = sorted({t.city for t in self.members})
+            properties = {
+                "kind": "cluster", "count": len(self.members),
+                "cities": cities[:5], "city_count": len(cities),
+            }
+        return {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": coordinates},
+            "properties": properties,
+        }
+
+
+@dataclass(slots=True)
+class _Line:
+    start: _Cluster
+    end: _Cluster
+    trains: int = 0
+    corridors: int = 0
+    operators: int = 0
+
+    def bounds(self) -> tuple[float, float, float, float]:
+        return (
+            min(self.start.x, self.end.x), min(self.start.y, self.end.y),
+            max(self.start.x, self.end.x), max(self.start.y, self.end.y),
+        )
+
+    def feature(self) -> dict:
+        return {
+            "type": "Feature",
+            "geometry": {
+                "type": "LineString",
+                "coordinates": [
+                    [round(self.start.longitude, 5), round(self.start.latitude, 5)],
+                    [round(self.end.longitude, 5), round(self.end.latitude, 5)],
+                ],
+            },
+            "properties": {
+                "kind": "corridor",
+                "trains": self.trains,
+                "corridors": self.corridors,
+                "operators": self.operators,
+            },
+        }
+
+
+@dataclass(slots=True)
+class _Layer:
+    """Clusters and merged corridors for one zoom level."""
+
+    clusters: list[_Cluster]
+    lines: list[_Line]
+
+
+@dataclass(frozen=True, slots=True)
+class Tile:
+    body: bytes
+    etag: str
+    features: int
+
+
+class TileSet:
+    """Renders and caches tiles for one version of the data."""
+
+    def __init__(
+        self,
+        registry: TerminalRegistry,
+        corridors: list[Corridor],
+        data_version: int = 0,
+        cache_size: int = 4096,
+    ) -> None:
+        self.registry = registry
+        self.corridors = corridors
+        self.data_version = data_version
+        self.cache_size = cache_size
+        self._projected = {
+            t.uid: mercator(t.latitude, t.longitude) for t in registry.terminals
+        }
+        self._layers: dict[int, _Layer] = {}
+        self._precomputed: dict[tuple[int, int, int], Tile] = {}
+        self._cache: OrderedDict[tuple[int, int, int], Tile] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _layer(self, z: int) -> _Layer:
+        z = min(z, MAX_CLUSTER_ZOOM)
+        layer = self._layers.get(z)
+        if layer is not None:
+            return layer
+
+        # Cluster cell size in normalized mercator units at this zoom
+        cell = CLUSTER_PIXELS / (TILE_SIZE * 2**z)
+        clusters: dict[tuple, _Cluster] = {}
+        membership: dict[str, _Cluster] = {}
+        for t in self.registry.terminals:
+            x, y = self._projected[t.uid]
+            key = (int(x / cell), int(y / cell)) if z < MAX_CLUSTER_ZOOM else (t.uid,)
+            cluster = clusters.get(key)
+            if cluster is None:
+                cluster = clusters[key] = _Cluster([])
+            cluster.members.append(t)
+            membership[t.uid] = cluster
+        for cluster in clusters.values():
+            n = len(cluster.members)
+            cluster.latitude = sum(t.latitude for t in cluster.members) / n
+            cluster.longitude = sum(t.longitude for t in cluster.members) / n
+            cluster.x, cluster.y = mercator(cluster.latitude, cluster.longitude)
+
+        lines: dict[tuple[int, int], _Line] = {}
+        for c in self.corridors:
+            start, end = membership.get(c.from_uid), membership.get(c.to_uid)
+            if start is None or end is None or start is end:
+                continue
+            line = lines.get((id(start), id(end)))
+            if line is None:
+                line = lines[(id(start), id(end))] = _Line(start, end)
+            line.trains += c.trains
+            line.corridors += 1
+            line.operators = max(line.operators, c.operators)
+
+        layer = self._layers[z] = _Layer(list(clusters.values()), list(lines.values()))
+        return layer
+
+    def _render(self, z: int, x: int, y: int) -> Tile:
+        layer = self._layer(z)
+        scale = 2**z
+        min_x, min_y = x / scale, y / scale
+        max_x, max_y = (x + 1) / scale, (y + 1) / scale
+
+        features = [
+            line.feature()
+            for line in layer.lines
+            if _crosses(line, (min_x, min_y, max_x, max_y))
+        ]
+        features.extend(
+            cluster.feature()
+            for cluster in layer.clusters
+            if min_x <= cluster.x < max_x and min_y <= cluster.y < max_y
+        )
+        body = json.dumps(
+            {"type": "FeatureCollection", "features": features}, separators=(",", ":")
+        ).encode()
+        digest = hashlib.sha1(body, usedforsecurity=False).hexdigest()[:20]
+        return Tile(body, f'"{self.data_version}-{digest}"', len(features))
+
+    def precompute(self, max_zoom: int) -> int:
+        """Render every non-empty tile up to ``max_zoom``; returns the tile count."""
+        for z in range(max_zoom + 1):
+            layer = self._layer(z)
+            scale = 2**z
+            keys: set[tuple[int, int]] = set()
+            for cluster in layer.clusters:
+                keys.add((int(cluster.x * scale), int(cluster.y * scale)))
+            for line in layer.lines:
+                x0, y0, x1, y1 = line.bounds()
+                for tx in range(int(x0 * scale), int(x1 * scale) + 1):
+                    for ty in range(int(y0 * scale), int(y1 * scale) + 1):
+                        rect = (tx / scale, ty / scale, (tx + 1) / scale, (ty + 1) / scale)
+                        if _crosses(line, rect):
+                            keys.add((tx, ty))
+            for tx, ty in keys:
+                self._precomputed[(z, tx, ty)] = self._render(z, tx, ty)
+        return len(self._precomputed)
+
+    def tile(self, z: int, x: int, y: int) -> Tile:
+        """Return a tile, from the precomputed set or the LRU if possible."""
+        key = (z, x, y)
+        tile = self._precomputed.get(key)
+        if tile is not None:
+            self.hits += 1
+            return tile
+        tile = self._cache.get(key)
+        if tile is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return tile
+
+        self.misses += 1
+        tile = self._render(z, x, y)
+        self._cache[key] = tile
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return tile
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "precomputed": len(self._precomputed),
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _crosses(line: _Line, rect: tuple[float, float, float, float]) -> bool:
+    """Whether the corridor segment passes through ``rect`` (Liang–Barsky clipping)."""
+    x0, y0 = line.start.x, line.start.y
+    dx, dy = line.end.x - x0, line.end.y - y0
+    low, high = 0.0, 1.0
+    for p, q in (
+        (-dx, x0 - rect[0]),
+        (dx, rect[2] - x0),
+        (-dy, y0 - rect[1]),
+        (dy, rect[3] - y0),
+    ):
+        if p == 0:
+            if q < 0:
+                return False
+        elif p < 0:
+            low = max(low, q / p)
+        else:
+            high = min(high, q / p)
+        if low > high:
+            return False
+    return True
+
+
+_tiles: TileSet | None = None
+_reload = asyncio.Lock()
+
+
+async def load_tiles() -> TileSet:
+    """Aggregate corridors from ``trains`` and precompute the low-zoom tiles."""
+    global _tiles
+    version = await get_data_version()
+    registry = await get_terminal_registry()
+    rows = await execute_parameterized(
+        "SELECT from_terminal_uid, to_terminal_uid, COUNT(*) AS trains, "
+        "COUNT(DISTINCT operator_uid) AS operators FROM trains "
+        "WHERE from_terminal_uid IS NOT NULL AND to_terminal_uid IS NOT NULL "
+        "GROUP BY from_terminal_uid, to_terminal_uid",
+        budget=_LOAD_BUDGET,
+    )
+    corridors = [
+        Corridor(r["from_terminal_uid"], r["to_terminal_uid"], r["trains"], r["operators"])
+        for r in rows
+    ]
+    tiles = TileSet(registry, corridors, version, settings.tile_cache_size)
+    count = await asyncio.to_thread(tiles.precompute, settings.tile_precompute_max_zoom)
+    _tiles = tiles
+    logger.info("Precomputed %d map tiles from %d corridors", count, len(corridors))
+    return _tiles
+
+
+def current_tiles() -> TileSet | None:
+    """Return the loaded tile set without reloading it (for stats)."""
+    return _tiles
+
+
+async def get_tiles() -> TileSet:
+    """Return the tile set, rebuilding it if the data was reseeded."""
+    version = await get_data_version(settings.data_version_check_seconds)
+    if _tiles is not None and _tiles.data_version == version:
+        return _tiles
+    async with _reload:
+        # Another request may have rebuilt it while this one waited
+        if _tiles is None or _tiles.data_version != await get_data_version():
+            await load_tiles()
+    return _tiles
@@ -3,15 +3,45 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.agents.llm import close_http_client
+from app.cache import (
+    close_response_cache,
+    close_result_cache,
+    init_response_cache,
+    init_result_cache,
+)
 from app.config import settings
 from app.db import close_db, init_db
-from app.routes import chat, data, health
+from app.geo.terminals import load_terminal_registry
+from app.geo.tiles import load_tiles
+from app.planner import load_planner
+from app.rag.examples import close_example_store, init_example_store
+from app.rag.retriever import load_schema_retriever
+from app.ratelimit import close_rate_limiter
+from app.routes import chat, data, export, health, planner, tiles
+from app.sql_guard import load_sql_guard
+from app.telemetry import close_telemetry, init_telemetry
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    init_result_cache()
+    await load_terminal_registry()
+    await load_planner()
+    await load_tiles()
+    await load_schema_retriever()
+    await load_sql_guard()
+    init_response_cache()
+    init_example_store()
+    init_telemetry()
     yield
+    await close_telemetry()
+    close_rate_limiter()
+    close_example_store()
+    close_response_cache()
+    close_result_cache()
+    await close_http_client()
     await close_db()
 
 
@@ -29,8 +59,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Paging headers of the data endpoints
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
 app.include_router(health.router)
 app.include_router(chat.router, prefix="/api")
 app.include_router(data.router, prefix="/api")
+app.include_router(export.router, prefix="/api")
+app.include_router(planner.router, prefix="/api")
+app.include_router(tiles.router, prefix="/api")
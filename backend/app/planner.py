@@ -0,0 +1,502 @@
+"""Multi-leg intermodal route planner over the weekly trains timetable.
+
+The ``trains`` table is loaded once into a time-dependent graph: terminals are
+nodes and every train is a weekly-recurring connection. Searches run a
+label-setting Dijkstra over absolute minutes from Monday 00:00, waiting for the
+next weekly occurrence of each departure, and can change between terminals in
+the same city or within a short truck haul of each other. Everything is in
+memory, so a query touches no SQL at all.
+"""
+
+import asyncio
+import bisect
+import difflib
+import heapq
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from app.config import settings
+from app.db import QueryBudget, execute_parameterized, get_data_version
+from app.geo.spatial import haversine_km
+from app.geo.terminals import Terminal, TerminalRegistry, get_terminal_registry
+from app.search import fold_term, search_terminals
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_WEEK = 7 * 24 * 60
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+OBJECTIVES = ("time", "co2", "legs")
+# How close a misspelled city must be to a timetable city to stand in for it
+CITY_SIMILARITY = 0.8
+
+# Upper bound on rail speed, used as an admissible A* heuristic for time searches
+_MAX_SPEED_KMH = 120.0
+# Average truck speed for transfer hauls between nearby terminals
+_TRUCK_SPEED_KMH = 50.0
+
+_LOAD_BUDGET = QueryBudget(timeout_seconds=30.0, max_steps=10**9, max_rows=10**7)
+
+
+@dataclass(frozen=True, slots=True)
+class Connection:
+    """One weekly train departure between two terminals."""
+
+    uid: str
+    from_uid: str
+    to_uid: str
+    departure: int  # minute of the week, 0 = Monday 00:00
+    duration: int  # minutes
+    co2: float  # train emissions, tonnes CO2e
+    distance: float  # km
+    operator: str
+
+
+@dataclass(frozen=True, slots=True)
+class Transfer:
+    """A change between two nearby terminals (shunting or a short truck haul)."""
+
+    from_uid: str
+    to_uid: str
+    duration: int
+    distance: float
+
+
+@dataclass(slots=True)
+class _Label:
+    key: tuple
+    arrival: int
+    co2: float
+    legs: int
+    prev: "_Label | None" = None
+    step: Connection | Transfer | None = None
+    departure: int = 0
+
+
+@dataclass
+class Itinerary:
+    legs: list[dict] = field(default_factory=list)
+    departure: int = 0
+    arrival: int = 0
+    co2: float = 0.0
+    distance: float = 0.0
+
+    def to_dict(self) -> dict:
+        trains = [leg for leg in self.legs if leg["type"] == "train"]
+        return {
+            "departure": _format_minute(self.departure),
+            "arrival": _format_minute(self.arrival),
+            "total_hours": round((self.arrival - self.departure) / 60, 2),
+            "train_legs": len(trains),
+            "transfers": len(trains) - 1,
+            "co2_tonnes": round(self.co2, 4),
+            "distance_km": round(self.distance, 1),
+            "legs": self.legs,
+        }
+
+
+def parse_minute_of_week(weekday: int, hhmm: str) -> int:
+    """Convert an ISO weekday (1=Monday) and "HH:MM" into a minute of the week."""
+    hours, minutes = hhmm.split(":")[:2]
+    return ((weekday - 1) % 7) * 1440 + int(hours) * 60 + int(minutes)
+
+
+def _format_minute(minute: int) -> dict:
+    week_minute = minute % MINUTES_PER_WEEK
+    day, rest = divmod(week_minute, 1440)
+    return {
+        "day": WEEKDAYS[day],
+        "time": f"{rest // 60:02d}:{rest % 60:02d}",
+        "week_offset": minute // MINUTES_PER_WEEK,
+    }
+
+
+class RoutePlanner:
+    """Earliest-arrival / lowest-CO2 / fewest-legs search over the timetable graph."""
+
+    def __init__(
+        self,
+        connections: list[Connection],
+        registry: TerminalRegistry,
+        transfers: list[Transfer] | None = None,
+        data_version: int = 0,
+    ) -> None:
+        self.registry = registry
+        self.data_version = data_version
+        # Outgoing connections grouped by neighbour: {from_uid: [(to_uid, [connections])]}
+        grouped: dict[str, dict[str, list[Connection]]] = {}
+        for c in connections:
+            grouped.setdefault(c.from_uid, {}).setdefault(c.to_uid, []).append(c)
+        self.edges = {uid: list(by_dest.items()) for uid, by_dest in grouped.items()}
+        self.departure_minutes = {
+            uid: sorted({c.departure for conns in by_dest.values() for c in conns})
+            for uid, by_dest in grouped.items()
+        }
+        self._cache: OrderedDict[tuple, Itinerary | None] = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.transfers: dict[str, list[Transfer]] = {}
+        for t in transfers if transfers is not None else self._nearby_transfers():
+            self.transfers.setdefault(t.from_uid, []).append(t)
+        self.connection_count = len(connections)
+
+    def _nearby_transfers(self) -> list[Transfer]:
+        """Allow changing between terminals of the same city or within the transfer radius.
+
+        Nearby terminals come from the registry's spatial index; the transfer
+        time is the fixed handling time plus a short truck haul between them.
+        """
+        radius = settings.planner_transfer_radius_km
+        transfers = []
+        for a in self.registry.terminals:
+            nearby = {t.uid: (t, km) for t, km in self.registry.spatial.within(
+                a.latitude, a.longitude, radius
+            )}
+            for b in self.registry.in_city(a.city):
+                nearby.setdefault(
+                    b.uid, (b, haversine_km(a.latitude, a.longitude, b.latitude, b.longitude))
+                )
+            for b, km in nearby.values():
+                if b.uid != a.uid:
+                    minutes = settings.planner_transfer_minutes + round(km / _TRUCK_SPEED_KMH * 60)
+                    transfers.append(Transfer(a.uid, b.uid, minutes, km))
+        return transfers
+
+    def _heuristic(self, uid: str, targets: list[Terminal]) -> int:
+        """Lower bound in minutes from ``uid`` to the closest target terminal."""
+        here = self.registry.get(uid)
+        if here is None or not targets:
+            return 0
+        km = min(
+            haversine_km(here.latitude, here.longitude, t.latitude, t.longitude) for t in targets
+        )
+        return int(km / _MAX_SPEED_KMH * 60)
+
+    def _next_departure(self, origins: frozenset[str], depart_at: int) -> int | None:
+        """First minute at or after ``depart_at`` when any train leaves an origin terminal."""
+        minute = depart_at % MINUTES_PER_WEEK
+        best = None
+        for uid in origins:
+            minutes = self.departure_minutes.get(uid)
+            if not minutes:
+                continue
+            i = bisect.bisect_left(minutes, minute)
+            nxt = minutes[i] if i < len(minutes) else minutes[0] + MINUTES_PER_WEEK
+            best = nxt if best is None else min(best, nxt)
+        return best
+
+    def plan(
+        self,
+        origins: list[str],
+        destinations: list[str],
+        depart_at: int,
+        objective: str = "time",
+        max_legs: int = 4,
+    ) -> Itinerary | None:
+        """Find the best itinerary from any origin terminal to any destination terminal.
+
+        ``depart_at`` is a minute of the week. ``objective`` is ``time``
+        (earliest arrival), ``co2`` (lowest train emissions) or ``legs``
+        (fewest trains); ties are broken by arrival time.
+
+        Waiting at the origin changes nothing until the next train leaves, so
+        the start time is snapped to that departure. That bounds the distinct
+        searches per city pair to the number of weekly departures and lets
+        repeated queries be answered from an LRU cache.
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective: {objective}")
+        origin_set, target_set = frozenset(origins), frozenset(destinations)
+        if not origin_set or not target_set:
+            return None
+        start = self._next_departure(origin_set, depart_at)
+        if start is None:
+            return None
+
+        cache_key = (origin_set, target_set, start, objective, max_legs)
+        if cache_key in self._cache:
+            self._cache.move_to_end(cache_key)
+            self.cache_hits += 1
+            return self._cache[cache_key]
+        self.cache_misses += 1
+
+        itinerary = self._search(origin_set, target_set, start, objective, max_legs)
+        self._cache[cache_key] = itinerary
+        if len(self._cache) > settings.planner_cache_size:
+            self._cache.popitem(last=False)
+        return itinerary
+
+    def _search(
+        self,
+        origins: frozenset[str],
+        targets: frozenset[str],
+        depart_at: int,
+        objective: str,
+        max_legs: int,
+    ) -> Itinerary | None:
+        """Label-setting search (A* for ``time``) from ``origins`` leaving at ``depart_at``."""
+        target_terminals = [t for t in map(self.registry.get, targets) if t]
+        min_connection = settings.planner_min_connection_minutes
+        heuristics: dict[str, int] = {}
+
+        def key(arrival: int, co2: float, legs: int, uid: str) -> tuple:
+            if objective == "time":
+                if uid not in heuristics:
+                    heuristics[uid] = self._heuristic(uid, target_terminals)
+                return (arrival + heuristics[uid], legs)
+            if objective == "co2":
+                return (round(co2, 6), arrival)
+            return (legs, arrival)
+
+        # Search states are (terminal, arrived by train): only a train arrival may
+        # transfer on, so a label that came by transfer must not settle the
+        # terminal for one that comes by train. A label is only queued if it
+        # improves on the best key pushed for its state.
+        best: dict[tuple[str, bool], tuple] = {}
+        done: set[tuple[str, bool]] = set()
+        heap: list[tuple[tuple, int, _Label, tuple[str, bool]]] = []
+        counter = 0
+        for uid in origins:
+            label = _Label(key(depart_at, 0.0, 0, uid), depart_at, 0.0, 0)
+            best[(uid, False)] = label.key
+            heapq.heappush(heap, (label.key, counter, label, (uid, False)))
+            counter += 1
+
+        while heap:
+            k, _, label, state = heapq.heappop(heap)
+            if state in done or best.get(state, k) < k:
+                continue
+            done.add(state)
+            uid = state[0]
+            if uid in targets and label.legs > 0:
+                return self._build_itinerary(label)
+
+            candidates: list[_Label] = []
+            # Changing trains needs a minimum connection time, except at the start
+            ready = label.arrival + (min_connection if label.legs else 0)
+            if label.legs < max_legs:
+                for to_uid, conns in self.edges.get(uid, ()):
+                    if (to_uid, True) in done:
+                        continue
+                    # Of all trains to this neighbour, keep the best for the objective
+                    chosen, chosen_rank = None, None
+                    for c in conns:
+                        leave = ready + (c.departure - ready) % MINUTES_PER_WEEK
+                        rank = (c.co2, leave + c.duration) if objective == "co2" else (
+                            leave + c.duration,
+                        )
+                        if chosen_rank is None or rank < chosen_rank:
+                            chosen, chosen_rank, chosen_leave = c, rank, leave
+                    arrival = chosen_leave + chosen.duration
+                    candidates.append(
+                        _Label(None, arrival, label.co2 + chosen.co2, label.legs + 1,
+                               label, chosen, chosen_leave)
+                    )
+
+            # Transfers only make sense after arriving by train, never twice in a row
+            if label.legs and not isinstance(label.step, Transfer):
+                for t in self.transfers.get(uid, ()):
+                    if (t.to_uid, False) not in done:
+                        candidates.append(
+                            _Label(None, label.arrival + t.duration, label.co2, label.legs,
+                                   label, t, label.arrival)
+                        )
+
+            for nxt in candidates:
+                to_uid = nxt.step.to_uid
+                nxt.key = key(nxt.arrival, nxt.co2, nxt.legs, to_uid)
+                to_state = (to_uid, isinstance(nxt.step, Connection))
+                if to_state in best and best[to_state] <= nxt.key:
+                    continue
+                best[to_state] = nxt.key
+                heapq.heappush(heap, (nxt.key, counter, nxt, to_state))
+                counter += 1
+        return None
+
+    def _describe(self, uid: str) -> dict:
+        t = self.registry.get(uid)
+        if t is None:
+            return {"uid": uid}
+        return {"uid": uid, "name": t.name, "city": t.city, "country": t.country}
+
+    def _build_itinerary(self, label: _Label) -> Itinerary:
+        steps = []
+        node: _Label | None = label
+        while node and node.step:
+            steps.append(node)
+            node = node.prev
+        steps.reverse()
+
+        itinerary = Itinerary(departure=steps[0].departure, arrival=label.arrival, co2=label.co2)
+        for s in steps:
+            if isinstance(s.step, Connection):
+                c = s.step
+                itinerary.distance += c.distance
+                itinerary.legs.append({
+                    "type": "train",
+                    "train_uid": c.uid,
+                    "from": self._describe(c.from_uid),
+                    "to": self._describe(c.to_uid),
+                    "operator_name": c.operator,
+                    "departure": _format_minute(s.departure),
+                    "arrival": _format_minute(s.arrival),
+                    "transit_hours": round(c.duration / 60, 2),
+                    "co2_tonnes": c.co2,
+                    "distance_km": round(c.distance, 1),
+                })
+            else:
+                t = s.step
+                itinerary.distance += t.distance
+                itinerary.legs.append({
+                    "type": "transfer",
+                    "from": self._describe(t.from_uid),
+                    "to": self._describe(t.to_uid),
+                    "minutes": t.duration,
+                    "distance_km": round(t.distance, 1),
+                })
+        return itinerary
+
+    def plan_cities(
+        self,
+        from_city: str,
+        to_city: str,
+        depart_at: int,
+        objective: str = "time",
+        max_legs: int = 4,
+    ) -> Itinerary | None:
+        """Plan between all terminals of two cities (names may be aliases)."""
+        origins = [t.uid for t in self.registry.in_city(from_city)]
+        destinations = [t.uid for t in self.registry.in_city(to_city)]
+        return self.plan(origins, destinations, depart_at, objective, max_legs)
+
+    def stats(self) -> dict:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "connections": self.connection_count,
+            "terminals": len(self.edges),
+            "cached_plans": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+        }
+
+
+def itinerary_rows(itinerary: Itinerary) -> list[dict]:
+    """Flatten an itinerary's train legs into rows shaped like ``trains`` query results."""
+    return [
+        {
+            "from_terminal_uid": leg["from"]["uid"],
+            "to_terminal_uid": leg["to"]["uid"],
+            "from_terminal_city": leg["from"].get("city"),
+            "to_terminal_city": leg["to"].get("city"),
+            "operator_name": leg["operator_name"],
+            "departure_day": leg["departure"]["day"],
+            "departure_time": leg["departure"]["time"],
+            "arrival_day": leg["arrival"]["day"],
+            "arrival_time": leg["arrival"]["time"],
+            "transit_hours": leg["transit_hours"],
+            "distance": leg["distance_km"],
+            "train_emission_co2e_wtw_ton": leg["co2_tonnes"],
+        }
+        for leg in itinerary.legs
+        if leg["type"] == "train"
+    ]
+
+
+def connections_from_rows(rows: list[dict]) -> list[Connection]:
+    """Build weekly connections from ``trains`` rows, skipping rows without a real schedule.
+
+    About a third of the rows are placeholders with ``transit_hours = 0`` and
+    an arrival equal to the departure (Monday 00:00 → Monday 00:00). As
+    instant connections they would win every search and break the A*
+    heuristic, so any row whose duration is not positive is left out.
+    """
+    connections = []
+    for r in rows:
+        if not (r["departure_iso_weekday"] and r["departure_time"] and r["to_terminal_uid"]):
+            continue
+        departure = parse_minute_of_week(r["departure_iso_weekday"], r["departure_time"])
+        arrival = None
+        if r["arrival_iso_weekday"] and r["arrival_time"]:
+            arrival = parse_minute_of_week(r["arrival_iso_weekday"], r["arrival_time"])
+        if arrival == departure:
+            continue
+        if r["transit_hours"] is not None:
+            duration = round(r["transit_hours"] * 60)
+        elif arrival is not None:
+            duration = (arrival - departure) % MINUTES_PER_WEEK
+        else:
+            continue
+        if duration <= 0:
+            continue
+        connections.append(
+            Connection(
+                uid=r["uid"],
+                from_uid=r["from_terminal_uid"],
+                to_uid=r["to_terminal_uid"],
+                departure=departure,
+                duration=duration,
+                co2=r["train_emission_co2e_wtw_ton"] or 0.0,
+                distance=r["distance"] or r["total_distance"] or 0.0,
+                operator=r["operator_name"] or "",
+            )
+        )
+    return connections
+
+
+async def resolve_timetable_city(planner: RoutePlanner, city: str) -> str | None:
+    """Map a user-supplied city to one the timetable knows, tolerating typos.
+
+    The terminal search always ranks something first, so a hit only counts if
+    its city contains the term or is spelled almost the same; anything else
+    (an unknown place, a country) resolves to ``None``.
+    """
+    if planner.registry.in_city(city):
+        return city
+    term = fold_term(city)
+    for row in await search_terminals(city, limit=5):
+        candidate = fold_term(row["city"])
+        if term in candidate:
+            return row["city"]
+        if difflib.SequenceMatcher(None, term, candidate).ratio() >= CITY_SIMILARITY:
+            return row["city"]
+    return None
+
+
+_planner: RoutePlanner | None = None
+_reload = asyncio.Lock()
+
+
+async def load_planner() -> RoutePlanner:
+    """Build the timetable graph from the trains table."""
+    global _planner
+    version = await get_data_version()
+    registry = await get_terminal_registry()
+    rows = await execute_parameterized(
+        "SELECT uid, from_terminal_uid, to_terminal_uid, departure_iso_weekday, departure_time, "
+        "arrival_iso_weekday, arrival_time, transit_hours, train_emission_co2e_wtw_ton, "
+        "distance, total_distance, operator_name FROM trains",
+        budget=_LOAD_BUDGET,
+    )
+    _planner = await asyncio.to_thread(
+        lambda: RoutePlanner(connections_from_rows(rows), registry, data_version=version)
+    )
+    logger.info("Route planner loaded %d connections", _planner.connection_count)
+    return _planner
+
+
+def current_planner() -> RoutePlanner | None:
+    """Return the loaded planner without reloading it (for stats)."""
+    return _planner
+
+
+async def get_planner() -> RoutePlanner:
+    """Return the route planner, rebuilding it if the data was reseeded."""
+    version = await get_data_version(settings.data_version_check_seconds)
+    if _planner is not None and _planner.data_version == version:
+        return _planner
+    async with _reload:
+        # Another request may have rebuilt it while this one waited
+        if _planner is None or _planner.data_version != await get_data_version():
+            await load_planner()
+    return _planner
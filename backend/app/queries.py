@@ -0,0 +1,281 @@
+"""Parameterized query builders shared by the data endpoints and the intent router.
+
+Filters go through the trigram lookup tables (see ``app/search.py``), so every
+query built here is an index lookup and takes user input only as parameters.
+Listings page with opaque keyset cursors rather than OFFSET, so a deep page
+costs the same as the first.
+"""
+
+import base64
+import json
+
+from app.search import operator_filter, terminal_filter
+
+TERMINAL_COLUMNS = "uid, name, city, longitude, latitude, country"
+
+ROUTE_COLUMNS = (
+    "uid, from_terminal_city, to_terminal_city, from_terminal_country, "
+    "to_terminal_country, operator_name, distance, transit_time_hours, "
+    "train_vs_truck_co2e_reduction_percent"
+)
+
+# Richer route rows for chat answers: schedule plus uids for the map
+SCHEDULE_COLUMNS = (
+    "uid, from_terminal_uid, to_terminal_uid, from_terminal_city, to_terminal_city, "
+    "from_terminal_country, to_terminal_country, operator_name, departure_day, "
+    "departure_time, arrival_day, arrival_time, transit_hours, distance, "
+    "train_vs_truck_co2e_reduction_percent"
+)
+
+# Every trains column but the free-text description, for bulk export
+EXPORT_ROUTE_COLUMNS = (
+    "uid, from_terminal_uid, to_terminal_uid, from_terminal_name, from_terminal_city, "
+    "from_terminal_country, to_terminal_name, to_terminal_city, to_terminal_country, "
+    "operator_uid, operator_name, sequence_number, route_hash_key, capacities_left, "
+    "end_of_booking_iso_weekday, end_of_booking_time, departure_iso_weekday, "
+    "departure_time, departure_day, arrival_iso_weekday, arrival_time, arrival_day, "
+    "transit_label, transit_hours, transit_time_hours, distance, total_distance, "
+    "train_emission_co2e_wtw_ton, truck_emission_co2e_wtw_ton, "
+    "train_vs_truck_co2e_reduction_percent, container20, container30, container40, "
+    "container45, swap_body, tank_container, semi_trailer, nikrasa, bulk, ro_la, "
+    "hazardous_goods"
+)
+
+# ORDER BY clauses callers may choose from; never built from user input
+ROUTE_ORDERS = {
+    "uid": "uid",
+    "origin": "from_terminal_city, uid",
+    "departure": "departure_iso_weekday, departure_time",
+    "greenest": "train_vs_truck_co2e_reduction_percent DESC",
+    "fastest": "transit_hours",
+}
+
+# Boolean cargo columns on trains that a route listing can require
+CARGO_TYPES = (
+    "container20", "container30", "container40", "container45", "swap_body",
+    "tank_container", "semi_trailer", "nikrasa", "bulk", "ro_la", "hazardous_goods",
+)
+
+# Keyset pagination: the sort key of each paged listing, matching a composite
+# index from data/seed.py. In paged queries the filters on indexed uid columns
+# are written as ``+column IN (...)``, which keeps SQLite from using those
+# indexes, so every page (filtered or not) walks the key index from the cursor
+# and stops after ``limit`` matches instead of sorting the whole filtered set.
+TERMINAL_KEY = ("city", "uid")
+ROUTE_KEY = ("from_terminal_city", "uid")
+
+
+def encode_cursor(row: dict, key: tuple[str, ...]) -> str:
+    """Opaque cursor pointing just past ``row`` in the ``key`` ordering."""
+    raw = json.dumps([row[column] for column in key], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key: tuple[str, ...]) -> list:
+    """The sort key values in ``cursor``; raises ``ValueError`` if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("Invalid cursor") from None
+    # Only the leading column may be NULL (a train without an origin city)
+    if (
+        not isinstance(values, list)
+        or len(values) != len(key)
+        or not all(v is None or isinstance(v, str | int | float) for v in values)
+        or values[-1] is None
+    ):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def _after(key: tuple[str, ...], values: list) -> tuple[str, list]:
+    """Rows past ``values`` in the ``(leading, uid)`` key order."""
+    leading, tie = key
+    if values[0] is None:
+        # NULLs sort first, and a row-value comparison with NULL matches nothing
+        return f"(({leading} IS NULL AND {tie} > ?) OR {leading} IS NOT NULL)", [values[1]]
+    # A row-value comparison is a range on the composite index
+    return f"({leading}, {tie}) > (?, ?)", list(values)
+
+
+def _where(conditions: list[str]) -> str:
+    return f"WHERE {' AND '.join(conditions)} " if conditions else ""
+
+
+def _terminal_conditions(
+    country: str | None, city: str | None, paged: bool = False
+) -> tuple[list[str], list]:
+    conditions = []
+    params: list = []
+    uid_column = "+uid" if paged else "uid"
+    for field, value in (("country", country), ("city", city)):
+        if value:
+            condition, values = terminal_filter(uid_column, field, value)
+            conditions.append(condition)
+            params.extend(values)
+    return conditions, params
+
+
+def terminals_query(
+    country: str | None = None,
+    city: str | None = None,
+    limit: int = 100,
+    after: list | None = None,
+    paged: bool = False,
+) -> tuple[str, list]:
+    """Terminals, optionally filtered by country and city (``limit=-1`` for all).
+
+    ``after`` is a decoded cursor: only terminals past it are returned. A
+    ``paged`` listing (implied by ``after``) is read through the key index.
+    """
+    conditions, params = _terminal_conditions(country, city, paged or after is not None)
+    if after is not None:
+        condition, values = _after(TERMINAL_KEY, after)
+        conditions.append(condition)
+        params.extend(values)
+    params.append(limit)
+    return (
+        f"SELECT {TERMINAL_COLUMNS} FROM terminals {_where(conditions)}"
+        f"ORDER BY {', '.join(TERMINAL_KEY)} LIMIT ?",
+        params,
+    )
+
+
+def terminals_count_query(country: str | None = None, city: str | None = None) -> tuple[str, list]:
+    """The number of terminals ``terminals_query`` pages through."""
+    conditions, params = _terminal_conditions(country, city)
+    return f"SELECT COUNT(*) AS total FROM terminals {_where(conditions)}".rstrip(), params
+
+
+def _route_conditions(
+    from_city: str | None,
+    to_city: str | None,
+    operator: str | None,
+    from_country: str | None,
+    to_country: str | None,
+    cargo: list[str] | None,
+    paged: bool = False,
+) -> tuple[list[str], list]:
+    conditions = []
+    params: list = []
+    plus = "+" if paged else ""
+    terminal_filters = (
+        ("from_terminal_uid", "city", from_city),
+        ("to_terminal_uid", "city", to_city),
+        ("from_terminal_uid", "country", from_country),
+        ("to_terminal_uid", "country", to_country),
+    )
+    for uid_column, field, value in terminal_filters:
+        if value:
+            condition, values = terminal_filter(plus + uid_column, field, value)
+            conditions.append(condition)
+            params.extend(values)
+    if operator:
+        condition, values = operator_filter(plus + "operator_uid", operator)
+        conditions.append(condition)
+        params.extend(values)
+    for flag in cargo or ():
+        if flag not in CARGO_TYPES:
+            raise ValueError(f"Unsupported cargo type: {flag}")
+        conditions.append(f"{flag} = 1")
+    return conditions, params
+
+
+def routes_query(
+    from_city: str | None = None,
+    to_city: str | None = None,
+    operator: str | None = None,
+    limit: int = 50,
+    columns: str = ROUTE_COLUMNS,
+    order: str = "origin",
+    from_country: str | None = None,
+    to_country: str | None = None,
+    cargo: list[str] | None = None,
+    after: list | None = None,
+    paged: bool = False,
+) -> tuple[str, list]:
+    """Trains with optional origin/destination/operator/cargo filters (``limit=-1`` for all).
+
+    ``cargo`` lists ``CARGO_TYPES`` a train must accept. ``after`` is a
+    decoded cursor; it and ``paged`` need the ``origin`` order, and read the
+    listing through the key index.
+    """
+    paged = paged or after is not None
+    if paged and order != "origin":
+        raise ValueError("Cursors page through the origin order only")
+    conditions, params = _route_conditions(
+        from_city, to_city, operator, from_country, to_country, cargo, paged
+    )
+    if after is not None:
+        condition, values = _after(ROUTE_KEY, after)
+        conditions.append(condition)
+        params.extend(values)
+    params.append(limit)
+    return (
+        f"SELECT {columns} FROM trains {_where(conditions)}ORDER BY {ROUTE_ORDERS[order]} LIMIT ?",
+        params,
+    )
+
+
+def routes_count_query(
+    from_city: str | None = None,
+    to_city: str | None = None,
+    operator: str | None = None,
+    from_country: str | None = None,
+    to_country: str | None = None,
+    cargo: list[str] | None = None,
+) -> tuple[str, list]:
+    """The number of trains ``routes_query`` pages through with the same filters."""
+    conditions, params = _route_conditions(
+        from_city, to_city, operator, from_country, to_country, cargo
+    )
+    return f"SELECT COUNT(*) AS total FROM trains {_where(conditions)}".rstrip(), params
+
+
+# Summary tables built by data/seed.py, by the grouping they summarize
+STATS_TABLES = {
+    "country_pairs": "stats_country_pairs",
+    "city_pairs": "stats_city_pairs",
+    "operators": "stats_operators",
+    "weekdays": "stats_weekdays",
+}
+
+STATS_ORDERS = {
+    "trains": "trains DESC",
+    "fastest": "avg_transit_hours",
+    "longest": "avg_distance_km DESC",
+    "greenest": "avg_co2_reduction_percent DESC",
+    "co2_saved": "co2_saved_ton DESC",
+}
+
+
+def stats_query(
+    by: str,
+    order: str = "trains",
+    limit: int = 50,
+    from_country: str | None = None,
+    to_country: str | None = None,
+) -> tuple[str, list]:
+    """Rows of the summary table for grouping ``by``, optionally for given countries.
+
+    The largest table, city pairs, holds about two thousand rows, so the country
+    filters are a case-insensitive match on the stored names rather than a
+    trigram lookup.
+    """
+    conditions = []
+    params: list = []
+    for column, value in (
+        ("from_terminal_country", from_country),
+        ("to_terminal_country", to_country),
+    ):
+        if value:
+            if by not in ("country_pairs", "city_pairs"):
+                raise ValueError(f"Country filters apply to country and city pairs, not {by}")
+            conditions.append(f"{column} LIKE ?")
+            params.append(value.replace("%", "").replace("_", ""))
+    params.append(limit)
+    return (
+        f"SELECT * FROM {STATS_TABLES[by]} {_where(conditions)}"
+        f"ORDER BY {STATS_ORDERS[order]} LIMIT ?",
+        params,
+    )
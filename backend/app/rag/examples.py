@@ -0,0 +1,343 @@
+"""Few-shot examples for SQL generation, retrieved by question similarity.
+
+Verified (question, SQL) pairs are kept in a bounded store and indexed with
+TF-IDF over normalized question words and word pairs. ``generate_sql`` gets
+the k most similar pairs instead of a fixed set of examples. Everything runs
+in-process; the store is optionally backed by a SQLite file so it survives
+restarts.
+
+A pair becomes verified in two steps. When its SQL runs successfully, it is
+recorded as *pending* for the chat thread, or for the question itself when the
+client sends no thread id. The next message settles it: the pair is promoted
+when the conversation moves on to a different question and dropped if the
+message looks like a retry (a rephrasing of the same question, or "that's
+wrong" and similar). Pairs that see no follow-up within
+``few_shot_verify_seconds`` expire unverified. Promotion may write to the
+SQLite file, so the chat route runs ``observe_question`` in a worker thread;
+the in-memory index has its own lock, and file writes happen outside it.
+"""
+
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from app.config import settings
+from app.rag.utils import normalize_question
+
+logger = logging.getLogger(__name__)
+
+# Always-available examples, used when nothing similar has been verified yet
+SEED_EXAMPLES = [
+    (
+        "Show trains from Rotterdam to Milan",
+        "SELECT from_terminal_city, to_terminal_city, operator_name, departure_day, "
+        "departure_time, arrival_day, arrival_time, transit_hours, distance, "
+        "train_vs_truck_co2e_reduction_percent FROM trains WHERE from_terminal_uid IN "
+        "(SELECT uid FROM terminals_fts WHERE city LIKE '%rotterdam%') AND to_terminal_uid IN "
+        "(SELECT uid FROM terminals_fts WHERE city LIKE '%milano%') LIMIT 50",
+    ),
+    (
+        "Which routes save the most CO2?",
+        "SELECT from_terminal_city, from_terminal_country, to_terminal_city, "
+        "to_terminal_country, operator_name, train_vs_truck_co2e_reduction_percent, "
+        "truck_emission_co2e_wtw_ton, train_emission_co2e_wtw_ton FROM trains "
+        "WHERE train_vs_truck_co2e_reduction_percent IS NOT NULL "
+        "ORDER BY train_vs_truck_co2e_reduction_percent DESC LIMIT 20",
+    ),
+    (
+        "List terminals in Germany",
+        "SELECT name, city, country, latitude, longitude FROM terminals WHERE uid IN "
+        "(SELECT uid FROM terminals_fts WHERE country LIKE '%germany%') ORDER BY city",
+    ),
+    (
+        "Average transit time from Germany to Italy",
+        "SELECT from_terminal_country, to_terminal_country, trains, avg_transit_hours, "
+        "min_transit_hours, max_transit_hours FROM stats_country_pairs "
+        "WHERE from_terminal_country = 'Germany' AND to_terminal_country = 'Italy'",
+    ),
+    (
+        "Which operators save the most CO2?",
+        "SELECT operator_name, trains, co2_saved_ton, avg_co2_reduction_percent "
+        "FROM stats_operators ORDER BY co2_saved_ton DESC LIMIT 20",
+    ),
+]
+
+# Follow-ups that mean the previous answer was wrong
+_RETRY_WORDS = re.compile(
+    r"\b(?:wrong|incorrect|not what|not right|that's not|that is not|try again|"
+    r"doesn'?t look|didn'?t work|mistake|actually|instead)\b",
+    re.IGNORECASE,
+)
+# A follow-up this similar to the pending question is treated as a rephrasing
+_RETRY_SIMILARITY = 0.5
+
+CREATE_EXAMPLES_SQL = """
+CREATE TABLE IF NOT EXISTS few_shot_examples (
+    key TEXT PRIMARY KEY,
+    question TEXT NOT NULL,
+    sql TEXT NOT NULL,
+    uses INTEGER NOT NULL DEFAULT 0,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def question_terms(question: str) -> Counter:
+    """Normalized words and adjacent word pairs of a question."""
+    words = normalize_question(question).split()
+    return Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+
+@dataclass
+class Example:
+    question: str
+    sql: str
+    terms: Counter
+    pinned: bool = False
+    uses: int = 0
+    last_used: float = 0.0
+
+
+class ExampleStore:
+    """Bounded TF-IDF index of verified question→SQL pairs with LRU eviction."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        path: str = "",
+        min_score: float = 0.2,
+        verify_after_seconds: float = 300.0,
+    ) -> None:
+        self.max_entries = max_entries
+        self.min_score = min_score
+        self.verify_after_seconds = verify_after_seconds
+        self._examples: OrderedDict[str, Example] = OrderedDict()
+        self._postings: dict[str, set[str]] = {}
+        self._pending: dict[str, tuple[str, str, float]] = {}
+        self._conn: sqlite3.Connection | None = None
+        # Guards the index and pending pairs; file writes take _db_lock instead
+        self._lock = threading.RLock()
+        self._db_lock = threading.Lock()
+        self.retrievals = 0
+        self.hits = 0
+        self.promoted = 0
+        self.rejected = 0
+        self.evictions = 0
+        for question, sql in SEED_EXAMPLES:
+            self._index(question, sql, pinned=True)
+        if path and max_entries > 0:
+            self._open(path)
+
+    def _open(self, path: str) -> None:
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(CREATE_EXAMPLES_SQL)
+        rows = self._conn.execute(
+            "SELECT question, sql, uses, last_used FROM few_shot_examples "
+            "ORDER BY last_used DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for question, sql, uses, last_used in reversed(rows):
+            example = self._index(question, sql)
+            example.uses, example.last_used = uses, last_used
+        logger.info("Loaded %d few-shot examples from %s", len(rows), path)
+
+    def __len__(self) -> int:
+        return sum(1 for e in self._examples.values() if not e.pinned)
+
+    def _index(self, question: str, sql: str, pinned: bool = False) -> Example:
+        key = normalize_question(question)
+        self._remove(key)
+        example = Example(question, sql, question_terms(question), pinned, 0, time.time())
+        self._examples[key] = example
+        for term in example.terms:
+            self._postings.setdefault(term, set()).add(key)
+        return example
+
+    def _remove(self, key: str) -> None:
+        example = self._examples.pop(key, None)
+        if example is None:
+            return
+        for term in example.terms:
+            keys = self._postings.get(term)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[term]
+
+    def _idf(self, term: str) -> float:
+        return math.log((1 + len(self._examples)) / (1 + len(self._postings.get(term, ())))) + 1
+
+    def _vector(self, terms: Counter) -> dict[str, float]:
+        vector = {t: (1 + math.log(n)) * self._idf(t) for t, n in terms.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {t: w / norm for t, w in vector.items()}
+
+    def search(self, question: str, k: int) -> list[tuple[Example, float]]:
+        """The ``k`` stored examples most similar to ``question`` (cosine over TF-IDF)."""
+        with self._lock:
+            return self._search(question, k)
+
+    def _search(self, question: str, k: int) -> list[tuple[Example, float]]:
+        query = self._vector(question_terms(question))
+        candidates = {key for term in query for key in self._postings.get(term, ())}
+        scored = []
+        for key in candidates:
+            example = self._examples[key]
+            vector = self._vector(example.terms)
+            score = sum(w * vector.get(t, 0.0) for t, w in query.items())
+            scored.append((score, key))
+        scored.sort(reverse=True)
+        return [(self._examples[key], score) for score, key in scored[:k]]
+
+    def examples_for(self, question: str, k: int) -> list[Example]:
+        """Examples to show the model for ``question``, topped up with the seed examples."""
+        with self._lock:
+            return self._examples_for(question, k)
+
+    def _examples_for(self, question: str, k: int) -> list[Example]:
+        self.expire_pending()
+        self.retrievals += 1
+        chosen = [e for e, score in self._search(question, k) if score >= self.min_score]
+        if any(not e.pinned for e in chosen):
+            self.hits += 1
+        now = time.time()
+        for example in chosen:
+            example.uses += 1
+            example.last_used = now
+            self._examples.move_to_end(normalize_question(example.question))
+        shown = {id(e) for e in chosen}
+        for example in self._examples.values():
+            if len(chosen) >= k:
+                break
+            if example.pinned and id(example) not in shown:
+                chosen.append(example)
+        return chosen
+
+    def add(self, question: str, sql: str) -> None:
+        """Store a verified pair, evicting the least recently used ones beyond capacity."""
+        if self.max_entries <= 0:
+            return
+        evicted = []
+        with self._lock:
+            example = self._index(question, sql)
+            while len(self) > self.max_entries:
+                oldest = next(key for key, e in self._examples.items() if not e.pinned)
+                self._remove(oldest)
+                self.evictions += 1
+                evicted.append((oldest,))
+        with self._db_lock:
+            if self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO few_shot_examples VALUES (?, ?, ?, ?, ?)",
+                    (normalize_question(question), question, sql, 0, example.last_used),
+                )
+                self._conn.executemany("DELETE FROM few_shot_examples WHERE key = ?", evicted)
+                self._conn.commit()
+
+    def record_pending(self, thread_id: str | None, question: str, sql: str) -> None:
+        """Remember a successful pair until the user's next message confirms it.
+
+        Identical questions in flight share one workflow run (``app.singleflight``),
+        so the pair is recorded once, under the thread that ran it. Without
+        thread ids the key is the question, which every coalesced request
+        shares; with them, only the leader's follow-up can confirm the pair.
+        """
+        key = thread_id or f"question:{normalize_question(question)}"
+        with self._lock:
+            self._pending[key] = (question, sql, time.time())
+
+    def observe_question(
+        self, thread_id: str | None, question: str, previous: str | None = None
+    ) -> None:
+        """Promote or reject the pending pair based on the question that follows it.
+
+        Without a thread id the pair is found by ``previous``, the user's prior
+        message in the conversation.
+        """
+        key = thread_id or (previous and f"question:{normalize_question(previous)}")
+        with self._lock:
+            self.expire_pending()
+            if not key or key not in self._pending:
+                return
+            pending_question, sql, _ = self._pending.pop(key)
+            if self._is_retry(pending_question, question):
+                self.rejected += 1
+                logger.info("Dropping few-shot candidate after retry: %s", pending_question)
+                return
+            self.promoted += 1
+        # Outside the lock: add() writes to the file
+        self.add(pending_question, sql)
+
+    def _is_retry(self, previous: str, follow_up: str) -> bool:
+        if _RETRY_WORDS.search(follow_up):
+            return True
+        a, b = self._vector(question_terms(previous)), self._vector(question_terms(follow_up))
+        return sum(w * b.get(t, 0.0) for t, w in a.items()) >= _RETRY_SIMILARITY
+
+    def expire_pending(self, now: float | None = None) -> None:
+        """Drop pending pairs that got no follow-up within the verification window."""
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [
+                key
+                for key, (_, _, created_at) in self._pending.items()
+                if now - created_at >= self.verify_after_seconds
+            ]
+            for key in expired:
+                del self._pending[key]
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self),
+            "pending": len(self._pending),
+            "retrievals": self.retrievals,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.retrievals if self.retrievals else 0.0,
+            "promoted": self.promoted,
+            "rejected": self.rejected,
+            "evictions": self.evictions,
+        }
+
+
+def render_examples(pairs: Iterable[tuple[str, str]]) -> str:
+    """Format (question, SQL) pairs the way the SQL prompt shows them."""
+    return "\n\n".join(f'User: "{question}"\nSQL: {sql}' for question, sql in pairs)
+
+
+_store: ExampleStore | None = None
+
+
+def init_example_store() -> ExampleStore:
+    global _store
+    _store = ExampleStore(
+        settings.few_shot_size,
+        settings.few_shot_path,
+        settings.few_shot_min_score,
+        settings.few_shot_verify_seconds,
+    )
+    return _store
+
+
+def close_example_store() -> None:
+    global _store
+    if _store:
+        _store.close()
+        _store = None
+
+
+def get_example_store() -> ExampleStore | None:
+    """Return the example store, or ``None`` if it hasn't been initialized."""
+    return _store
@@ -9,22 +9,21 @@ IMPORTANT RULES:
 - Write ONLY a valid SQLite SELECT query. No INSERT, UPDATE, DELETE, DROP, or ALTER.
 - Use LIKE for case-insensitive text matching (SQLite LIKE is case-insensitive for ASCII).
 - Country names are full names: "Germany", "Netherlands", "Italy", "France", etc.
-- City names may be partial — use LIKE with % wildcards.
+- City names may be partial and use local spellings ("Milano", "Köln", "München", "Wien", "Antwerpen").
+- Match cities, countries, terminal names and operators through the indexed lookup tables, never with LIKE '%x%' on trains or terminals directly:
+  trains by city: from_terminal_uid IN (SELECT uid FROM terminals_fts WHERE city LIKE '%rotterdam%')
+  terminals by country: uid IN (SELECT uid FROM terminals_fts WHERE country LIKE '%germany%')
+  trains by operator: operator_uid IN (SELECT uid FROM operators_fts WHERE name LIKE '%hupac%')
+  Search terms in *_fts tables must be lowercase without accents ("koln", not "Köln").
 - For CO2 queries, use train_vs_truck_co2e_reduction_percent or compare truck/train emission columns.
+- For counts, averages, minimums, maximums or totals per country pair, city pair, operator or weekday, read the stats_* summary tables (one row per group) instead of GROUP BY over trains. They hold exact names, so plain = or LIKE works on them.
 - Always LIMIT results to 50 unless the user asks for aggregation.
 - For "routes from X to Y", filter on from_terminal_city and to_terminal_city.
 - Return useful columns: include city names, country, operator, distance, transit, emissions.
 - Do NOT wrap the SQL in markdown code fences.
 
 EXAMPLES:
-User: "Show trains from Rotterdam to Milan"
-SQL: SELECT from_terminal_city, to_terminal_city, operator_name, departure_day, departure_time, arrival_day, arrival_time, transit_hours, distance, train_vs_truck_co2e_reduction_percent FROM trains WHERE from_terminal_city LIKE '%Rotterdam%' AND to_terminal_city LIKE '%Milan%' LIMIT 50
-
-User: "Which routes save the most CO2?"
-SQL: SELECT from_terminal_city, from_terminal_country, to_terminal_city, to_terminal_country, operator_name, train_vs_truck_co2e_reduction_percent, truck_emission_co2e_wtw_ton, train_emission_co2e_wtw_ton FROM trains WHERE train_vs_truck_co2e_reduction_percent IS NOT NULL ORDER BY train_vs_truck_co2e_reduction_percent DESC LIMIT 20
-
-User: "List terminals in Germany"
-SQL: SELECT name, city, country, latitude, longitude FROM terminals WHERE country LIKE '%Germany%' ORDER BY city
+{examples}
 
 User question: {question}
 SQL:"""
@@ -70,7 +69,6 @@ Return ONLY valid JSON with this structure:
   "title": "descriptive chart title",
   "x_key": "column name for x-axis",
   "y_key": "column name for y-axis",
-  "data": [array of data objects],
   "x_label": "human-readable x-axis label",
   "y_label": "human-readable y-axis label"
 }}
@@ -81,40 +79,11 @@ Choose the most appropriate chart type:
 - pie: proportional breakdown
 - scatter: correlation between two numeric values
 
-User question: {question}
-
-Query results:
-{results}
-
-JSON:"""
-
-MAP_GENERATION_PROMPT = """You are a geospatial data expert. Given query results containing terminal
-or route data with coordinates, generate a GeoJSON FeatureCollection.
-
-Return ONLY valid JSON with this structure:
-{{
-  "type": "FeatureCollection",
-  "features": [
-    {{
-      "type": "Feature",
-      "geometry": {{
-        "type": "Point",
-        "coordinates": [longitude, latitude]
-      }},
-      "properties": {{
-        "name": "terminal or city name",
-        "description": "relevant details"
-      }}
-    }}
-  ]
-}}
-
-For routes (with from/to coordinates), create LineString features connecting terminals.
-For terminals, create Point features.
+Do NOT include the data rows in your answer; x_key and y_key must be column names from the results.
 
 User question: {question}
 
 Query results:
 {results}
 
-GeoJSON:"""
+JSON:"""
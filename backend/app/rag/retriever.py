@@ -0,0 +1,379 @@
+"""Question-specific schema for the SQL prompts.
+
+The schema is read from the live database (``sqlite_master`` and the table
+pragmas) at startup, so new tables and columns show up without editing a
+prompt. Each question only gets the tables and columns it is likely to need:
+a small core of identifying columns, plus the column groups whose trigger
+words appear in the question, plus any column whose name or description
+matches a question word. Aggregate questions ("average", "busiest", "how
+many") also get the ``stats_*`` summary tables for the grouping they name.
+Rendered schemas are cached per selection, so the questions of one class
+share a single rendering.
+"""
+
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.config import settings
+from app.db import execute_parameterized, get_data_version
+from app.rag.schema import COLUMN_DESCRIPTIONS, STATIC_SCHEMA, TABLE_DESCRIPTIONS
+from app.rag.utils import fold_accents
+
+logger = logging.getLogger(__name__)
+
+# Columns always sent when their table is selected
+CORE_COLUMNS = {
+    "trains": {
+        "uid", "from_terminal_uid", "to_terminal_uid", "from_terminal_name",
+        "from_terminal_city", "from_terminal_country", "to_terminal_name",
+        "to_terminal_city", "to_terminal_country", "operator_uid", "operator_name",
+    },
+}
+
+# Column groups pulled in by words in the question: name → (trigger words, {table: columns})
+TOPICS = {
+    "schedule": (
+        {
+            "day", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday",
+            "sunday", "weekday", "weekend", "depart", "departure", "arrive", "arrival",
+            "leave", "when", "schedule", "timetable", "morning", "evening", "night",
+        },
+        {"trains": [
+            "departure_iso_weekday", "departure_time", "departure_day",
+            "arrival_iso_weekday", "arrival_time", "arrival_day",
+        ]},
+    ),
+    "transit": (
+        {"fast", "fastest", "quick", "quickest", "slow", "slowest", "hour", "duration",
+         "transit", "time", "take", "long", "longest"},
+        {"trains": ["transit_hours", "transit_label", "transit_time_hours"]},
+    ),
+    "distance": (
+        {"distance", "km", "far", "farthest", "longest", "shortest", "kilometre",
+         "kilometer", "mile"},
+        {"trains": ["total_distance", "distance"]},
+    ),
+    "emissions": (
+        {"co2", "emission", "green", "greenest", "carbon", "sustainable", "clean",
+         "cleanest", "pollution", "eco", "climate", "truck", "saving", "save", "reduction"},
+        {"trains": [
+            "truck_emission_co2e_wtw_ton", "train_emission_co2e_wtw_ton",
+            "train_vs_truck_co2e_reduction_percent",
+        ]},
+    ),
+    "capacity": (
+        {"capacity", "space", "full", "available", "availability", "free", "book"},
+        {"trains": ["capacities_left"]},
+    ),
+    "cargo": (
+        {"container", "20ft", "30ft", "40ft", "45ft", "teu", "swap", "tank", "trailer",
+         "semi", "bulk", "hazardous", "dangerous", "adr", "nikrasa", "rola", "cargo",
+         "goods", "accept", "load", "unit", "craneable"},
+        {"trains": [
+            "container20", "container30", "container40", "container45", "swap_body",
+            "tank_container", "semi_trailer", "nikrasa", "bulk", "ro_la", "hazardous_goods",
+        ]},
+    ),
+    "legs": (
+        {"leg", "sequence", "stop", "multi", "segment", "geometry"},
+        {"trains": ["sequence_number", "route_hash_key"]},
+    ),
+}
+
+# Words that select a table: table → trigger words
+TABLE_TRIGGERS = {
+    "trains": {"train", "route", "connection", "service", "from", "between", "rail", "ship",
+               "shipping", "freight", "frequency", "operate", "run"},
+    "terminals": {"terminal", "hub", "port", "location", "located", "where", "coordinate",
+                  "latitude", "longitude", "map", "near", "nearest", "city", "cities"},
+    "operators": {"operator", "company", "companies", "carrier"},
+}
+
+# Lookup tables that ride along with the table they index
+FTS_TABLES = {"terminals_fts": "terminals", "operators_fts": "operators"}
+
+# Summary tables, sent for aggregate questions: table → words naming its grouping
+STATS_TABLES = {
+    "stats_country_pairs": {"country", "countries", "corridor", "international", "border"},
+    "stats_city_pairs": {"city", "cities", "corridor", "lane", "pair"},
+    "stats_operators": {"operator", "company", "companies", "carrier"},
+    "stats_weekdays": {
+        "day", "weekday", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday",
+        "sunday",
+    },
+}
+_RANKING_WORDS = {"most", "least", "top", "rank", "ranking"}
+_AGGREGATE_WORDS = _RANKING_WORDS | {
+    "average", "avg", "mean", "typical", "total", "overall", "busiest", "count", "number",
+    "many", "statistic", "stat", "summary", "aggregate",
+}
+
+# Words too common to select a column by name or description
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "by", "e", "g", "for", "from", "how", "i", "if",
+    "in", "is", "it", "many", "me", "most", "much", "of", "on", "or", "per", "show", "than",
+    "that", "the", "to", "what", "which", "with", "name", "uid", "1", "0", "has",
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Examples in descriptions ('(e.g. "Rotterdam")') shouldn't select the column
+_EXAMPLES = re.compile(r"\(e\.g\.[^)]*\)")
+
+
+def _words(text: str) -> set[str]:
+    """Lowercase, accent-free words with a plural "s" stripped."""
+    words = set()
+    for word in _WORD.findall(fold_accents(text).lower()):
+        words.add(word)
+        if len(word) > 3 and word.endswith("s"):
+            words.add(word[:-1])
+    return words
+
+
+@dataclass(frozen=True, slots=True)
+class Column:
+    name: str
+    type: str
+    primary_key: bool = False
+    references: str | None = None
+    description: str = ""
+
+    def render(self) -> str:
+        parts = [self.name, self.type] if self.type else [self.name]
+        if self.primary_key:
+            parts.append("PK")
+        if self.references:
+            parts.append(f"→ {self.references}")
+        line = " ".join(parts)
+        return f"{line} — {self.description}" if self.description else line
+
+
+@dataclass(frozen=True, slots=True)
+class Table:
+    name: str
+    columns: tuple[Column, ...]
+    description: str = ""
+
+
+_encoding = None
+_encoding_failed = False
+
+
+def _load_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is not None or _encoding_failed:
+        return _encoding
+    try:
+        import tiktoken
+
+        try:
+            _encoding = tiktoken.encoding_for_model(settings.openai_model)
+        except KeyError:
+            _encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its BPE files on first use; offline, fall back to an estimate
+        logger.warning("tiktoken encoding unavailable (%s), estimating token counts", e)
+        _encoding_failed = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Prompt tokens for ``text`` with the configured model's encoding (or an estimate)."""
+    encoding = _load_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+
+class SchemaRetriever:
+    """Selects and renders the relevant part of the schema for a question."""
+
+    def __init__(self, tables: list[Table], data_version: int = 0, cache_size: int = 256):
+        self.tables = {t.name: t for t in tables}
+        self.data_version = data_version
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple, tuple[str, int]] = OrderedDict()
+        self._column_words = {
+            (t.name, c.name): _words(
+                c.name.replace("_", " ") + " " + _EXAMPLES.sub("", c.description)
+            )
+            - _STOPWORDS
+            for t in tables
+            for c in t.columns
+        }
+        self.full_schema = self._render({t.name: {c.name for c in t.columns} for t in tables})
+        self.full_tokens = count_tokens(self.full_schema)
+        self.retrievals = 0
+        self.prompt_tokens = 0
+
+    def select(self, text: str) -> dict[str, set[str]]:
+        """Table → column names relevant to ``text``."""
+        words = _words(text)
+        selected: dict[str, set[str]] = {}
+
+        def add(table: str, columns) -> None:
+            if table in self.tables:
+                selected.setdefault(table, set()).update(columns)
+
+        for table, triggers in TABLE_TRIGGERS.items():
+            if words & triggers:
+                add(table, ())
+        for triggers, columns_by_table in TOPICS.values():
+            if words & triggers:
+                for table, columns in columns_by_table.items():
+                    add(table, columns)
+        for (table, column), column_words in self._column_words.items():
+            if table in FTS_TABLES or table in STATS_TABLES:
+                continue
+            if column in CORE_COLUMNS.get(table, ()):
+                continue
+            if words & column_words:
+                add(table, [column])
+        if not selected:
+            # Nothing recognizable: every base table with its core columns
+            for table in self.tables:
+                if table not in FTS_TABLES and table not in STATS_TABLES:
+                    add(table, ())
+        for table in self._stats_tables(words):
+            add(table, ())
+
+        for table in list(selected):
+            core = CORE_COLUMNS.get(table)
+            all_columns = {c.name for c in self.tables[table].columns}
+            selected[table] |= core & all_columns if core is not None else all_columns
+        for fts, base in FTS_TABLES.items():
+            # City, country and operator filters go through the trigram lookup tables
+            if base in selected or (base == "terminals" and "trains" in selected):
+                add(fts, {c.name for c in self.tables[fts].columns} if fts in self.tables else ())
+        return selected
+
+    @staticmethod
+    def _stats_tables(words: set[str]) -> list[str]:
+        """Summary tables for an aggregate question, by the grouping it names."""
+        if not words & _AGGREGATE_WORDS:
+            return []
+        tables = [table for table, triggers in STATS_TABLES.items() if words & triggers]
+        if not tables and words & (_AGGREGATE_WORDS - _RANKING_WORDS):
+            # "average transit Germany to Italy": no grouping named, so corridors
+            tables = ["stats_country_pairs", "stats_city_pairs"]
+        return tables
+
+    def _render(self, selected: dict[str, set[str]]) -> str:
+        blocks = []
+        for table in self.tables.values():
+            if table.name not in selected:
+                continue
+            header = f"{table.name}: {table.description}" if table.description else table.name
+            lines = [header]
+            lines.extend(
+                f"  {c.render()}" for c in table.columns if c.name in selected[table.name]
+            )
+            blocks.append("\n".join(lines))
+        return "\n\n".join(blocks)
+
+    def retrieve(self, text: str) -> str:
+        """Compact schema for the tables and columns ``text`` is likely to need."""
+        selected = self.select(text)
+        key = tuple(sorted((table, tuple(sorted(cols))) for table, cols in selected.items()))
+        cached = self._cache.get(key)
+        if cached is None:
+            schema = self._render(selected)
+            cached = self._cache[key] = (schema, count_tokens(schema))
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        schema, tokens = cached
+        self.retrievals += 1
+        self.prompt_tokens += tokens
+        logger.debug("Schema for prompt: %d tokens (full schema %d)", tokens, self.full_tokens)
+        return schema
+
+    def stats(self) -> dict:
+        return {
+            "tables": len(self.tables),
+            "full_schema_tokens": self.full_tokens,
+            "retrievals": self.retrievals,
+            "avg_schema_tokens": self.prompt_tokens / self.retrievals if self.retrievals else 0.0,
+            "cached_classes": len(self._cache),
+            "token_counter": "tiktoken" if _encoding is not None else "estimate",
+        }
+
+
+async def read_tables() -> list[Table]:
+    """Read user tables, columns and foreign keys from the live database."""
+    rows = await execute_parameterized(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'table' "
+        "AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+    )
+    virtual = [r["name"] for r in rows if (r["sql"] or "").upper().startswith("CREATE VIRTUAL")]
+    tables = []
+    for row in rows:
+        name = row["name"]
+        # Skip FTS5 shadow tables (terminals_fts_data, terminals_fts_idx, ...)
+        if any(name.startswith(f"{v}_") for v in virtual):
+            continue
+        columns = await execute_parameterized(
+            "SELECT name, type, pk FROM pragma_table_info(?) ORDER BY cid", (name,)
+        )
+        keys = await execute_parameterized(
+            'SELECT "from", "table", "to" FROM pragma_foreign_key_list(?)', (name,)
+        )
+        references = {k["from"]: f"{k['table']}.{k['to'] or 'uid'}" for k in keys}
+        descriptions = COLUMN_DESCRIPTIONS.get(name, {})
+        tables.append(
+            Table(
+                name=name,
+                description=TABLE_DESCRIPTIONS.get(name, ""),
+                columns=tuple(
+                    Column(
+                        name=c["name"],
+                        type=c["type"],
+                        primary_key=bool(c["pk"]),
+                        references=references.get(c["name"]),
+                        description=descriptions.get(c["name"], ""),
+                    )
+                    for c in columns
+                ),
+            )
+        )
+    return tables
+
+
+_retriever: SchemaRetriever | None = None
+_reload = asyncio.Lock()
+
+
+async def load_schema_retriever() -> SchemaRetriever:
+    """Build the retriever from the live schema."""
+    global _retriever
+    await asyncio.to_thread(_load_encoding)
+    version = await get_data_version()
+    tables = await read_tables()
+    _retriever = await asyncio.to_thread(SchemaRetriever, tables, version)
+    logger.info(
+        "Loaded schema for %d tables (%d tokens in full)",
+        len(_retriever.tables),
+        _retriever.full_tokens,
+    )
+    return _retriever
+
+
+def current_schema_retriever() -> SchemaRetriever | None:
+    """Return the loaded retriever without reloading it (for stats)."""
+    return _retriever
+
+
+async def retrieve_schema(text: str) -> str:
+    """Pruned schema for ``text``; the static schema if none has been loaded."""
+    if _retriever is None:
+        return STATIC_SCHEMA
+    if _retriever.data_version != await get_data_version(settings.data_version_check_seconds):
+        async with _reload:
+            # Another request may have rebuilt it while this one waited
+            if _retriever.data_version != await get_data_version():
+                await load_schema_retriever()
+    return _retriever.retrieve(text)
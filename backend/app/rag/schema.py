@@ -1,4 +1,93 @@
-"""Database schema description for LLM prompts."""
+"""Database schema description for LLM prompts.
+
+``STATIC_SCHEMA`` is the full hand-written schema, used when the live schema
+hasn't been loaded. ``app/rag/retriever.py`` builds pruned prompts from the
+live database instead, annotating columns with the descriptions below.
+
+The ``stats_*`` tables are summaries of ``trains`` built by ``data/seed.py``
+and kept current by triggers, so aggregate questions read one row per group.
+"""
+
+TABLE_DESCRIPTIONS = {
+    "terminals": "rail terminals with coordinates",
+    "operators": "rail freight operators",
+    "trains": "one row per scheduled weekly train",
+    "terminals_fts": "trigram index over terminals; same rowid and uid",
+    "operators_fts": "trigram index over operators; same rowid and uid",
+    "stats_country_pairs": "summary of trains per origin/destination country pair",
+    "stats_city_pairs": "summary of trains per origin/destination city pair",
+    "stats_operators": "summary of trains per operator",
+    "stats_weekdays": "summary of trains per departure weekday",
+}
+
+# Measures shared by every stats_* table, one row per group
+_STATS_COLUMNS = {
+    "trains": "number of weekly trains in the group",
+    "operators": "number of distinct operators",
+    "min_transit_hours": "shortest transit time in hours (0-hour placeholders excluded)",
+    "avg_transit_hours": "average transit time in hours (0-hour placeholders excluded)",
+    "max_transit_hours": "longest transit time in hours",
+    "min_distance_km": "shortest total distance in km",
+    "avg_distance_km": "average total distance in km",
+    "max_distance_km": "longest total distance in km",
+    "min_co2_reduction_percent": "lowest % CO2 saved vs truck",
+    "avg_co2_reduction_percent": "average % CO2 saved vs truck",
+    "max_co2_reduction_percent": "highest % CO2 saved vs truck",
+    "co2_saved_ton": "total weekly CO2 saved vs truck (tons)",
+}
+
+COLUMN_DESCRIPTIONS = {
+    "terminals": {
+        "name": 'terminal name (e.g. "Rotterdam Europoort")',
+        "city": "city where terminal is located",
+        "country": 'country name (e.g. "Netherlands", "Germany", "Italy")',
+    },
+    "operators": {
+        "name": "rail freight operator company name",
+    },
+    "terminals_fts": {
+        "name": 'lowercase, accents removed (e.g. "koln-eifeltor")',
+        "city": 'lowercase, accents removed (e.g. "koln", "munchen", "milano")',
+        "country": 'lowercase (e.g. "germany")',
+    },
+    "operators_fts": {
+        "name": "lowercase, accents removed",
+    },
+    "trains": {
+        "capacities_left": "1=has capacity, 0=full",
+        "departure_iso_weekday": "1=Monday, 7=Sunday",
+        "departure_time": "HH:MM",
+        "departure_day": 'day name (e.g. "Wednesday")',
+        "arrival_iso_weekday": "1=Monday, 7=Sunday",
+        "arrival_time": "HH:MM",
+        "arrival_day": "day name",
+        "total_distance": "km",
+        "transit_label": "human-readable transit time",
+        "transit_hours": "total transit time in hours",
+        "truck_emission_co2e_wtw_ton": "CO2 emissions if shipped by truck (tons)",
+        "train_emission_co2e_wtw_ton": "CO2 emissions by train (tons)",
+        "train_vs_truck_co2e_reduction_percent": "% CO2 saved vs truck",
+        "route_hash_key": "hash identifier for the route geometry",
+        "distance": "segment distance in km",
+        "transit_time_hours": "segment transit time",
+        "sequence_number": "leg sequence in multi-stop routes",
+        "container20": "1=accepts 20ft containers",
+        "container30": "1=accepts 30ft containers",
+        "container40": "1=accepts 40ft containers",
+        "container45": "1=accepts 45ft containers",
+        "swap_body": "1=accepts swap bodies",
+        "tank_container": "1=accepts tank containers",
+        "semi_trailer": "1=accepts semi-trailers",
+        "nikrasa": "1=accepts non-craneable trailers (NiKRASA)",
+        "bulk": "1=accepts bulk cargo",
+        "ro_la": "1=rolling highway (trucks on trains)",
+        "hazardous_goods": "1=accepts hazardous goods",
+    },
+    "stats_country_pairs": _STATS_COLUMNS,
+    "stats_city_pairs": _STATS_COLUMNS,
+    "stats_operators": _STATS_COLUMNS,
+    "stats_weekdays": {**_STATS_COLUMNS, "departure_iso_weekday": "1=Monday, 7=Sunday"},
+}
 
 STATIC_SCHEMA = """TABLE terminals:
   uid TEXT PRIMARY KEY
@@ -12,6 +101,16 @@ TABLE operators:
   uid TEXT PRIMARY KEY
   name TEXT NOT NULL — rail freight operator company name
 
+TABLE terminals_fts — trigram full-text index over terminals (same rowid and uid):
+  uid TEXT — terminals.uid
+  name TEXT — lowercase, accents removed (e.g. "koln-eifeltor")
+  city TEXT — lowercase, accents removed (e.g. "koln", "munchen", "milano")
+  country TEXT — lowercase (e.g. "germany")
+
+TABLE operators_fts — trigram full-text index over operators (same rowid and uid):
+  uid TEXT — operators.uid
+  name TEXT — lowercase, accents removed
+
 TABLE trains:
   uid TEXT PRIMARY KEY
   capacities_left INTEGER — 1=has capacity, 0=full
@@ -51,4 +150,29 @@ TABLE trains:
   nikrasa INTEGER
   bulk INTEGER
   ro_la INTEGER — rolling highway (trucks on trains)
-  hazardous_goods INTEGER"""
+  hazardous_goods INTEGER
+
+TABLE stats_country_pairs — summary of trains per origin/destination country pair:
+  from_terminal_country TEXT
+  to_terminal_country TEXT
+  trains INTEGER — number of weekly trains in the group
+  operators INTEGER — number of distinct operators
+  min_transit_hours, avg_transit_hours, max_transit_hours REAL — transit time in hours, excluding
+    trains with a 0-hour placeholder schedule
+  min_distance_km, avg_distance_km, max_distance_km REAL — total distance in km
+  min_co2_reduction_percent, avg_co2_reduction_percent, max_co2_reduction_percent REAL
+  co2_saved_ton REAL — total weekly CO2 saved vs truck (tons)
+
+TABLE stats_city_pairs — the same measures per origin/destination city pair:
+  from_terminal_city TEXT
+  to_terminal_city TEXT
+  from_terminal_country TEXT
+  to_terminal_country TEXT
+
+TABLE stats_operators — the same measures per operator (without operators):
+  operator_uid TEXT
+  operator_name TEXT
+
+TABLE stats_weekdays — the same measures per departure weekday:
+  departure_iso_weekday INTEGER — 1=Monday, 7=Sunday
+  departure_day TEXT"""
@@ -1,6 +1,36 @@
 """Utility functions for RAG processing."""
 
 import re
+import unicodedata
+
+# English/alternate spellings → the city names used in the terminals data.
+# Spellings the data itself uses ("Antwerp" and "Antwerpen", "Lübeck" and
+# "Lübeck-Travemünde") are not aliased: each is a name of its own.
+CITY_ALIASES = {
+    "milan": "milano",
+    "cologne": "koln",
+    "koeln": "koln",
+    "munich": "munchen",
+    "muenchen": "munchen",
+    "vienna": "wien",
+    "anvers": "antwerp",
+    "genoa": "genova",
+    "venice": "venezia",
+    "prague": "praha",
+    "warsaw": "warszawa",
+    "ghent": "gent",
+    "nuremberg": "nurnberg",
+    "nuernberg": "nurnberg",
+    "basle": "basel",
+    "bale": "basel",
+    "goteborg": "gothenburg",
+}
+
+# Words that don't change what a question asks for
+_FILLER_WORDS = {
+    "a", "an", "the", "please", "show", "me", "list", "give", "find", "get", "all",
+    "can", "could", "you", "what", "which", "are", "is", "there", "any", "i", "want", "see",
+}
 
 
 def extract_sql(text: str) -> str:
@@ -20,16 +50,6 @@ def extract_sql(text: str) -> str:
     return cleaned
 
 
-def is_read_only_sql(sql: str) -> bool:
-    """Check if SQL is a read-only SELECT query (no mutations)."""
-    normalized = sql.strip().upper()
-    dangerous = ["INSERT", "UPDATE", "DELETE", "DROP", "ALTER", "CREATE", "TRUNCATE", "GRANT"]
-    for keyword in dangerous:
-        if re.search(rf"\b{keyword}\b", normalized):
-            return False
-    return normalized.startswith("SELECT") or normalized.startswith("WITH")
-
-
 def truncate_results(results: list[dict], max_rows: int = 50) -> list[dict]:
     """Truncate query results to a maximum number of rows."""
     return results[:max_rows]
@@ -51,6 +71,26 @@ def format_results_for_llm(results: list[dict], max_rows: int = 30) -> str:
     return "\n".join(lines)
 
 
+def fold_accents(text: str) -> str:
+    """Strip diacritics so "München" and "Munchen" compare equal."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize_question(question: str) -> str:
+    """Canonicalize a question for cache lookups.
+
+    Folds case, accents, punctuation and whitespace, maps city aliases to the
+    names used in the data, and drops filler words, so "Show me trains from
+    Rotterdam to Milan!" and "trains from rotterdam to milano" share a key.
+    """
+    text = fold_accents(question).lower()
+    # A dot between digits belongs to the number: "3.5 hours" keeps its "3.5"
+    words = re.findall(r"[a-z0-9](?:[a-z0-9\-]|(?<=\d)\.(?=\d))*", text)
+    words = [CITY_ALIASES.get(w, w) for w in words if w not in _FILLER_WORDS]
+    return " ".join(words)
+
+
 def clean_route_hash_key(key: str) -> str:
     """Normalize a route hash key."""
     return key.strip().lower()
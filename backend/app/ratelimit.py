@@ -0,0 +1,208 @@
+"""GCRA rate limiting with constant state per client.
+
+The generic cell rate algorithm keeps one number per key, the theoretical
+arrival time (TAT) of the client's next request. Each allowed request moves
+it ``interval = 60 / rpm`` seconds forward. A request is refused while the
+TAT is more than ``burst`` intervals ahead of now. That gives the same limit
+as a sliding window of timestamps, in O(1) time and space per key.
+
+Two backends share the algorithm:
+
+- ``MemoryRateLimiter``: an LRU-bounded dict, for a single worker;
+- ``SQLiteRateLimiter``: a table in a WAL-mode SQLite file. The check is one
+  atomic UPSERT, so every uvicorn worker pointed at ``RATE_LIMIT_PATH`` draws
+  from the same budget.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CREATE_RATE_LIMITS_SQL = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    tat REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+# Allowed requests move the stored TAT forward, refused ones leave it alone
+_GCRA_SQL = """
+INSERT INTO rate_limits (key, tat) VALUES (:key, :now + :interval)
+ON CONFLICT (key) DO UPDATE SET tat = max(tat, :now) + :interval
+WHERE max(tat, :now) + :interval - :now <= :window
+RETURNING tat
+"""
+
+# Expired keys are dropped every this many checks
+_PRUNE_EVERY = 1000
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    # Seconds until the next request would be allowed (0 when allowed)
+    retry_after: float = 0.0
+
+
+def _interval(rpm: int) -> float:
+    return 60.0 / rpm
+
+
+class MemoryRateLimiter:
+    """GCRA state per key in an LRU-bounded dict (one worker)."""
+
+    def __init__(self, max_keys: int = 10_000, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._tats: OrderedDict[str, float] = OrderedDict()
+        # check() may run on several threads (sync routes, to_thread callers)
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+
+    def check(self, key: str, rpm: int, burst: int) -> Decision:
+        interval = _interval(rpm)
+        with self._lock:
+            now = self.clock()
+            tat = max(self._tats.get(key, now), now) + interval
+            if tat - now > interval * burst:
+                # A refused client is still active and must not be evicted first
+                self._tats.move_to_end(key)
+                self.limited += 1
+                return Decision(False, tat - now - interval * burst)
+
+            self._tats[key] = tat
+            self._tats.move_to_end(key)
+            if len(self._tats) > self.max_keys:
+                # The least recently seen client starts over with a full burst
+                self._tats.popitem(last=False)
+                self.evictions += 1
+            self.allowed += 1
+            return Decision(True)
+
+    def close(self) -> None:
+        self._tats.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "keys": len(self._tats),
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteRateLimiter:
+    """GCRA state per key in a SQLite file shared by every worker."""
+
+    def __init__(
+        self, path: str, max_keys: int = 10_000, clock: Callable[[], float] = time.time
+    ) -> None:
+        self.path = path
+        self.max_keys = max_keys
+        # Workers compare TATs from the same file, so the clock must be wall time
+        self.clock = clock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=200")
+        self._conn.execute(CREATE_RATE_LIMITS_SQL)
+        # The connection is shared by every thread in this worker
+        self._lock = threading.Lock()
+        self._checks = 0
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def check(self, key: str, rpm: int, burst: int) -> Decision:
+        now = self.clock()
+        interval = _interval(rpm)
+        window = interval * burst
+        try:
+            with self._lock:
+                allowed = self._conn.execute(
+                    _GCRA_SQL, {"key": key, "now": now, "interval": interval, "window": window}
+                ).fetchone()
+                if not allowed:
+                    (tat,) = self._conn.execute(
+                        "SELECT tat FROM rate_limits WHERE key = ?", (key,)
+                    ).fetchone()
+                self._checks += 1
+                if self._checks % _PRUNE_EVERY == 0:
+                    self._prune(now)
+        except sqlite3.Error as e:
+            # A locked or broken limiter file must not take the chat endpoint down
+            self.errors += 1
+            logger.warning("Rate limiter unavailable, allowing request: %s", e)
+            return Decision(True)
+
+        if allowed:
+            self.allowed += 1
+            return Decision(True)
+        self.limited += 1
+        return Decision(False, max(tat, now) + interval - now - window)
+
+    def _prune(self, now: float) -> None:
+        """Drop keys whose TAT has passed (they are back to a full burst), then the oldest."""
+        self._conn.execute("DELETE FROM rate_limits WHERE tat < ?", (now,))
+        (keys,) = self._conn.execute("SELECT COUNT(*) FROM rate_limits").fetchone()
+        if keys > self.max_keys:
+            cursor = self._conn.execute(
+                "DELETE FROM rate_limits WHERE key IN "
+                "(SELECT key FROM rate_limits ORDER BY tat LIMIT ?)",
+                (keys - self.max_keys,),
+            )
+            self.evictions += cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            (keys,) = self._conn.execute("SELECT COUNT(*) FROM rate_limits").fetchone()
+        return {
+            "backend": "sqlite",
+            "keys": keys,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
+
+
+_limiter: MemoryRateLimiter | SQLiteRateLimiter | None = None
+
+
+def get_rate_limiter() -> MemoryRateLimiter | SQLiteRateLimiter:
+    """The process-wide limiter, created from settings on first use."""
+    global _limiter
+    if _limiter is None:
+        if settings.rate_limit_path:
+            _limiter = SQLiteRateLimiter(settings.rate_limit_path, settings.rate_limit_max_keys)
+        else:
+            _limiter = MemoryRateLimiter(settings.rate_limit_max_keys)
+    return _limiter
+
+
+def current_rate_limiter() -> MemoryRateLimiter | SQLiteRateLimiter | None:
+    """Return the limiter if it has been created (for stats)."""
+    return _limiter
+
+
+def close_rate_limiter() -> None:
+    global _limiter
+    if _limiter:
+        _limiter.close()
+        _limiter = None
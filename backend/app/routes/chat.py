@@ -1,36 +1,107 @@
 """Chat endpoint with SSE streaming."""
 
+import asyncio
 import json
 import logging
+import time
 
 from fastapi import APIRouter, Depends
 from sse_starlette.sse import EventSourceResponse
 
 from app.auth import check_rate_limit, verify_api_key
+from app.cache import get_response_cache
+from app.db import get_data_version
 from app.models import ChatRequest
+from app.rag.examples import get_example_store
+from app.rag.utils import normalize_question
+from app.singleflight import SingleFlight
+from app.telemetry import CHAT_FIRST_EVENT_SECONDS, CHAT_SECONDS, annotate, span
 from app.workflow.graph import workflow
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Workflow outputs kept in the response cache and replayed on a hit
+_CACHED_KEYS = ("sql_query", "query_results", "markdown", "chart", "map_geojson")
+
+# Identical questions asked at the same time share one workflow run
+flights = SingleFlight()
+
+
+def _markdown_events(md: str):
+    """Stream markdown in chunks for a typing effect."""
+    chunk_size = 50
+    for i in range(0, len(md), chunk_size):
+        yield {"event": "data", "data": json.dumps({"content": md[i : i + chunk_size]})}
+
+
+def _replay_events(entry: dict):
+    """Rebuild the SSE event sequence of a completed workflow run from the cache."""
+    if entry.get("sql_query"):
+        yield {"event": "sql", "data": json.dumps({"sql": entry["sql_query"]})}
+    yield from _markdown_events(entry.get("markdown", ""))
+    if entry.get("chart"):
+        yield {"event": "chart", "data": json.dumps(entry["chart"])}
+    if entry.get("map_geojson"):
+        yield {"event": "map", "data": json.dumps(entry["map_geojson"])}
+
 
 async def _stream_response(request: ChatRequest):
-    """Run the LangGraph workflow and stream results as SSE events."""
+    """Stream the answer to the latest message, joining an identical run in flight."""
     # Extract the latest user message
-    user_message = next(
-        (m.content for m in reversed(request.messages) if m.role == "user"),
-        "",
-    )
+    user_messages = [m.content for m in request.messages if m.role == "user"]
+    user_message = user_messages[-1] if user_messages else ""
 
     if not user_message:
         yield {"event": "error", "data": json.dumps({"error": "No user message provided"})}
         return
 
+    examples = get_example_store()
+    if examples:
+        # The next message confirms or rejects the SQL generated for the previous one
+        previous = user_messages[-2] if len(user_messages) > 1 else None
+        # Promotion may write to the example file, so keep it off the event loop
+        await asyncio.to_thread(
+            examples.observe_question, request.thread_id, user_message, previous
+        )
+
+    cache_key = normalize_question(user_message)
+    events = flights.stream(cache_key, lambda: _run_workflow(user_message, request.thread_id))
+    start = time.perf_counter()
+    first = True
+    async for event in events:
+        if first:
+            CHAT_FIRST_EVENT_SECONDS.observe(time.perf_counter() - start)
+            first = False
+        yield event
+
+
+async def _run_workflow(user_message: str, thread_id: str | None):
+    """Produce the SSE events of one workflow run, traced as a ``chat`` span."""
+    start = time.perf_counter()
+    with span("chat", root=True, **{"chat.question": user_message}) as trace:
+        try:
+            async for event in _workflow_events(user_message, thread_id):
+                if "chat.first_event_ms" not in trace.attributes:
+                    trace.set(**{"chat.first_event_ms": 1000 * (time.perf_counter() - start)})
+                yield event
+        finally:
+            outcome = trace.attributes.setdefault("chat.outcome", "cancelled")
+            CHAT_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
+
+
+async def _workflow_events(user_message: str, thread_id: str | None):
+    """Run the LangGraph workflow and produce its results as SSE events."""
     initial_state = {
         "question": user_message,
+        "thread_id": thread_id,
+        "intent": None,
         "sql_query": "",
+        "sql_params": None,
+        "model_tier": None,
         "sql_error": None,
+        "sql_retryable": True,
         "query_results": None,
         "attempt": 0,
         "markdown": "",
@@ -39,43 +110,81 @@ async def _stream_response(request: ChatRequest):
         "error_message": None,
     }
 
+    cache = get_response_cache()
+    cache_key = normalize_question(user_message)
+
     try:
-        # Stream node updates from the workflow
-        async for event in workflow.astream(initial_state, stream_mode="updates"):
-            for node_name, node_output in event.items():
-                # Stream SQL generation step
-                if node_name == "generate_sql" and "sql_query" in node_output:
-                    yield {
-                        "event": "sql",
-                        "data": json.dumps({"sql": node_output["sql_query"]}),
-                    }
-
-                # Stream the formatted response
-                if node_name in ("format_response", "fail"):
-                    md = node_output.get("markdown", "")
-                    if md:
-                        # Stream markdown in chunks for a typing effect
-                        chunk_size = 50
-                        for i in range(0, len(md), chunk_size):
-                            yield {
-                                "event": "data",
-                                "data": json.dumps({"content": md[i : i + chunk_size]}),
-                            }
-
-                    # Send chart config if available
-                    chart = node_output.get("chart")
-                    if chart:
-                        yield {"event": "chart", "data": json.dumps(chart)}
-
-                    # Send map GeoJSON if available
-                    map_data = node_output.get("map_geojson")
-                    if map_data:
-                        yield {"event": "map", "data": json.dumps(map_data)}
+        data_version = None
+        if cache and cache.enabled:
+            data_version = await get_data_version()
+            # The cache may commit to its SQLite file, so keep it off the event loop
+            cached = await asyncio.to_thread(cache.get, cache_key, data_version)
+            if cached is not None:
+                logger.info("Response cache hit for: %s", cache_key)
+                annotate(**{"chat.outcome": "cached"})
+                for event in _replay_events(cached):
+                    yield event
+                yield {"event": "done", "data": json.dumps({"status": "complete"})}
+                return
+
+        final_state: dict = {}
+        streamed_markdown = False
+        sql_sent = False
+        # Node updates, plus LLM tokens that nodes write to the "custom" stream
+        async for mode, event in workflow.astream(
+            initial_state, stream_mode=["updates", "custom"]
+        ):
+            if mode == "custom":
+                if "sql" in event:
+                    if sql_sent:
+                        # Regenerating after escalation: clear the previous query first
+                        yield {"event": "sql", "data": json.dumps({"sql": ""})}
+                        sql_sent = False
+                    yield {"event": "sql_delta", "data": json.dumps({"content": event["sql"]})}
+                elif "markdown" in event:
+                    streamed_markdown = True
+                    yield {"event": "data", "data": json.dumps({"content": event["markdown"]})}
+                continue
 
+            for node_name, node_output in event.items():
+                final_state.update(node_output or {})
+
+                # Stream the SQL, whether generated or built from a template
+                if node_name in ("generate_sql", "route_intent") and node_output.get("sql_query"):
+                    payload = {"sql": node_output["sql_query"]}
+                    if node_output.get("sql_params") is not None:
+                        payload["params"] = node_output["sql_params"]
+                    yield {"event": "sql", "data": json.dumps(payload)}
+                    sql_sent = True
+
+                # Markdown normally arrived token by token; otherwise send it now
+                if node_name == "format_markdown" and streamed_markdown:
+                    if node_output.get("error_message"):
+                        for chunk in _markdown_events(f"\n\n{node_output['markdown']}"):
+                            yield chunk
+                elif node_name in ("format_markdown", "fail"):
+                    for chunk in _markdown_events(node_output.get("markdown", "")):
+                        yield chunk
+
+                # Send chart config if available
+                if node_name == "format_chart" and node_output.get("chart"):
+                    yield {"event": "chart", "data": json.dumps(node_output["chart"])}
+
+                # Send map GeoJSON if available
+                if node_name == "format_map" and node_output.get("map_geojson"):
+                    yield {"event": "map", "data": json.dumps(node_output["map_geojson"])}
+
+        # Only complete, successful answers are worth replaying
+        if data_version is not None and not final_state.get("error_message"):
+            entry = {k: final_state.get(k) for k in _CACHED_KEYS}
+            await asyncio.to_thread(cache.put, cache_key, data_version, entry)
+
+        annotate(**{"chat.outcome": "failed" if final_state.get("error_message") else "ok"})
         yield {"event": "done", "data": json.dumps({"status": "complete"})}
 
     except Exception as e:
         logger.error("Workflow error: %s", e, exc_info=True)
+        annotate(**{"chat.outcome": "error"})
         yield {
             "event": "error",
             "data": json.dumps({"error": "An internal error occurred. Please try again."}),
@@ -1,55 +1,207 @@
-"""Data endpoints for terminals and routes."""
+"""Data endpoints for terminals, routes and lookup search."""
 
-from fastapi import APIRouter, Query
+import sqlite3
+
+from fastapi import APIRouter, HTTPException, Query, Response
 
 from app.db import execute_parameterized
+from app.geo.terminals import Terminal, get_terminal_registry
+from app.queries import (
+    CARGO_TYPES,
+    ROUTE_KEY,
+    STATS_ORDERS,
+    STATS_TABLES,
+    TERMINAL_KEY,
+    decode_cursor,
+    encode_cursor,
+    routes_count_query,
+    routes_query,
+    stats_query,
+    terminals_count_query,
+    terminals_query,
+)
+from app.search import search_operators, search_terminals
 
 router = APIRouter()
 
+_CURSOR = Query(None, description="X-Next-Cursor from the previous page")
+
+
+def _decode(cursor: str | None, key: tuple[str, ...]) -> list | None:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor, key)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from None
+
+
+async def _page(
+    response: Response,
+    query: tuple[str, list],
+    count_query: tuple[str, list],
+    key: tuple[str, ...],
+    limit: int,
+) -> list[dict]:
+    """Run a listing built with ``limit + 1`` rows and set the paging headers.
+
+    The extra row tells whether there is a next page without a second query.
+    The total goes through the result cache, so it costs one COUNT per filter
+    combination and data version.
+    """
+    rows = await execute_parameterized(*query)
+    (count,) = await execute_parameterized(*count_query)
+    response.headers["X-Total-Count"] = str(count["total"])
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1], key)
+    return rows
+
 
 @router.get("/terminals")
 async def list_terminals(
+    response: Response,
     country: str | None = Query(None, description="Filter by country name"),
+    city: str | None = Query(None, description="Filter by city name"),
     limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = _CURSOR,
 ):
-    """List terminals, optionally filtered by country."""
-    if country:
-        return await execute_parameterized(
-            "SELECT uid, name, city, longitude, latitude, country "
-            "FROM terminals WHERE country LIKE ? ORDER BY city LIMIT ?",
-            (f"%{country}%", limit),
-        )
-    return await execute_parameterized(
-        "SELECT uid, name, city, longitude, latitude, country "
-        "FROM terminals ORDER BY city LIMIT ?",
-        (limit,),
+    """List terminals by city, optionally filtered by country and city.
+
+    Pass the ``X-Next-Cursor`` header back as ``cursor`` for the next page;
+    ``X-Total-Count`` is the number of matching terminals.
+    """
+    after = _decode(cursor, TERMINAL_KEY)
+    query = terminals_query(country, city, limit + 1, after=after, paged=True)
+    return await _page(
+        response, query, terminals_count_query(country, city), TERMINAL_KEY, limit
     )
 
 
+def _terminal_row(t: Terminal, distance_km: float | None = None) -> dict:
+    row = {
+        "uid": t.uid,
+        "name": t.name,
+        "city": t.city,
+        "longitude": t.longitude,
+        "latitude": t.latitude,
+        "country": t.country,
+    }
+    if distance_km is not None:
+        row["distance_km"] = round(distance_km, 2)
+    return row
+
+
+@router.get("/terminals/nearby")
+async def nearby_terminals(
+    lat: float | None = Query(None, ge=-90, le=90, description="Latitude of the point"),
+    lon: float | None = Query(None, ge=-180, le=180, description="Longitude of the point"),
+    near: str | None = Query(None, min_length=2, description="City or terminal name instead"),
+    k: int = Query(10, ge=1, le=100, description="Maximum number of terminals"),
+    radius_km: float | None = Query(None, gt=0, le=2000, description="Search radius"),
+):
+    """Nearest terminals to a point or a named place, closest first."""
+    registry = await get_terminal_registry()
+    if lat is not None and lon is not None:
+        origin = (lat, lon)
+    elif near:
+        origin = registry.city_location(near)
+        if origin is None:
+            matches = await search_terminals(near, limit=1)
+            if matches:
+                origin = (matches[0]["latitude"], matches[0]["longitude"])
+        if origin is None:
+            raise HTTPException(status_code=404, detail=f"Unknown place: {near}")
+    else:
+        raise HTTPException(status_code=422, detail="Provide lat and lon, or near")
+
+    hits = registry.spatial.nearest(*origin, k=k, max_km=radius_km)
+    return [_terminal_row(t, km) for t, km in hits]
+
+
+@router.get("/terminals/bbox")
+async def terminals_in_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    limit: int = Query(500, ge=1, le=5000),
+):
+    """Terminals inside a latitude/longitude bounding box."""
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=422, detail="Bounding box minimum exceeds maximum")
+    registry = await get_terminal_registry()
+    hits = registry.spatial.in_bbox(min_lat, min_lon, max_lat, max_lon)
+    hits.sort(key=lambda t: (t.city, t.uid))
+    return [_terminal_row(t) for t in hits[:limit]]
+
+
 @router.get("/routes")
 async def list_routes(
+    response: Response,
     from_city: str | None = Query(None, description="Filter by origin city"),
     to_city: str | None = Query(None, description="Filter by destination city"),
+    operator: str | None = Query(None, description="Filter by operator name"),
+    from_country: str | None = Query(None, description="Filter by origin country"),
+    to_country: str | None = Query(None, description="Filter by destination country"),
+    cargo: list[str] | None = Query(
+        None, description=f"Required cargo types, any of: {', '.join(CARGO_TYPES)}"
+    ),
     limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = _CURSOR,
 ):
-    """List train routes with optional origin/destination filtering."""
-    conditions = []
-    params: list = []
-
-    if from_city:
-        conditions.append("from_terminal_city LIKE ?")
-        params.append(f"%{from_city}%")
-    if to_city:
-        conditions.append("to_terminal_city LIKE ?")
-        params.append(f"%{to_city}%")
-
-    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
-    params.append(limit)
-
-    sql = (
-        f"SELECT uid, from_terminal_city, to_terminal_city, from_terminal_country, "
-        f"to_terminal_country, operator_name, distance, transit_time_hours, "
-        f"train_vs_truck_co2e_reduction_percent "
-        f"FROM trains {where} ORDER BY from_terminal_city LIMIT ?"
-    )
-    return await execute_parameterized(sql, params)
+    """List train routes by origin city with optional filtering.
+
+    Paged like ``/terminals``: follow ``X-Next-Cursor``, read the total from
+    ``X-Total-Count``.
+    """
+    after = _decode(cursor, ROUTE_KEY)
+    filters = {
+        "from_city": from_city,
+        "to_city": to_city,
+        "operator": operator,
+        "from_country": from_country,
+        "to_country": to_country,
+        "cargo": cargo,
+    }
+    try:
+        query = routes_query(limit=limit + 1, after=after, paged=True, **filters)
+        count_query = routes_count_query(**filters)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from None
+    return await _page(response, query, count_query, ROUTE_KEY, limit)
+
+
+@router.get("/stats")
+async def route_stats(
+    by: str = Query(..., pattern=f"^({'|'.join(STATS_TABLES)})$", description="Grouping"),
+    order: str = Query("trains", pattern=f"^({'|'.join(STATS_ORDERS)})$"),
+    from_country: str | None = Query(None, description="Origin country (pairs only)"),
+    to_country: str | None = Query(None, description="Destination country (pairs only)"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Precomputed train counts, transit, distance and CO2 figures per group."""
+    try:
+        query = stats_query(by, order, limit, from_country, to_country)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from None
+    try:
+        return await execute_parameterized(*query)
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+        raise HTTPException(
+            status_code=503, detail="Summary tables missing: run python -m data.seed"
+        ) from None
+
+
+@router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1, description="Terminal, city, country or operator name"),
+    kind: str = Query("terminals", pattern="^(terminals|operators)$"),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """Substring, prefix and typo-tolerant lookup of terminals or operators."""
+    if kind == "operators":
+        return await search_operators(q, limit)
+    return await search_terminals(q, limit)
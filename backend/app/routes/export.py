@@ -0,0 +1,96 @@
+"""Bulk export endpoints: whole filtered tables, streamed."""
+
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.config import settings
+from app.db import execute_parameterized, stream_rows
+from app.export import FORMATS, ExportUnavailableError, encoder, gzip_stream
+from app.queries import EXPORT_ROUTE_COLUMNS, TERMINAL_COLUMNS, routes_query, terminals_query
+
+router = APIRouter()
+
+_FORMAT = Query("ndjson", pattern=f"^({'|'.join(FORMATS)})$", description="Output format")
+
+# Rows fetched per chunk; columnar formats write one batch or row group per chunk
+_CHUNK_ROWS = 500
+_COLUMNAR_CHUNK_ROWS = 8192
+
+# Each export holds a pooled connection for as long as the client keeps reading
+_exports: asyncio.Semaphore | None = None
+
+
+def _export_slots() -> asyncio.Semaphore:
+    global _exports
+    if _exports is None:
+        _exports = asyncio.Semaphore(settings.export_max_concurrent)
+    return _exports
+
+
+async def _column_types(table: str) -> dict[str, str]:
+    rows = await execute_parameterized("SELECT name, type FROM pragma_table_info(?)", (table,))
+    return {row["name"]: row["type"] for row in rows}
+
+
+async def _export(
+    request: Request, table: str, columns: str, query: tuple[str, list], format: str
+) -> StreamingResponse:
+    """Stream ``query`` in ``format``, gzipped when the client accepts it."""
+    spec = FORMATS[format]
+    names = [c.strip() for c in columns.split(",")]
+    try:
+        encode = encoder(format, names, await _column_types(table))
+    except ExportUnavailableError as e:
+        raise HTTPException(status_code=501, detail=str(e)) from None
+
+    slots = _export_slots()
+    if slots.locked():
+        raise HTTPException(
+            status_code=429,
+            detail="Too many exports in progress, try again shortly.",
+            headers={"Retry-After": "5"},
+        )
+
+    async def body():
+        async with slots:
+            chunk_rows = _COLUMNAR_CHUNK_ROWS if spec.columnar else _CHUNK_ROWS
+            async for block in encode(stream_rows(*query, chunk_size=chunk_rows)):
+                yield block
+
+    headers = {"Content-Disposition": f'attachment; filename="{table}.{spec.extension}"'}
+    stream = body()
+    if not spec.columnar:
+        headers["Vary"] = "Accept-Encoding"
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            stream = gzip_stream(stream)
+    return StreamingResponse(stream, media_type=spec.media_type, headers=headers)
+
+
+@router.get("/export/routes")
+async def export_routes(
+    request: Request,
+    from_city: str | None = Query(None, description="Filter by origin city"),
+    to_city: str | None = Query(None, description="Filter by destination city"),
+    operator: str | None = Query(None, description="Filter by operator name"),
+    format: str = _FORMAT,
+):
+    """Every train matching the ``/api/routes`` filters, streamed in one response."""
+    query = routes_query(
+        from_city, to_city, operator, limit=-1, columns=EXPORT_ROUTE_COLUMNS, order="uid"
+    )
+    return await _export(request, "trains", EXPORT_ROUTE_COLUMNS, query, format)
+
+
+@router.get("/export/terminals")
+async def export_terminals(
+    request: Request,
+    country: str | None = Query(None, description="Filter by country name"),
+    city: str | None = Query(None, description="Filter by city name"),
+    format: str = _FORMAT,
+):
+    """Every terminal matching the ``/api/terminals`` filters, streamed in one response."""
+    query = terminals_query(country, city, limit=-1)
+    return await _export(request, "terminals", TERMINAL_COLUMNS, query, format)
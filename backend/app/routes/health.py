@@ -1,8 +1,24 @@
-"""Health check endpoint."""
+"""Health check endpoints.
 
-from fastapi import APIRouter
+``/health`` is open for load balancers; the stats and metrics need the API key.
+"""
 
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.agents.llm import current_transport, usage_stats
+from app.auth import verify_api_key
+from app.cache import get_response_cache, get_result_cache
+from app.db import get_pool
+from app.geo.tiles import current_tiles
 from app.models import HealthResponse
+from app.planner import current_planner
+from app.rag.examples import get_example_store
+from app.rag.retriever import current_schema_retriever
+from app.ratelimit import current_rate_limiter
+from app.routes.chat import flights
+from app.sql_guard import current_sql_guard
+from app.telemetry import current_exporter, render_metrics
 
 router = APIRouter()
 
@@ -10,3 +26,34 @@ router = APIRouter()
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     return HealthResponse(status="ok")
+
+
+@router.get("/health/stats", dependencies=[Depends(verify_api_key)])
+async def health_stats():
+    """Runtime statistics for the connection pool and caches."""
+    cache = get_response_cache()
+    return {
+        "db_pool": get_pool().stats(),
+        "response_cache": cache.stats() if cache else None,
+        "chat_flights": flights.stats(),
+        "result_cache": results.stats() if (results := get_result_cache()) else None,
+        "route_planner": planner.stats() if (planner := current_planner()) else None,
+        "map_tiles": tiles.stats() if (tiles := current_tiles()) else None,
+        "sql_schema": schema.stats() if (schema := current_schema_retriever()) else None,
+        "sql_guard": guard.stats() if (guard := current_sql_guard()) else None,
+        "llm": llm.stats() if (llm := current_transport()) else None,
+        "llm_tiers": usage_stats(),
+        "few_shot": examples.stats() if (examples := get_example_store()) else None,
+        "rate_limiter": limiter.stats() if (limiter := current_rate_limiter()) else None,
+        "traces": exporter.stats() if (exporter := current_exporter()) else None,
+    }
+
+
+@router.get(
+    "/metrics", response_class=PlainTextResponse, dependencies=[Depends(verify_api_key)]
+)
+async def metrics():
+    """Prometheus metrics: hot-path counters and histograms, plus the stats above."""
+    return PlainTextResponse(
+        render_metrics(await health_stats()), media_type="text/plain; version=0.0.4"
+    )
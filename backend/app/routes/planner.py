@@ -0,0 +1,65 @@
+"""Route planning endpoint backed by the in-memory timetable graph."""
+
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.planner import (
+    OBJECTIVES,
+    WEEKDAYS,
+    get_planner,
+    parse_minute_of_week,
+    resolve_timetable_city,
+)
+
+router = APIRouter()
+
+
+def parse_weekday(day: str) -> int:
+    """Parse an ISO weekday number or a (possibly abbreviated) English day name."""
+    if day.isdigit() and 1 <= int(day) <= 7:
+        return int(day)
+    for i, name in enumerate(WEEKDAYS, start=1):
+        if len(day) >= 3 and name.lower().startswith(day.lower()):
+            return i
+    raise HTTPException(status_code=422, detail=f"Invalid weekday: {day}")
+
+
+@router.get("/plan")
+async def plan_route(
+    from_city: str = Query(..., min_length=2, description="Origin city"),
+    to_city: str = Query(..., min_length=2, description="Destination city"),
+    depart_day: str | None = Query(None, description="Weekday name or ISO number (default: now)"),
+    depart_time: str = Query("00:00", pattern=r"^\d{1,2}:\d{2}$"),
+    optimize: str = Query("time", description="time, co2 or legs"),
+    max_legs: int = Query(4, ge=1, le=6),
+):
+    """Plan a multi-leg rail itinerary between two cities."""
+    if optimize not in OBJECTIVES:
+        raise HTTPException(status_code=422, detail=f"optimize must be one of {OBJECTIVES}")
+
+    if depart_day is None:
+        now = datetime.now()
+        depart_at = parse_minute_of_week(now.isoweekday(), now.strftime("%H:%M"))
+    else:
+        depart_at = parse_minute_of_week(parse_weekday(depart_day), depart_time)
+
+    planner = await get_planner()
+    origin = await resolve_timetable_city(planner, from_city)
+    destination = await resolve_timetable_city(planner, to_city)
+    if origin is None or destination is None:
+        missing = from_city if origin is None else to_city
+        raise HTTPException(status_code=404, detail=f"Unknown city: {missing}")
+
+    itinerary = planner.plan_cities(origin, destination, depart_at, optimize, max_legs)
+    if itinerary is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No rail connection from {origin} to {destination} within {max_legs} legs",
+        )
+    return {
+        "from_city": origin,
+        "to_city": destination,
+        "optimize": optimize,
+        **itinerary.to_dict(),
+    }
@@ -0,0 +1,39 @@
+"""Map tile endpoint serving clustered terminals and corridors as GeoJSON."""
+
+from fastapi import APIRouter, Header, HTTPException, Path, Response
+
+from app.config import settings
+from app.geo.tiles import MAX_ZOOM, get_tiles
+
+router = APIRouter()
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an ``If-None-Match`` header matches ``etag`` (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+@router.get("/tiles/{z}/{x}/{y}")
+async def get_tile(
+    z: int = Path(..., ge=0, le=MAX_ZOOM),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    if_none_match: str | None = Header(None),
+):
+    """One XYZ tile of the terminal network: clusters, terminals and corridors."""
+    if x >= 2**z or y >= 2**z:
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    tile = (await get_tiles()).tile(z, x, y)
+    headers = {
+        "ETag": tile.etag,
+        "Cache-Control": f"public, max-age={settings.tile_max_age_seconds}",
+    }
+    if etag_matches(if_none_match, tile.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=tile.body, media_type="application/geo+json", headers=headers)
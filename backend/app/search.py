@@ -0,0 +1,140 @@
+"""Indexed text matching for city, country, terminal and operator lookups.
+
+``LIKE '%x%'`` on the base tables can't use an index, so lookups go through
+the trigram FTS5 tables built by ``data/seed.py`` (``terminals_fts`` and
+``operators_fts``). Those store lowercased, accent-free text, so search terms
+are folded the same way before matching.
+"""
+
+import re
+
+from app.db import execute_parameterized
+from app.rag.utils import CITY_ALIASES, fold_accents
+
+# Trigram indexes need at least three characters to narrow a LIKE pattern
+MIN_TRIGRAM_LENGTH = 3
+
+_TERMINALS_FROM = (
+    "SELECT t.uid, t.name, t.city, t.country, t.latitude, t.longitude "
+    "FROM terminals_fts JOIN terminals t ON t.rowid = terminals_fts.rowid "
+)
+_OPERATORS_FROM = (
+    "SELECT o.uid, o.name FROM operators_fts JOIN operators o ON o.rowid = operators_fts.rowid "
+)
+
+
+def fold_term(term: str) -> str:
+    """Fold a search term to the form stored in the FTS tables."""
+    folded = fold_accents(term).strip().lower()
+    return CITY_ALIASES.get(folded, folded)
+
+
+def fold_terms(term: str) -> list[str]:
+    """The folded term, plus its alias if it has one ("cologne" → cologne, koln).
+
+    Filters match either, so a spelling the data uses for some rows is never
+    swapped out for its alias.
+    """
+    folded = fold_accents(term).strip().lower()
+    alias = CITY_ALIASES.get(folded)
+    return [folded, alias] if alias and alias != folded else [folded]
+
+
+def _like_pattern(term: str) -> str:
+    # LIKE ... ESCAPE disables the trigram index, so drop wildcards instead
+    cleaned = term.replace("%", "").replace("_", "")
+    return f"%{cleaned}%"
+
+
+def terminal_filter(uid_column: str, field: str, term: str) -> tuple[str, list]:
+    """SQL condition restricting ``uid_column`` to terminals whose ``field`` contains ``term``.
+
+    ``field`` is one of ``name``, ``city`` or ``country``. The trigram index
+    turns the substring match into an index lookup, and the outer ``IN`` hits
+    the uid indexes on ``trains``/``terminals``.
+    """
+    if field not in ("name", "city", "country"):
+        raise ValueError(f"Unsupported terminal field: {field}")
+    return _fts_filter(uid_column, "terminals_fts", field, term)
+
+
+def operator_filter(uid_column: str, term: str) -> tuple[str, list]:
+    """SQL condition restricting ``uid_column`` to operators whose name contains ``term``."""
+    return _fts_filter(uid_column, "operators_fts", "name", term)
+
+
+def _fts_filter(uid_column: str, table: str, field: str, term: str) -> tuple[str, list]:
+    # One indexed LIKE per spelling; a UNION keeps each a trigram lookup, where
+    # an OR inside one WHERE would scan the FTS table
+    patterns = [_like_pattern(t) for t in fold_terms(term)]
+    lookups = " UNION ".join(f"SELECT uid FROM {table} WHERE {field} LIKE ?" for _ in patterns)
+    return f"{uid_column} IN ({lookups})", patterns
+
+
+def _phrase(term: str) -> str:
+    """Quote a term as an FTS5 phrase; on a trigram index this is a substring match."""
+    return '"' + term.replace('"', "") + '"'
+
+
+def _trigrams(term: str) -> list[str]:
+    return sorted({term[i : i + 3] for i in range(len(term) - 2)})
+
+
+def fuzzy_match_expression(term: str) -> str | None:
+    """FTS5 MATCH expression OR-ing the term's trigrams, for typo-tolerant ranking."""
+    folded = re.sub(r"[^a-z0-9 \-]", "", fold_term(term))
+    grams = [g for g in _trigrams(folded) if " " not in g]
+    if not grams:
+        return None
+    return " OR ".join(f'"{g}"' for g in grams)
+
+
+async def search_terminals(q: str, limit: int = 10) -> list[dict]:
+    """Find terminals by name, city or country.
+
+    Substring matches come first, prefix matches ranked highest; if nothing
+    contains the term, fall back to trigram-overlap ranking so misspellings
+    like "Rotterdm" still find Rotterdam.
+    """
+    term = fold_term(q)
+    if len(term) >= MIN_TRIGRAM_LENGTH:
+        prefix = _like_pattern(term)[1:]
+        rows = await execute_parameterized(
+            _TERMINALS_FROM + "WHERE terminals_fts MATCH ? "
+            "ORDER BY (terminals_fts.city LIKE ?) DESC, "
+            "(terminals_fts.name LIKE ?) DESC, t.city LIMIT ?",
+            (_phrase(term), prefix, prefix, limit),
+        )
+        if rows:
+            return rows
+
+    expression = fuzzy_match_expression(term)
+    if expression is None:
+        return await execute_parameterized(
+            _TERMINALS_FROM + "WHERE terminals_fts.city LIKE ? ORDER BY t.city LIMIT ?",
+            (_like_pattern(term)[1:], limit),
+        )
+    return await execute_parameterized(
+        _TERMINALS_FROM + "WHERE terminals_fts MATCH ? ORDER BY bm25(terminals_fts) LIMIT ?",
+        (expression, limit),
+    )
+
+
+async def search_operators(q: str, limit: int = 10) -> list[dict]:
+    """Find operators by name, with the same substring-then-fuzzy strategy."""
+    term = fold_term(q)
+    if len(term) >= MIN_TRIGRAM_LENGTH:
+        rows = await execute_parameterized(
+            _OPERATORS_FROM + "WHERE operators_fts MATCH ? ORDER BY length(o.name) LIMIT ?",
+            (_phrase(term), limit),
+        )
+        if rows:
+            return rows
+
+    expression = fuzzy_match_expression(term)
+    if expression is None:
+        return []
+    return await execute_parameterized(
+        _OPERATORS_FROM + "WHERE operators_fts MATCH ? ORDER BY bm25(operators_fts) LIMIT ?",
+        (expression, limit),
+    )
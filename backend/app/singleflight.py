@@ -0,0 +1,99 @@
+"""Single-flight execution: concurrent callers with the same key share one run.
+
+The first caller for a key starts the producer as a background task; its
+events go into a buffer that every subscriber reads from its own position, so
+a request that joins mid-stream first catches up on what was already sent and
+then follows along live. The run is cancelled if every subscriber goes away
+before it finishes, and the key is released as soon as it ends, so later
+requests start fresh (and can hit the response cache instead).
+"""
+
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcast:
+    """Events of one run, buffered for subscribers that join late."""
+
+    def __init__(self) -> None:
+        self.events: list = []
+        self.done = False
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+
+    def publish(self, event) -> None:
+        self.events.append(event)
+        self._notify()
+
+    def finish(self) -> None:
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        # Waiters hold the old event; a fresh one is armed for the next wait
+        self._wake.set()
+        self._wake = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator:
+        """Every event from the start of the run, then new ones as they're published."""
+        self.subscribers += 1
+        position = 0
+        try:
+            while True:
+                wake = self._wake
+                if position < len(self.events):
+                    yield self.events[position]
+                    position += 1
+                elif self.done:
+                    return
+                else:
+                    await wake.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done and self.task:
+                self.task.cancel()
+
+
+class SingleFlight:
+    """Deduplicates concurrent runs of an async event producer by key."""
+
+    def __init__(self) -> None:
+        self._flights: dict[Hashable, Broadcast] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def stream(self, key: Hashable, produce: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """Events of the run for ``key``, starting ``produce()`` if none is in flight."""
+        broadcast = self._flights.get(key)
+        # A run whose subscribers all left is being cancelled; don't join it
+        if broadcast is None or broadcast.task.cancelling():
+            broadcast = self._flights[key] = Broadcast()
+            broadcast.task = asyncio.create_task(self._run(key, broadcast, produce))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return broadcast.subscribe()
+
+    async def _run(self, key: Hashable, broadcast: Broadcast, produce) -> None:
+        try:
+            async for event in produce():
+                broadcast.publish(event)
+        except Exception:
+            logger.exception("Single-flight producer failed for %r", key)
+        finally:
+            broadcast.finish()
+            if self._flights.get(key) is broadcast:
+                del self._flights[key]
+
+    def stats(self) -> dict:
+        total = self.started + self.coalesced
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / total if total else 0.0,
+        }
@@ -0,0 +1,306 @@
+"""Validation and row limits for generated SQL, checked before it reaches the pool.
+
+Statements are compiled against an in-memory copy of the schema (no rows),
+with a SQLite authorizer that only allows reads of the data tables and their
+columns. Compiling is the same parse SQLite does for the real query, so syntax
+errors, unknown columns and writes are caught in microseconds without a pool
+connection. ``EXPLAIN QUERY PLAN`` on the copy then shows how the query would
+run; joins whose inner loop scans a large table in full are refused, since
+their cost grows with the product of the table sizes.
+
+The outermost ``LIMIT`` is found with a small tokenizer, so limits inside
+subqueries, strings and comments are left alone. A missing limit is added and
+one above ``chat_query_limit`` is lowered to it.
+"""
+
+import asyncio
+import logging
+import re
+import sqlite3
+import time
+from collections import defaultdict
+
+from app.config import settings
+from app.db import execute_parameterized, get_data_version
+from app.sql_tokens import Token, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Words that end a table reference, so they're never taken for an alias
+_CLAUSE_WORDS = {
+    "WHERE", "JOIN", "ON", "USING", "LEFT", "RIGHT", "FULL", "INNER", "OUTER", "CROSS",
+    "NATURAL", "GROUP", "ORDER", "HAVING", "LIMIT", "UNION", "EXCEPT", "INTERSECT",
+    "WINDOW", "INDEXED", "NOT",
+}
+# Columns every table has besides its declared ones; FTS5 tables add ``rank``
+# and a hidden column named after the table (``terminals_fts MATCH ...``)
+_IMPLICIT_COLUMNS = {"", "rowid", "oid", "_rowid_", "rank"}
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+_PLAN_LOOP = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(\S+)(?: AS (\S+))?(.*)$")
+
+
+class QueryRejectedError(ValueError):
+    """Raised when generated SQL fails validation.
+
+    ``retryable`` is false for statements no rewrite can make acceptable,
+    such as writes or several statements in one, so the workflow doesn't ask
+    for a fix.
+    """
+
+    def __init__(self, reason: str, retryable: bool = True) -> None:
+        self.retryable = retryable
+        super().__init__(f"Query rejected: {reason}")
+
+
+def check_statement(tokens: list[Token]) -> None:
+    """Reject anything but a single SELECT or WITH statement."""
+    if not tokens:
+        raise QueryRejectedError("the query is empty.")
+    if tokens[0].upper not in ("SELECT", "WITH"):
+        raise QueryRejectedError("only SELECT queries are allowed.", retryable=False)
+    if any(t.text == ";" for t in tokens):
+        raise QueryRejectedError("only a single statement is allowed.", retryable=False)
+
+
+def _integer(tokens: list[Token]) -> int | None:
+    """The value of ``[-]<integer literal>``, or ``None`` for anything else."""
+    text = "".join(t.text for t in tokens)
+    return int(text) if re.fullmatch(r"-?\d+", text) else None
+
+
+def enforce_limit(sql: str, max_rows: int) -> tuple[str, str | None]:
+    """Add or lower the outermost LIMIT of ``sql``.
+
+    Returns the rewritten query and what was done: ``"injected"``,
+    ``"clamped"`` or ``None`` when the existing limit is within bounds.
+    Trailing semicolons and comments are dropped.
+    """
+    tokens = tokenize(sql)
+    while tokens and tokens[-1].text == ";":
+        tokens.pop()
+    check_statement(tokens)
+    sql = sql[: tokens[-1].end]
+
+    depth, limit_at = 0, None
+    for i, token in enumerate(tokens):
+        if token.text == "(":
+            depth += 1
+        elif token.text == ")":
+            depth -= 1
+        elif depth == 0 and token.upper == "LIMIT":
+            limit_at = i
+    if limit_at is None:
+        return f"{sql} LIMIT {max_rows}", "injected"
+
+    # LIMIT n | LIMIT n OFFSET m | LIMIT m, n
+    rest = tokens[limit_at + 1 :]
+    count = rest
+    for i, token in enumerate(rest):
+        if token.upper == "OFFSET":
+            count = rest[:i]
+        elif token.text == ",":
+            count = rest[i + 1 :]
+    value = _integer(count) if count else None
+    if value is None:
+        return f"SELECT * FROM ({sql}) LIMIT {max_rows}", "clamped"
+    if 0 <= value <= max_rows:
+        return sql, None
+    return f"{sql[: count[0].start]}{max_rows}{sql[count[-1].end :]}", "clamped"
+
+
+def table_aliases(tokens: list[Token], tables: set[str]) -> dict[str, str]:
+    """Map the names a query uses for tables (aliases included) to the table names."""
+    aliases = {}
+    for i, token in enumerate(tokens):
+        if token.kind != "ident" or token.name not in tables or i == 0:
+            continue
+        if tokens[i - 1].upper not in ("FROM", "JOIN", ","):
+            continue
+        aliases[token.name] = token.name
+        following = tokens[i + 1 : i + 3]
+        if following and following[0].upper == "AS":
+            following = following[1:]
+        if following and following[0].kind == "ident" and following[0].upper not in _CLAUSE_WORDS:
+            aliases[following[0].name] = token.name
+    return aliases
+
+
+class SQLGuard:
+    """Compiles generated SQL against a schema-only copy of the database."""
+
+    def __init__(
+        self,
+        schema_sql: list[str],
+        columns: dict[str, set[str]],
+        row_counts: dict[str, int],
+        data_version: int = 0,
+        max_rows: int = 1000,
+        max_scan_rows: int = 1000,
+    ) -> None:
+        self.columns = {
+            table: {c.lower() for c in names} | _IMPLICIT_COLUMNS | {table}
+            for table, names in columns.items()
+        }
+        self.row_counts = row_counts
+        self.data_version = data_version
+        self.max_rows = max_rows
+        self.max_scan_rows = max_scan_rows
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        for statement in schema_sql:
+            self._conn.execute(statement)
+        self._conn.set_authorizer(self._authorize)
+        self._denied: QueryRejectedError | None = None
+        self.checked = 0
+        self.rejected = 0
+        self.injected = 0
+        self.clamped = 0
+        self.total_seconds = 0.0
+
+    def _authorize(self, action, arg1, arg2, db_name, source) -> int:
+        if action in _ALLOWED_ACTIONS:
+            return sqlite3.SQLITE_OK
+        if action == sqlite3.SQLITE_READ:
+            columns = self.columns.get((arg1 or "").lower())
+            if columns is None:
+                self._denied = QueryRejectedError(f"table {arg1} is not available.")
+            elif (arg2 or "").lower() not in columns:
+                self._denied = QueryRejectedError(f"{arg1} has no column {arg2}.")
+            else:
+                return sqlite3.SQLITE_OK
+        else:
+            self._denied = QueryRejectedError("only SELECT queries are allowed.", retryable=False)
+        return sqlite3.SQLITE_DENY
+
+    def _plan(self, sql: str) -> list[tuple]:
+        self._denied = None
+        try:
+            return self._conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        except sqlite3.Error as e:
+            raise self._denied or QueryRejectedError(f"{e}.") from None
+
+    def _check_plan(self, plan: list[tuple], aliases: dict[str, str]) -> None:
+        """Refuse joins that scan a large table in full once per outer row."""
+        correlated = {row[0] for row in plan if row[3].startswith("CORRELATED")}
+        loops = defaultdict(list)
+        for _, parent, _, detail in plan:
+            match = _PLAN_LOOP.match(detail)
+            if match and detail != "SCAN CONSTANT ROW":
+                loops[parent].append(match)
+        for parent, matches in loops.items():
+            # The first loop at a level runs once; later ones run per outer row
+            inner = matches if parent in correlated else matches[1:]
+            for match in inner:
+                kind, name, alias, rest = match.groups()
+                if kind != "SCAN" or "VIRTUAL TABLE" in rest:
+                    continue
+                table = aliases.get((alias or name).lower())
+                rows = self.row_counts.get(table, 0)
+                if table and rows > self.max_scan_rows:
+                    raise QueryRejectedError(
+                        f"it would scan all {rows:,} rows of {table} for every row it is "
+                        f"joined with. Join on indexed columns (uid, from_terminal_uid, "
+                        f"to_terminal_uid, operator_uid) or filter {table} first."
+                    )
+
+    def check(self, sql: str) -> str:
+        """Validate ``sql`` and return it with its row limit enforced."""
+        start = time.perf_counter()
+        self.checked += 1
+        try:
+            sql, action = enforce_limit(sql, self.max_rows)
+            plan = self._plan(sql)
+            self._check_plan(plan, table_aliases(tokenize(sql), set(self.columns)))
+        except QueryRejectedError:
+            self.rejected += 1
+            raise
+        finally:
+            self.total_seconds += time.perf_counter() - start
+        if action == "injected":
+            self.injected += 1
+        elif action == "clamped":
+            self.clamped += 1
+        return sql
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def stats(self) -> dict:
+        return {
+            "checked": self.checked,
+            "rejected": self.rejected,
+            "limits_injected": self.injected,
+            "limits_clamped": self.clamped,
+            "avg_check_us": 1e6 * self.total_seconds / self.checked if self.checked else 0.0,
+        }
+
+
+async def read_schema() -> tuple[list[str], dict[str, set[str]], dict[str, int]]:
+    """CREATE statements, columns and row counts of the data tables."""
+    rows = await execute_parameterized(
+        "SELECT type, name, sql FROM sqlite_master WHERE sql IS NOT NULL "
+        "AND type IN ('table', 'index', 'view') AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+    )
+    virtual = [r["name"] for r in rows if r["sql"].upper().startswith("CREATE VIRTUAL")]
+    statements, columns, row_counts = [], {}, {}
+    for row in rows:
+        name = row["name"]
+        # FTS5 shadow tables are created along with their virtual table
+        if any(name.startswith(f"{v}_") for v in virtual):
+            continue
+        statements.append(row["sql"])
+        if row["type"] == "index":
+            continue
+        info = await execute_parameterized(
+            "SELECT name FROM pragma_table_xinfo(?) WHERE hidden != 1", (name,)
+        )
+        columns[name] = {c["name"] for c in info}
+        if row["type"] == "table":
+            count = await execute_parameterized(f'SELECT COUNT(*) AS n FROM "{name}"')
+            row_counts[name] = count[0]["n"]
+    return statements, columns, row_counts
+
+
+_guard: SQLGuard | None = None
+_reload = asyncio.Lock()
+
+
+async def load_sql_guard() -> SQLGuard:
+    """Build the guard from the live schema."""
+    global _guard
+    version = await get_data_version()
+    statements, columns, row_counts = await read_schema()
+    guard = await asyncio.to_thread(
+        SQLGuard,
+        statements,
+        columns,
+        row_counts,
+        version,
+        settings.chat_query_limit,
+        settings.chat_query_max_scan_rows,
+    )
+    if _guard:
+        _guard.close()
+    _guard = guard
+    logger.info("Loaded SQL guard for %d tables", len(columns))
+    return _guard
+
+
+def current_sql_guard() -> SQLGuard | None:
+    """Return the loaded guard without reloading it (for stats)."""
+    return _guard
+
+
+async def guard_sql(sql: str) -> str:
+    """Validate generated SQL and enforce its LIMIT; raises ``QueryRejectedError``.
+
+    Without a loaded guard only the statement type and the limit are checked.
+    """
+    if _guard is None:
+        return enforce_limit(sql, settings.chat_query_limit)[0]
+    if _guard.data_version != await get_data_version(settings.data_version_check_seconds):
+        async with _reload:
+            # Another request may have rebuilt it while this one waited
+            if _guard.data_version != await get_data_version():
+                await load_sql_guard()
+    return _guard.check(sql)
@@ -0,0 +1,64 @@
+"""A small SQL tokenizer, enough to find clauses and compare queries.
+
+It splits SQLite SQL into strings, identifiers (quoted or not), numbers,
+parameters and single-character operators, dropping whitespace and comments,
+so callers can look at the statement's structure without a full parser.
+"""
+
+import re
+from dataclasses import dataclass
+
+_TOKEN = re.compile(
+    r"""
+    (?P<space>\s+|--[^\n]*|/\*.*?(?:\*/|$))
+    |(?P<string>'(?:[^']|'')*'?)
+    |(?P<ident>"(?:[^"]|"")*"?|`(?:[^`]|``)*`?|\[[^\]]*\]?|[^\W\d][\w$]*)
+    |(?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<param>[?:@$]\w*)
+    |(?P<op>.)
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Token:
+    kind: str
+    text: str
+    start: int
+    end: int
+
+    @property
+    def upper(self) -> str:
+        return self.text.upper()
+
+    @property
+    def name(self) -> str:
+        """The identifier with any quoting removed, lowercased."""
+        if self.text[:1] in "\"`[":
+            return self.text[1:-1].lower()
+        return self.text.lower()
+
+
+def tokenize(sql: str) -> list[Token]:
+    """SQL tokens without whitespace and comments."""
+    return [
+        Token(m.lastgroup, m.group(), m.start(), m.end())
+        for m in _TOKEN.finditer(sql)
+        if m.lastgroup != "space"
+    ]
+
+
+def canonical_sql(sql: str) -> str:
+    """``sql`` with whitespace, comments, case and trailing semicolons normalized.
+
+    Keywords and unquoted identifiers are case-insensitive in SQLite, so they
+    are lowercased; strings, numbers and quoted names are kept as written.
+    """
+    tokens = tokenize(sql)
+    while tokens and tokens[-1].text == ";":
+        tokens.pop()
+    return " ".join(
+        t.text.lower() if t.kind == "ident" and t.text[0] not in "\"`[" else t.text
+        for t in tokens
+    )
@@ -0,0 +1,422 @@
+"""Tracing and metrics for the chat hot path.
+
+Spans: each chat run is a trace. ``span()`` opens a child of whatever span is
+current in the calling context, so workflow nodes (``traced_node``), database
+queries and LLM calls nest under the ``chat`` span that ``routes/chat.py``
+opens. When a trace's root span ends, its spans are exported as one line of
+OTLP/JSON (the OpenTelemetry collector's file format) to ``TRACE_EXPORT_PATH``
+and/or POSTed to an OTLP/HTTP endpoint at ``TRACE_EXPORT_URL``. Spans opened
+with no trace in progress (data endpoints, startup) are timed for metrics but
+not exported.
+
+Metrics: counters and histograms rendered in the Prometheus text format by
+``GET /metrics``, next to counters and gauges derived from the runtime stats.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# ── Metrics ─────────────────────────────────────────────────────────
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for key, value in sorted(self.values.items()):
+            yield f"{self.name}{_labels(self.labels, key)} {_number(value)}"
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> (per-bucket counts, sum, count)
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        entry = self.values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, total, count) in sorted(self.values.items()):
+            for bound, n in [*zip(self.buckets, counts), ("+Inf", count)]:
+                labels = _labels(self.labels, key, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {n}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {count}"
+
+
+NODE_SECONDS = Histogram(
+    "fr8_workflow_node_seconds", "Duration of workflow node runs.", ("node", "status")
+)
+SQL_RETRIES = Counter("fr8_sql_retries_total", "Failed queries sent back to fix_sql.")
+SQL_ESCALATIONS = Counter(
+    "fr8_sql_escalations_total", "Small-model SQL regenerated with the large model."
+)
+DB_QUERY_SECONDS = Histogram(
+    "fr8_db_query_seconds", "Database query time, including result cache hits.", ("cache",)
+)
+DB_ROWS = Counter("fr8_db_rows_total", "Rows returned by database queries.", ("cache",))
+LLM_SECONDS = Histogram("fr8_llm_seconds", "LLM call duration.", ("model",))
+LLM_TOKENS = Counter("fr8_llm_tokens_total", "LLM tokens used.", ("model", "direction"))
+LLM_ERRORS = Counter("fr8_llm_errors_total", "LLM calls that raised.", ("model",))
+CHAT_SECONDS = Histogram(
+    "fr8_chat_seconds", "Chat workflow runs, from request to the last event.", ("outcome",)
+)
+CHAT_FIRST_EVENT_SECONDS = Histogram(
+    "fr8_chat_first_event_seconds", "Time from a chat request to its first SSE event."
+)
+
+METRICS = [
+    NODE_SECONDS,
+    SQL_RETRIES,
+    SQL_ESCALATIONS,
+    DB_QUERY_SECONDS,
+    DB_ROWS,
+    LLM_SECONDS,
+    LLM_TOKENS,
+    LLM_ERRORS,
+    CHAT_SECONDS,
+    CHAT_FIRST_EVENT_SECONDS,
+]
+
+
+# Stats keys that only ever grow; exported as ``<name>_total`` counters.
+# Every other numeric stat is a level (sizes, entries, in-flight) or a ratio.
+STAT_TOTALS = frozenset({
+    "acquisitions", "allowed", "cache_hits", "cache_misses", "calls", "checked",
+    "coalesced", "cost_usd", "errors", "evictions", "exported", "failed", "failures",
+    "hedge_wins", "hedges", "hits", "input_tokens", "invalidations", "limited",
+    "limits_clamped", "limits_injected", "misses", "output_tokens", "promoted",
+    "rejected", "requests", "retries", "retrievals", "started", "too_large", "waits",
+})
+
+
+def _stat_samples(stats: dict, prefix: str) -> Iterator[tuple[str, str, float]]:
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            yield from _stat_samples(value, name)
+        elif isinstance(value, bool):
+            yield name, "gauge", int(value)
+        elif isinstance(value, int | float):
+            if key in STAT_TOTALS:
+                yield f"{name}_total", "counter", value
+            else:
+                yield name, "gauge", value
+
+
+def render_metrics(stats: dict | None = None) -> str:
+    """All metrics in the Prometheus text format, plus numeric ``stats`` leaves.
+
+    Stats listed in ``STAT_TOTALS`` become counters; the rest are gauges.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    for section, values in (stats or {}).items():
+        if isinstance(values, dict):
+            for name, kind, value in _stat_samples(values, f"fr8_{section}"):
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ── Spans ───────────────────────────────────────────────────────────
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict = field(default_factory=dict)
+    error: str | None = None
+    # Finished spans of the trace, shared by every span in it; None if not exported
+    trace: list | None = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def seconds(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def annotate(**attributes) -> None:
+    """Set attributes on the current span, if there is one."""
+    if current := _current.get():
+        current.set(**attributes)
+
+
+def _new_span(name: str, attributes: dict, root: bool, start_ns: int | None = None) -> Span:
+    parent = _current.get()
+    if parent is not None:
+        trace_id, parent_id, trace = parent.trace_id, parent.span_id, parent.trace
+    else:
+        trace_id, parent_id, trace = os.urandom(16).hex(), None, [] if root else None
+    return Span(
+        name, trace_id, os.urandom(8).hex(), parent_id, start_ns or time.time_ns(),
+        attributes=attributes, trace=trace,
+    )
+
+
+def _finish(span: Span) -> None:
+    span.end_ns = span.end_ns or time.time_ns()
+    if span.trace is None:
+        return
+    span.trace.append(span)
+    if span.parent_id is None and _exporter is not None:
+        _exporter.export(span.trace)
+
+
+@contextmanager
+def span(name: str, root: bool = False, **attributes) -> Iterator[Span]:
+    """Time the block as a child of the current span (or a new trace if ``root``)."""
+    current = _new_span(name, attributes, root)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        _finish(current)
+
+
+def record_span(name: str, seconds: float, error: str | None = None, **attributes) -> None:
+    """Add an already finished span (e.g. from a callback) under the current span."""
+    end_ns = time.time_ns()
+    finished = _new_span(name, attributes, False, end_ns - int(seconds * 1e9))
+    finished.end_ns = end_ns
+    finished.error = error
+    _finish(finished)
+
+
+def traced_node(name: str):
+    """Decorate a workflow node so each run is a span and a duration sample."""
+
+    def decorate(node):
+        @functools.wraps(node)
+        async def run(state):
+            status = "error"
+            start = time.perf_counter()
+            try:
+                with span(f"node {name}", **{"langgraph.node": name}):
+                    result = await node(state)
+                status = "ok"
+                return result
+            finally:
+                NODE_SECONDS.observe(time.perf_counter() - start, node=name, status=status)
+
+        return run
+
+    return decorate
+
+
+def record_llm_call(
+    model: str, seconds: float, input_tokens: int, output_tokens: int, error: bool = False
+) -> None:
+    """Metrics and a span for one LLM call (called from the usage callback)."""
+    LLM_SECONDS.observe(seconds, model=model)
+    if error:
+        LLM_ERRORS.inc(model=model)
+    LLM_TOKENS.inc(input_tokens, model=model, direction="input")
+    LLM_TOKENS.inc(output_tokens, model=model, direction="output")
+    record_span(
+        f"llm {model}",
+        seconds,
+        error="LLM call failed" if error else None,
+        **{
+            "gen_ai.request.model": model,
+            "gen_ai.usage.input_tokens": input_tokens,
+            "gen_ai.usage.output_tokens": output_tokens,
+        },
+    )
+
+
+# ── Export ──────────────────────────────────────────────────────────
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_json(spans: list[Span]) -> dict:
+    """An OTLP/JSON ``ExportTraceServiceRequest`` holding ``spans``."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": "fr8-tools-backend"}},
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [
+                    {
+                        "traceId": s.trace_id,
+                        "spanId": s.span_id,
+                        **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                        "name": s.name,
+                        "kind": 1,
+                        "startTimeUnixNano": str(s.start_ns),
+                        "endTimeUnixNano": str(s.end_ns),
+                        "attributes": [
+                            {"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()
+                        ],
+                        "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+                    }
+                    for s in spans
+                ],
+            }],
+        }],
+    }
+
+
+class TraceExporter:
+    """Writes finished traces to a JSON-lines file and/or an OTLP/HTTP endpoint."""
+
+    def __init__(self, path: str = "", url: str = "") -> None:
+        self.path = path
+        self.url = url
+        self._file = open(path, "a", encoding="utf-8") if path else None
+        self._client = httpx.AsyncClient(timeout=5.0) if url else None
+        self._pending: set[asyncio.Task] = set()
+        self.exported = 0
+        self.failed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._file is not None or self._client is not None
+
+    def export(self, spans: list[Span]) -> None:
+        payload = otlp_json(spans)
+        self.exported += 1
+        if self._file is not None:
+            self._file.write(json.dumps(payload, separators=(",", ":")) + "\n")
+            self._file.flush()
+        if self._client is not None:
+            task = asyncio.get_running_loop().create_task(self._post(payload))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _post(self, payload: dict) -> None:
+        try:
+            response = await self._client.post(self.url, json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            self.failed += 1
+            logger.warning("Trace export to %s failed: %s", self.url, e)
+
+    async def close(self) -> None:
+        if self._pending:
+            await asyncio.wait(self._pending, timeout=5.0)
+        if self._client is not None:
+            await self._client.aclose()
+        if self._file is not None:
+            self._file.close()
+
+    def stats(self) -> dict:
+        return {"exported": self.exported, "failed": self.failed, "pending": len(self._pending)}
+
+
+_exporter: TraceExporter | None = None
+
+
+def init_telemetry() -> TraceExporter | None:
+    """Start exporting traces if a file or endpoint is configured."""
+    global _exporter
+    exporter = TraceExporter(settings.trace_export_path, settings.trace_export_url)
+    _exporter = exporter if exporter.enabled else None
+    return _exporter
+
+
+async def close_telemetry() -> None:
+    global _exporter
+    if _exporter:
+        await _exporter.close()
+        _exporter = None
+
+
+def current_exporter() -> TraceExporter | None:
+    """Return the trace exporter if tracing is exported (for stats)."""
+    return _exporter
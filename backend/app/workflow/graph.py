@@ -1,127 +1,305 @@
-"""LangGraph workflow: NL → SQL → Execute → Validate → Fix/Format.
+"""LangGraph workflow: NL → Route → (Plan | SQL → Execute → Validate → Fix) → Format.
 
 This is the core agentic AI showcase — a multi-node StateGraph with
-conditional routing, retry loops, and parallel formatting.
+conditional routing, retry loops, and parallel formatting. Every node runs
+in its own span (``app.telemetry``), so a slow answer can be broken down.
 """
 
+import asyncio
 import logging
 
+from langgraph.config import get_stream_writer
 from langgraph.graph import END, START, StateGraph
 
-from app.agents.chart_agent import generate_chart
-from app.agents.map_agent import generate_map
+from app.agents.chart_agent import build_chart, generate_chart
+from app.agents.map_agent import generate_map, has_geo_columns
 from app.agents.markdown_agent import generate_markdown
 from app.agents.sql_fixer import fix_sql
 from app.agents.sql_generator import generate_sql
-from app.db import execute_query
-from app.rag.utils import extract_sql, format_results_for_llm, is_read_only_sql
+from app.config import settings
+from app.db import QueryBudgetError, chat_budget, execute_parameterized, execute_query
+from app.planner import get_planner, itinerary_rows, resolve_timetable_city
+from app.rag.examples import get_example_store, render_examples
+from app.rag.retriever import retrieve_schema
+from app.rag.utils import extract_sql, format_results_for_llm
+from app.sql_guard import QueryRejectedError, guard_sql
+from app.telemetry import SQL_ESCALATIONS, SQL_RETRIES, annotate, traced_node
+from app.workflow.router import PLAN_ROUTE, build_query, match_intent, parse_route_question
 from app.workflow.state import WorkflowState
 
 logger = logging.getLogger(__name__)
 
 MAX_RETRIES = 2
 
-
 # ── Node functions ──────────────────────────────────────────────────
 
 
+@traced_node("route_intent")
+async def route_intent_node(state: WorkflowState) -> WorkflowState:
+    """Match template questions and build their parameterized SQL without the LLM."""
+    question = state["question"]
+    intent = match_intent(question)
+    if intent is None:
+        return {"intent": None}
+    if intent.name == PLAN_ROUTE:
+        return {"intent": intent.name}
+
+    query = await build_query(intent)
+    if query is None:
+        logger.info("Intent %s matched but entities didn't resolve: %s", intent.name, question)
+        return {"intent": None}
+    sql, params = query
+    logger.info("Routed to %s template: %s", intent.name, question)
+    annotate(intent=intent.name)
+    return {"intent": intent.name, "sql_query": sql, "sql_params": params, "attempt": 1}
+
+
+@traced_node("plan_route")
+async def plan_route_node(state: WorkflowState) -> WorkflowState:
+    """Answer "how do I get from X to Y" with the in-memory route planner.
+
+    Returns no results when a city is unknown or no itinerary exists, which
+    sends the question on to SQL generation instead.
+    """
+    request = parse_route_question(state["question"])
+    if request is None:
+        return {"query_results": None}
+
+    planner = await get_planner()
+    origin = await resolve_timetable_city(planner, request["origin"])
+    destination = await resolve_timetable_city(planner, request["destination"])
+    if origin is None or destination is None:
+        return {"query_results": None}
+
+    logger.info("Planning route %s → %s (%s)", origin, destination, request["objective"])
+    itinerary = planner.plan_cities(
+        origin, destination, request["depart_at"], request["objective"]
+    )
+    if itinerary is None:
+        return {"query_results": None}
+    return {"query_results": itinerary_rows(itinerary), "sql_error": None}
+
+
+@traced_node("generate_sql")
 async def generate_sql_node(state: WorkflowState) -> WorkflowState:
     """Translate the user's natural language question into SQL."""
     question = state["question"]
     logger.info("Generating SQL for: %s", question)
 
-    raw = await generate_sql(question)
+    store = get_example_store()
+    examples = None
+    if store:
+        chosen = store.examples_for(question, settings.few_shot_k)
+        examples = render_examples((e.question, e.sql) for e in chosen)
+    tier = state.get("model_tier") or settings.sql_model_tier
+    annotate(model_tier=tier)
+    # Tokens go out on the "custom" stream as they arrive
+    writer = get_stream_writer()
+    raw = await generate_sql(
+        question,
+        await retrieve_schema(question),
+        examples,
+        on_token=lambda token: writer({"sql": token}),
+        tier=tier,
+    )
     sql = extract_sql(raw)
-    return {"sql_query": sql, "attempt": state.get("attempt", 0) + 1}
+    return {"sql_query": sql, "model_tier": tier, "attempt": state.get("attempt", 0) + 1}
 
 
+@traced_node("execute_sql")
 async def execute_sql_node(state: WorkflowState) -> WorkflowState:
-    """Execute the SQL query against PostgreSQL."""
+    """Validate the SQL query and execute it against the database."""
     sql = state["sql_query"]
     logger.info("Executing SQL (attempt %d): %s", state.get("attempt", 1), sql)
-
-    if not is_read_only_sql(sql):
-        return {
-            "sql_error": "Query rejected: only SELECT queries are allowed.",
-            "query_results": None,
-        }
+    annotate(attempt=state.get("attempt", 1), template=state.get("sql_params") is not None)
+
+    params = state.get("sql_params")
+    if params is None:
+        # Generated SQL is checked locally first; template queries are trusted
+        try:
+            sql = await guard_sql(sql)
+        except QueryRejectedError as e:
+            logger.warning("SQL rejected: %s", e)
+            annotate(error="rejected")
+            return {"sql_error": str(e), "sql_retryable": e.retryable, "query_results": None}
 
     try:
-        results = await execute_query(sql)
-        return {"query_results": results, "sql_error": None}
+        if params is not None:
+            results = await execute_parameterized(sql, params, chat_budget())
+        else:
+            results = await execute_query(sql)
+        store = get_example_store()
+        if store and results and params is None:
+            # A candidate few-shot example until the user's next message confirms it
+            store.record_pending(state.get("thread_id"), state["question"], sql)
+        annotate(rows=len(results))
+        return {"sql_query": sql, "query_results": results, "sql_error": None}
+    except QueryBudgetError as e:
+        # Feed the budget violation back to fix_sql so it narrows the query
+        logger.warning("SQL over budget (%s): %s", e.limit, sql)
+        annotate(error=f"budget:{e.limit}")
+        return {"sql_error": str(e), "query_results": None}
     except Exception as e:
         logger.warning("SQL execution error: %s", e)
+        annotate(error="execution")
         return {"sql_error": str(e), "query_results": None}
 
 
+@traced_node("fix_sql")
 async def fix_sql_node(state: WorkflowState) -> WorkflowState:
     """Attempt to fix a failed SQL query using the error message."""
     sql = state["sql_query"]
     error = state.get("sql_error", "Unknown error")
     logger.info("Fixing SQL (attempt %d): %s", state.get("attempt", 1), error)
+    SQL_RETRIES.inc()
 
-    raw = await fix_sql(sql, error)
+    # Columns named in the failed query or the error stay in the schema
+    schema = await retrieve_schema(f"{state['question']}\n{sql}\n{error}")
+    raw = await fix_sql(sql, error, schema)
     fixed = extract_sql(raw)
-    return {"sql_query": fixed, "attempt": state.get("attempt", 0) + 1}
+    return {
+        "sql_query": fixed,
+        "sql_params": None,
+        "model_tier": settings.sql_fix_model_tier,
+        "attempt": state.get("attempt", 0) + 1,
+    }
+
+
+async def _run_formatter(name: str, coro) -> object | None:
+    """Await a formatter coroutine with its own timeout; failures yield ``None``."""
+    try:
+        return await asyncio.wait_for(coro, timeout=settings.format_timeout_seconds)
+    except TimeoutError:
+        logger.warning("%s generation timed out after %.1fs", name, settings.format_timeout_seconds)
+    except Exception:
+        logger.warning("%s generation failed", name, exc_info=True)
+    return None
 
 
-async def format_response_node(state: WorkflowState) -> WorkflowState:
-    """Format successful results into markdown, chart config, and map GeoJSON."""
+@traced_node("format_markdown")
+async def format_markdown_node(state: WorkflowState) -> WorkflowState:
+    """Format successful results as a markdown summary."""
     question = state["question"]
     results = state.get("query_results") or []
-    results_text = format_results_for_llm(results)
+    logger.info("Formatting markdown (%d rows)", len(results))
+
+    writer = get_stream_writer()
+    md = await _run_formatter(
+        "Markdown",
+        generate_markdown(
+            question,
+            format_results_for_llm(results),
+            on_token=lambda token: writer({"markdown": token}),
+        ),
+    )
+    if md is None:
+        return {
+            "markdown": "I found results for your question but couldn't summarize them in time.",
+            "error_message": "Markdown generation failed",
+        }
+    return {"markdown": md}
+
+
+@traced_node("format_chart")
+async def format_chart_node(state: WorkflowState) -> WorkflowState:
+    """Generate a chart configuration for the results (non-critical)."""
+    results = state.get("query_results") or []
+    if len(results) < 2:
+        return {"chart": None}
+
+    chart = build_chart(state["question"], results)
+    if chart is None:
+        # Heuristics were unsure about this result shape: ask the LLM
+        chart = await _run_formatter(
+            "Chart", generate_chart(state["question"], format_results_for_llm(results), results)
+        )
+    return {"chart": chart}
 
-    logger.info("Formatting response (%d rows)", len(results))
 
-    md = await generate_markdown(question, results_text)
+@traced_node("format_map")
+async def format_map_node(state: WorkflowState) -> WorkflowState:
+    """Build map GeoJSON if the results can be placed on a map (non-critical)."""
+    results = state.get("query_results") or []
+    if not has_geo_columns(results):
+        return {"map_geojson": None}
 
-    # Attempt chart generation (non-critical)
-    chart = None
-    try:
-        if len(results) >= 2:
-            chart = await generate_chart(question, results_text)
-    except Exception:
-        logger.warning("Chart generation failed", exc_info=True)
+    map_geojson = await _run_formatter("Map", generate_map(state["question"], results))
+    return {"map_geojson": map_geojson}
 
-    # Attempt map generation if results contain coordinates
-    map_geojson = None
-    try:
-        has_coords = results and any(
-            "latitude" in r or "longitude" in r for r in results
-        )
-        if has_coords:
-            map_geojson = await generate_map(question, results_text)
-    except Exception:
-        logger.warning("Map generation failed", exc_info=True)
 
-    return {"markdown": md, "chart": chart, "map_geojson": map_geojson}
+FORMAT_NODES = ["format_markdown", "format_chart", "format_map"]
 
 
 # ── Conditional routing ─────────────────────────────────────────────
 
 
-def route_after_execution(state: WorkflowState) -> str:
-    """Decide next step after SQL execution: fix, format, or fail."""
+def route_after_intent(state: WorkflowState) -> str:
+    """Planner for journeys, straight to execution for templates, else the LLM."""
+    if state.get("intent") == PLAN_ROUTE:
+        return "plan_route"
+    if state.get("sql_params") is not None:
+        return "execute_sql"
+    return "generate_sql"
+
+
+def route_after_planning(state: WorkflowState) -> str | list[str]:
+    """Format a planned itinerary, or fall back to SQL if planning found nothing."""
+    if state.get("query_results"):
+        return FORMAT_NODES
+    return "generate_sql"
+
+
+def route_after_execution(state: WorkflowState) -> str | list[str]:
+    """Decide next step after SQL execution: fix, format, or fail.
+
+    On success the three formatters fan out as parallel branches so each
+    one's output is streamed as soon as it finishes.
+    """
     if state.get("sql_error") is None:
-        return "format"
-    if state.get("attempt", 0) < MAX_RETRIES:
+        if should_escalate(state):
+            return "escalate"
+        return FORMAT_NODES
+    if state.get("sql_retryable", True) and state.get("attempt", 0) < MAX_RETRIES:
         return "fix"
     return "fail"
 
 
+def should_escalate(state: WorkflowState) -> bool:
+    """Low confidence: SQL from the small model that ran but found nothing."""
+    return (
+        settings.llm_escalate_empty_results
+        and state.get("model_tier") == "small"
+        and not state.get("query_results")
+        and settings.openai_small_model != settings.openai_model
+    )
+
+
+@traced_node("escalate")
+async def escalate_node(state: WorkflowState) -> WorkflowState:
+    """Regenerate the SQL with the large model, with a fresh retry budget."""
+    logger.info("Escalating to the large model: %s", state["question"])
+    SQL_ESCALATIONS.inc()
+    return {"model_tier": "large", "attempt": 0}
+
+
+@traced_node("fail")
 async def fail_node(state: WorkflowState) -> WorkflowState:
     """Terminal node for when all retry attempts are exhausted."""
     error = state.get("sql_error", "Unknown error")
+    if state.get("sql_retryable", True):
+        reason = f"The database query failed after {state.get('attempt', 0)} attempts."
+    else:
+        reason = "I can only read from the database, not change it."
     return {
         "markdown": (
-            f"I wasn't able to answer your question. The database query failed "
-            f"after {state.get('attempt', 0)} attempts.\n\n"
+            f"I wasn't able to answer your question. {reason}\n\n"
             f"**Error:** {error}\n\n"
             f"Try rephrasing your question or asking about specific routes, "
             f"terminals, or operators."
         ),
         "chart": None,
         "map_geojson": None,
+        "error_message": error,
     }
 
 
@@ -133,22 +311,44 @@ def build_workflow() -> StateGraph:
     graph = StateGraph(WorkflowState)
 
     # Add nodes
+    graph.add_node("route_intent", route_intent_node)
+    graph.add_node("plan_route", plan_route_node)
     graph.add_node("generate_sql", generate_sql_node)
     graph.add_node("execute_sql", execute_sql_node)
     graph.add_node("fix_sql", fix_sql_node)
-    graph.add_node("format_response", format_response_node)
+    graph.add_node("escalate", escalate_node)
+    graph.add_node("format_markdown", format_markdown_node)
+    graph.add_node("format_chart", format_chart_node)
+    graph.add_node("format_map", format_map_node)
     graph.add_node("fail", fail_node)
 
     # Add edges
-    graph.add_edge(START, "generate_sql")
+    graph.add_edge(START, "route_intent")
+    graph.add_conditional_edges(
+        "route_intent",
+        route_after_intent,
+        {"plan_route": "plan_route", "execute_sql": "execute_sql", "generate_sql": "generate_sql"},
+    )
+    graph.add_conditional_edges(
+        "plan_route",
+        route_after_planning,
+        {"generate_sql": "generate_sql", **{name: name for name in FORMAT_NODES}},
+    )
     graph.add_edge("generate_sql", "execute_sql")
     graph.add_conditional_edges(
         "execute_sql",
         route_after_execution,
-        {"fix": "fix_sql", "format": "format_response", "fail": "fail"},
+        {
+            "fix": "fix_sql",
+            "fail": "fail",
+            "escalate": "escalate",
+            **{name: name for name in FORMAT_NODES},
+        },
     )
     graph.add_edge("fix_sql", "execute_sql")  # Retry loop
-    graph.add_edge("format_response", END)
+    graph.add_edge("escalate", "generate_sql")
+    for name in FORMAT_NODES:
+        graph.add_edge(name, END)
     graph.add_edge("fail", END)
 
     return graph
@@ -0,0 +1,209 @@
+"""Intent router: answers common question shapes without the LLM.
+
+Questions like "trains from X to Y", "terminals in <country>" and "greenest
+routes from X" map directly onto the parameterized queries in
+``app/queries.py``. Journey questions ("how do I get from X to Y") go to the
+route planner. Entities are resolved against the terminal registry and the
+trigram indexes first; anything that doesn't match a template, or names a
+place or operator we can't find, is left to SQL generation.
+"""
+
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from app.geo.terminals import get_terminal_registry
+from app.planner import WEEKDAYS, parse_minute_of_week
+from app.queries import SCHEDULE_COLUMNS, routes_query, terminals_query
+from app.search import fold_term, search_operators, search_terminals
+
+# Optional lead-in: "show me all the", "list", "which are the", ...
+_LEAD = (
+    r"^(?:(?:please )?(?:show|list|find|give|get|display|what are|which are)(?: me)? )?"
+    r"(?:(?:all|the|any) )*"
+)
+_PLACE = r"[\w .'-]+?"
+
+_GREENEST = re.compile(
+    _LEAD + r"(?:greenest|cleanest|most sustainable|lowest[ -](?:co2|emissions?)) "
+    rf"(?:trains?|routes?|connections?) from (?P<origin>{_PLACE})"
+    rf"(?: to (?P<destination>{_PLACE}))?\W*$",
+    re.IGNORECASE,
+)
+# Plural "routes"/"connections" lists trains; a singular "route" is a journey question
+_TRAINS = re.compile(
+    _LEAD + r"(?:direct )?(?:trains?|routes|connections|services|departures) "
+    rf"from (?P<origin>{_PLACE}) to (?P<destination>{_PLACE})"
+    rf"(?: (?:operated )?by (?P<operator>{_PLACE}))?\W*$",
+    re.IGNORECASE,
+)
+_TERMINALS = re.compile(
+    _LEAD + r"(?:rail |intermodal |freight )?terminals? (?:located )?in "
+    rf"(?:the )?(?P<place>{_PLACE})\W*$",
+    re.IGNORECASE,
+)
+
+# "How do I get from Rotterdam to Verona", "greenest route from Hamburg to Milano on Friday".
+# Only questions the planner answers as asked qualify: the words before "from"
+# may name the journey and an objective, the tail only a weekday, a time or an
+# objective. Anything else ("direct", "with hazardous goods", "by Hupac",
+# "cheapest", counts) is a constraint the planner can't honour, so it goes to SQL.
+_JOURNEY = re.compile(
+    r"\b(?:how (?:do|can|could|would|should) (?:i|we|you) (?:get|go|ship|send|move|travel)"
+    r"|route|itinerary|connection|journey|path|way)\b",
+    re.IGNORECASE,
+)
+_JOURNEY_WORDS = frozenset(
+    "how do can could would should i we you get go ship send move travel what what's whats "
+    "which is there a an the my me to show find plan give please best fastest quickest "
+    "shortest greenest cleanest most sustainable lowest co2 emissions fewest least minimum "
+    "legs changes transfers route itinerary connection journey path way freight cargo goods"
+    .split()
+)
+_WEEKDAY = "(?:" + "|".join(WEEKDAYS) + ")s?"
+_ROUTE_TAIL = (
+    rf"(?: (?:leaving |departing )?(?:on |this |next )?{_WEEKDAY}"
+    r"| (?:leaving |departing )?(?:at |after )?\d{1,2}:\d{2}"
+    r"| with (?:the )?(?:fewest|least|lowest|minimum) "
+    r"(?:legs|changes|transfers|trains|co2|emissions)"
+    r"| (?:fastest|quickest|greenest))*"
+)
+# Up to four words per place, so a trailing clause can't pass for part of a name
+_ROUTE_PLACE = r"[\w.'-]+(?: [\w.'-]+){0,3}?"
+_ROUTE_QUESTION = re.compile(
+    rf"^(?P<lead>.*?)\bfrom (?P<origin>{_ROUTE_PLACE}) to (?P<destination>{_ROUTE_PLACE})"
+    rf"{_ROUTE_TAIL}\W*$",
+    re.IGNORECASE,
+)
+# Words that start a clause, so a "place" containing one is really a constraint
+_CLAUSE_WORDS = frozenset(
+    "is are was has have with without by for that which who and or but carrying using via "
+    "per cheapest direct cost costs".split()
+)
+_CO2_WORDS = re.compile(r"\b(?:greenest|co2|emissions?|cleanest|sustainable)\b", re.IGNORECASE)
+_LEGS_WORDS = re.compile(
+    r"\b(?:fewest|least|minimum) (?:legs|changes|transfers|trains)\b", re.IGNORECASE
+)
+_DEPARTURE = re.compile(
+    r"\b(?P<day>" + "|".join(WEEKDAYS) + r")\b(?:.*?\b(?P<time>\d{1,2}:\d{2})\b)?",
+    re.IGNORECASE,
+)
+
+PLAN_ROUTE = "plan_route"
+
+
+@dataclass(frozen=True)
+class Intent:
+    name: str
+    slots: dict = field(default_factory=dict)
+
+
+def parse_route_question(question: str) -> dict | None:
+    """Extract origin, destination, objective and departure from a routing question."""
+    match = _ROUTE_QUESTION.match(" ".join(question.strip().split()))
+    if not match or not _JOURNEY.search(match["lead"]):
+        return None
+    if not set(re.findall(r"[\w']+", match["lead"].lower())) <= _JOURNEY_WORDS:
+        return None
+    places = f"{match['origin']} {match['destination']}".lower().split()
+    if _CLAUSE_WORDS.intersection(places):
+        return None
+    objective = "time"
+    if _CO2_WORDS.search(question):
+        objective = "co2"
+    elif _LEGS_WORDS.search(question):
+        objective = "legs"
+
+    departure = _DEPARTURE.search(question)
+    if departure:
+        weekday = WEEKDAYS.index(departure["day"].capitalize()) + 1
+        depart_at = parse_minute_of_week(weekday, departure["time"] or "00:00")
+    else:
+        now = datetime.now()
+        depart_at = parse_minute_of_week(now.isoweekday(), now.strftime("%H:%M"))
+    return {
+        "origin": match["origin"].strip(),
+        "destination": match["destination"].strip(),
+        "objective": objective,
+        "depart_at": depart_at,
+    }
+
+
+def match_intent(question: str) -> Intent | None:
+    """Match a question against the templates; ``None`` means "ask the LLM"."""
+    text = " ".join(question.strip().split())
+    for name, pattern in (("greenest", _GREENEST), ("trains", _TRAINS), ("terminals", _TERMINALS)):
+        match = pattern.match(text)
+        if match:
+            slots = {k: v.strip() for k, v in match.groupdict().items() if v}
+            return Intent(name, slots)
+    request = parse_route_question(text)
+    if request:
+        return Intent(PLAN_ROUTE, request)
+    return None
+
+
+async def resolve_city(name: str) -> str | None:
+    """The city name to filter on for ``name``, or ``None`` if unsure.
+
+    A city the registry knows is kept as the user spelled it: the filters
+    match that spelling and its alias, so "Antwerp" finds both Antwerp and
+    Antwerpen trains instead of being narrowed to one registry city.
+    """
+    registry = await get_terminal_registry()
+    if registry.in_city(name):
+        return name
+    # Accept a lookup hit only if it contains what was asked for, not a fuzzy guess
+    term = fold_term(name)
+    for row in await search_terminals(name, limit=5):
+        if term in fold_term(row["city"]):
+            return row["city"]
+    return None
+
+
+async def resolve_country(name: str) -> str | None:
+    """The country in the data that ``name`` refers to, or ``None``."""
+    registry = await get_terminal_registry()
+    return registry.country(name)
+
+
+async def resolve_operator(name: str) -> str | None:
+    """The operator name in the data that ``name`` refers to, or ``None``."""
+    term = fold_term(name)
+    for row in await search_operators(name, limit=5):
+        if term in fold_term(row["name"]):
+            return row["name"]
+    return None
+
+
+async def build_query(intent: Intent) -> tuple[str, list] | None:
+    """Parameterized SQL for a matched intent, or ``None`` if an entity is unknown."""
+    slots = intent.slots
+    if intent.name == "terminals":
+        country = await resolve_country(slots["place"])
+        if country:
+            return terminals_query(country=country)
+        city = await resolve_city(slots["place"])
+        return terminals_query(city=city) if city else None
+
+    origin = await resolve_city(slots["origin"])
+    if origin is None:
+        return None
+    destination = None
+    if "destination" in slots:
+        destination = await resolve_city(slots["destination"])
+        if destination is None:
+            return None
+
+    if intent.name == "greenest":
+        return routes_query(
+            origin, destination, limit=20, columns=SCHEDULE_COLUMNS, order="greenest"
+        )
+    operator = None
+    if "operator" in slots:
+        operator = await resolve_operator(slots["operator"])
+        if operator is None:
+            return None
+    return routes_query(
+        origin, destination, operator, limit=50, columns=SCHEDULE_COLUMNS, order="departure"
+    )
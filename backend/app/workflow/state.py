@@ -7,8 +7,13 @@ class WorkflowState(TypedDict, total=False):
     """State that flows through the LangGraph workflow nodes."""
 
     question: str
+    thread_id: str | None
+    intent: str | None
     sql_query: str
+    model_tier: str | None
+    sql_params: list | None
     sql_error: str | None
+    sql_retryable: bool
     query_results: list[dict] | None
     attempt: int
     markdown: str
@@ -0,0 +1,92 @@
+"""Compare two benchmark results and flag regressions.
+
+Usage:
+    cd backend && python -m bench.compare baseline.json bench.json [--tolerance 0.25]
+
+Latencies (``*_ms``) and memory (``*_mb``) regress when they grow, throughput
+(``*_per_second``) when it shrinks. Latencies below ``--min-ms`` in the
+baseline are too noisy to compare and are skipped. Exits with status 1 if any
+metric is worse than the baseline by more than the tolerance.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    """Numeric leaves of ``results`` keyed by their dotted path."""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{path}."))
+        elif isinstance(value, int | float) and not isinstance(value, bool):
+            flat[path] = float(value)
+    return flat
+
+
+def _direction(metric: str) -> int:
+    """+1 if higher is worse, -1 if lower is worse, 0 if not compared."""
+    if metric.startswith("meta."):
+        return 0
+    if metric.endswith(("_ms", "_mb")):
+        return 1
+    if metric.endswith("_per_second"):
+        return -1
+    return 0
+
+
+def compare(
+    baseline: dict, current: dict, tolerance: float = 0.25, min_ms: float = 1.0
+) -> list[dict]:
+    """Relative change of every comparable metric, marking those past ``tolerance``."""
+    before, after = flatten(baseline), flatten(current)
+    rows = []
+    for metric in sorted(before.keys() & after.keys()):
+        direction = _direction(metric)
+        old, new = before[metric], after[metric]
+        if not direction or old <= 0 or (metric.endswith("_ms") and old < min_ms):
+            continue
+        change = (new - old) / old
+        rows.append({
+            "metric": metric,
+            "baseline": old,
+            "current": new,
+            "change": change,
+            "regression": direction * change > tolerance,
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("current", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative change before a metric counts as a regression")
+    parser.add_argument("--min-ms", type=float, default=1.0,
+                        help="skip latencies below this in the baseline")
+    args = parser.parse_args()
+
+    baseline = json.loads(args.baseline.read_text())
+    current = json.loads(args.current.read_text())
+    if baseline.get("meta", {}).get("config") != current.get("meta", {}).get("config"):
+        print("warning: the runs used different settings (meta.config)", file=sys.stderr)
+
+    rows = compare(baseline, current, args.tolerance, args.min_ms)
+    width = max((len(row["metric"]) for row in rows), default=0)
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['metric']:<{width}}  {row['baseline']:>12.3f} → {row['current']:>12.3f}"
+            f"  {row['change']:>+8.1%}{flag}"
+        )
+    regressions = sum(row["regression"] for row in rows)
+    print(f"\n{regressions} regression(s) beyond ±{args.tolerance:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
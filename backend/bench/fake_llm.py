@@ -0,0 +1,148 @@
+"""A scripted OpenAI-compatible server for offline benchmarks.
+
+``FakeOpenAI`` answers ``/chat/completions`` requests from the scenarios file
+instead of the network. It tells the agents apart by the first line of their
+prompt and finds the scenario from the ``User question:`` line (or, for the
+fixer, from the failed SQL), so the real chains, parsers and transport all
+run unchanged. Responses stream token by token when the client asks for it,
+with a configurable delay before the first token and between tokens, and
+report token usage like the real API.
+"""
+
+import asyncio
+import json
+import re
+from collections import Counter
+from collections.abc import AsyncIterator
+
+import httpx
+
+from app.rag.prompts import (
+    CHART_GENERATION_PROMPT,
+    MARKDOWN_SUMMARY_PROMPT,
+    SQL_FIX_PROMPT,
+    SQL_GENERATION_PROMPT,
+)
+
+_CHAINS = {
+    SQL_GENERATION_PROMPT.partition("\n")[0]: "generate_sql",
+    SQL_FIX_PROMPT.partition("\n")[0]: "fix_sql",
+    MARKDOWN_SUMMARY_PROMPT.partition("\n")[0]: "markdown",
+    CHART_GENERATION_PROMPT.partition("\n")[0]: "chart",
+}
+
+_QUESTION = re.compile(r"^User question: (.*)$", re.MULTILINE)
+_FAILED_SQL = re.compile(r"ORIGINAL SQL:\n(.*?)\n\nERROR MESSAGE:", re.DOTALL)
+_TOKEN = re.compile(r"\S+\s*|\s+")
+
+
+class FakeOpenAI:
+    """Scripted chat completions for the four LLM chains, keyed by question.
+
+    The map agent builds its markers without the LLM, so it has no script.
+    """
+
+    def __init__(
+        self, scenarios: list[dict], latency_seconds: float = 0.0, token_seconds: float = 0.0
+    ) -> None:
+        self.scenarios = {s["question"]: s for s in scenarios}
+        self.latency_seconds = latency_seconds
+        self.token_seconds = token_seconds
+        # (chain, model) -> number of completions served
+        self.calls: Counter[tuple[str, str]] = Counter()
+        self.unmatched = 0
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def _answer(self, chain: str, prompt: str) -> str | None:
+        if chain == "fix_sql":
+            failed = _FAILED_SQL.search(prompt)
+            for scenario in self.scenarios.values():
+                if failed and scenario.get("sql") == failed.group(1).strip():
+                    return scenario.get("fixed_sql", scenario["sql"])
+            return None
+
+        questions = _QUESTION.findall(prompt)
+        scenario = self.scenarios.get(questions[-1].strip()) if questions else None
+        if scenario is None:
+            return None
+        if chain == "generate_sql":
+            return scenario.get("sql")
+        if chain == "markdown":
+            return scenario.get("markdown", "Here are the results.")
+        return json.dumps(scenario.get("chart", {"chart_type": "bar"}))
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        prompt = body["messages"][-1]["content"]
+        chain = _CHAINS.get(prompt.partition("\n")[0])
+        answer = self._answer(chain, prompt) if chain else None
+        if answer is None:
+            self.unmatched += 1
+            return httpx.Response(
+                400, json={"error": {"message": "No scripted response for this prompt"}}
+            )
+
+        self.calls[chain, body["model"]] += 1
+        await asyncio.sleep(self.latency_seconds)
+        tokens = _TOKEN.findall(answer)
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(tokens),
+            "total_tokens": len(prompt) // 4 + len(tokens),
+        }
+        if body.get("stream"):
+            return httpx.Response(
+                200,
+                content=self._stream(body["model"], tokens, usage),
+                headers={"content-type": "text/event-stream"},
+            )
+        return httpx.Response(200, json=_completion(body["model"], answer, usage))
+
+    async def _stream(self, model: str, tokens: list[str], usage: dict) -> AsyncIterator[bytes]:
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(self.token_seconds)
+            delta = {"index": 0, "delta": {"content": token}, "finish_reason": None}
+            yield _sse(_chunk(model, [delta]))
+        yield _sse(_chunk(model, [{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        yield _sse({**_chunk(model, []), "usage": usage})
+        yield b"data: [DONE]\n\n"
+
+    def stats(self) -> dict:
+        return {
+            "calls": {f"{chain}:{model}": n for (chain, model), n in sorted(self.calls.items())},
+            "unmatched": self.unmatched,
+        }
+
+
+def _completion(model: str, content: str, usage: dict) -> dict:
+    return {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": usage,
+    }
+
+
+def _chunk(model: str, choices: list[dict]) -> dict:
+    return {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": model,
+        "choices": choices,
+    }
+
+
+def _sse(payload: dict) -> bytes:
+    return f"data: {json.dumps(payload)}\n\n".encode()
@@ -0,0 +1,363 @@
+"""Offline benchmark for the chat workflow.
+
+Runs the scripted questions in ``bench/scenarios.json`` against the seeded
+database with a fake LLM (``bench/fake_llm.py``), so the numbers measure our
+own overhead (graph, guard, database, SSE) without network calls or OpenAI's
+latency. Two phases:
+
+- ``workflow``: each question runs through ``workflow.astream`` in turn, timing
+  every node and the whole run;
+- ``chat``: ``--clients`` concurrent clients send ``--requests`` questions to
+  ``POST /api/chat`` in total, timing the first SSE bytes and the complete
+  response.
+
+Database query timings, pool waits, memory high-water marks and the fake
+LLM's call counts are reported alongside. Caches are off unless ``--cache``
+is given, so repeated questions do the same work every time.
+
+Usage:
+    cd backend && python -m data.seed
+    python -m bench.run --clients 8 --requests 64 --out bench.json
+    python -m bench.compare baseline.json bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import UTC, datetime
+from pathlib import Path
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+SCENARIOS_PATH = Path(__file__).parent / "scenarios.json"
+FORMAT_VERSION = 1
+
+
+def summarize(seconds: list[float]) -> dict:
+    """Count and latency percentiles (in milliseconds) of ``seconds``."""
+    ordered = sorted(seconds)
+
+    def pct(fraction: float) -> float:
+        if not ordered:
+            return 0.0
+        return round(1000 * ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": pct(0.5),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": pct(1.0),
+    }
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Wall-clock duration of every LangGraph node run."""
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self._started: dict[UUID, tuple[str, float]] = {}
+        self.durations: dict[str, list[float]] = defaultdict(list)
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, metadata=None, **kwargs):
+        # A node's own run is named after it; runs nested inside it are not
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._started[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs):
+        if run_id in self._started:
+            node, start = self._started.pop(run_id)
+            self.durations[node].append(time.perf_counter() - start)
+
+    on_chain_error = on_chain_end
+
+
+@contextmanager
+def _overrides(target, **values):
+    """Set attributes on ``target`` for the duration of the block."""
+    previous = {name: getattr(target, name) for name in values}
+    for name, value in values.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(target, name, value)
+
+
+@contextmanager
+def _timed_queries(samples: list[float]):
+    """Record the duration of every query run through the connection pool."""
+    from app import db
+
+    run_budgeted = db._run_budgeted
+
+    async def timed(conn, sql, params, budget):
+        start = time.perf_counter()
+        try:
+            return await run_budgeted(conn, sql, params, budget)
+        finally:
+            samples.append(time.perf_counter() - start)
+
+    with _overrides(db, _run_budgeted=timed):
+        yield
+
+
+async def _post_sse(app, path: str, payload: dict) -> dict:
+    """POST to the ASGI app in-process, timing the streamed response body."""
+    body = json.dumps(payload).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"bench"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    received = False
+    result = {"status": None, "first_byte": None, "bytes": 0, "events": 0, "errors": 0}
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Never disconnect; the response's own task group cancels this wait
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            chunk = message["body"]
+            if result["first_byte"] is None:
+                result["first_byte"] = time.perf_counter() - start
+            result["bytes"] += len(chunk)
+            for line in chunk.decode().splitlines():
+                if line.startswith("event:"):
+                    result["events"] += 1
+                    result["errors"] += line.split(":", 1)[1].strip() == "error"
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    result["total"] = time.perf_counter() - start
+    return result
+
+
+async def _workflow_phase(scenarios: list[dict], rounds: int) -> dict:
+    from app.workflow.graph import workflow
+
+    timer = NodeTimer()
+    runs = []
+    failed = 0
+    for _ in range(rounds):
+        for scenario in scenarios:
+            start = time.perf_counter()
+            final: dict = {}
+            async for mode, event in workflow.astream(
+                {"question": scenario["question"]},
+                stream_mode=["updates", "custom"],
+                config={"callbacks": [timer]},
+            ):
+                if mode == "updates":
+                    for output in event.values():
+                        final.update(output or {})
+            runs.append(time.perf_counter() - start)
+            failed += bool(final.get("error_message"))
+    return {
+        "runs": len(runs),
+        "failed": failed,
+        "end_to_end": summarize(runs),
+        "nodes": {node: summarize(d) for node, d in sorted(timer.durations.items())},
+    }
+
+
+async def _chat_phase(app, scenarios: list[dict], clients: int, requests: int) -> dict:
+    results = []
+    next_request = iter(range(requests))
+
+    async def client(offset: int) -> None:
+        # Clients start at different questions so identical ones rarely overlap
+        for i in next_request:
+            question = scenarios[(offset + i) % len(scenarios)]["question"]
+            payload = {"messages": [{"role": "user", "content": question}]}
+            results.append(await _post_sse(app, "/api/chat", payload))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(offset) for offset in range(clients)))
+    wall = time.perf_counter() - start
+    return {
+        "clients": clients,
+        "requests": len(results),
+        "errors": sum(r["status"] != 200 or r["errors"] > 0 for r in results),
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(len(results) / wall, 2),
+        "events_per_second": round(sum(r["events"] for r in results) / wall, 1),
+        "bytes_per_second": round(sum(r["bytes"] for r in results) / wall, 1),
+        "first_byte": summarize([r["first_byte"] for r in results if r["first_byte"]]),
+        "end_to_end": summarize([r["total"] for r in results]),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def run_benchmark(
+    database_path: str | None = None,
+    scenarios: list[dict] | None = None,
+    clients: int = 8,
+    requests: int = 64,
+    rounds: int = 3,
+    llm_latency_ms: float = 0.0,
+    token_ms: float = 0.0,
+    cache: bool = False,
+    trace_memory: bool = False,
+) -> dict:
+    """Run both phases and return the results document."""
+    from app.config import settings
+
+    # The fake server ignores the key, but the OpenAI client insists on one
+    settings.openai_api_key = settings.openai_api_key or "sk-bench"
+    from app import db
+    from app.agents import llm
+    from app.main import app, lifespan
+    from bench.fake_llm import FakeOpenAI
+
+    if scenarios is None:
+        scenarios = json.loads(SCENARIOS_PATH.read_text())
+    fake = FakeOpenAI(scenarios, llm_latency_ms / 1000, token_ms / 1000)
+    query_times: list[float] = []
+    config = {
+        "clients": clients,
+        "requests": requests,
+        "rounds": rounds,
+        "scenarios": len(scenarios),
+        "llm_latency_ms": llm_latency_ms,
+        "token_ms": token_ms,
+        "cache": cache,
+        "db_pool_size": settings.db_pool_size,
+    }
+
+    overrides = {
+        "database_path": database_path or settings.database_path,
+        "rate_limit_rpm": 0,
+        "api_secret_key": "",
+        "response_cache_path": "",
+        "few_shot_path": "",
+    }
+    if not cache:
+        overrides.update(response_cache_size=0, result_cache_bytes=0)
+
+    if trace_memory:
+        tracemalloc.start()
+    previous = llm.use_transport(fake.transport())
+    try:
+        with _overrides(settings, **overrides), _timed_queries(query_times):
+            async with lifespan(app):
+                data_version = await db.get_data_version()
+                workflow = await _workflow_phase(scenarios, rounds)
+                chat = await _chat_phase(app, scenarios, clients, requests)
+                pool = db.get_pool().stats()
+            memory = {"max_rss_mb": _max_rss_mb()}
+            if trace_memory:
+                memory["traced_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+    finally:
+        llm.use_transport(previous)
+        if trace_memory:
+            tracemalloc.stop()
+
+    return {
+        "format_version": FORMAT_VERSION,
+        "meta": {
+            "timestamp": datetime.now(UTC).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": Path(overrides["database_path"]).name,
+            "data_version": data_version,
+            "config": config,
+        },
+        "workflow": workflow,
+        "chat": chat,
+        "db": {"queries": summarize(query_times), "pool": pool},
+        "memory": memory,
+        "llm": fake.stats(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmark for the chat workflow.")
+    parser.add_argument("--db", help="SQLite database (default: DATABASE_PATH)")
+    parser.add_argument("--scenarios", type=Path, default=SCENARIOS_PATH)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent /api/chat clients")
+    parser.add_argument("--requests", type=int, default=64, help="total /api/chat requests")
+    parser.add_argument("--rounds", type=int, default=3, help="workflow passes per question")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="fake LLM delay before the first token")
+    parser.add_argument("--token-ms", type=float, default=0.0,
+                        help="fake LLM delay between streamed tokens")
+    parser.add_argument("--cache", action="store_true", help="keep the response/result caches on")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also report the tracemalloc peak (slows the run)")
+    parser.add_argument("--out", type=Path, help="write the JSON results here")
+    args = parser.parse_args()
+
+    from app.config import settings
+
+    database_path = args.db or settings.database_path
+    if not Path(database_path).exists():
+        parser.error(f"{database_path} does not exist; run `python -m data.seed` first")
+
+    results = asyncio.run(run_benchmark(
+        database_path=database_path,
+        scenarios=json.loads(args.scenarios.read_text()),
+        clients=args.clients,
+        requests=args.requests,
+        rounds=args.rounds,
+        llm_latency_ms=args.llm_latency_ms,
+        token_ms=args.token_ms,
+        cache=args.cache,
+        trace_memory=args.trace_memory,
+    ))
+    text = json.dumps(results, indent=2)
+    if args.out:
+        args.out.write_text(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ Usage:
 
 import csv
 import sqlite3
+import unicodedata
 from pathlib import Path
 
 DB_PATH = Path(__file__).parent / "fr8tools.db"
@@ -71,14 +72,143 @@ CREATE TABLE IF NOT EXISTS trains (
     hazardous_goods INTEGER
 );
 
-CREATE INDEX IF NOT EXISTS idx_trains_from_city ON trains(from_terminal_city);
+-- (sort key, uid) indexes back the keyset-paginated listings in app/queries.py
+CREATE INDEX IF NOT EXISTS idx_terminals_city_uid ON terminals(city, uid);
+CREATE INDEX IF NOT EXISTS idx_trains_from_city_uid ON trains(from_terminal_city, uid);
+DROP INDEX IF EXISTS idx_trains_from_city;  -- superseded by idx_trains_from_city_uid
 CREATE INDEX IF NOT EXISTS idx_trains_to_city ON trains(to_terminal_city);
 CREATE INDEX IF NOT EXISTS idx_trains_from_country ON trains(from_terminal_country);
 CREATE INDEX IF NOT EXISTS idx_trains_to_country ON trains(to_terminal_country);
 CREATE INDEX IF NOT EXISTS idx_trains_route_hash ON trains(route_hash_key);
 CREATE INDEX IF NOT EXISTS idx_trains_operator ON trains(operator_name);
+CREATE INDEX IF NOT EXISTS idx_trains_from_uid ON trains(from_terminal_uid);
+CREATE INDEX IF NOT EXISTS idx_trains_to_uid ON trains(to_terminal_uid);
+CREATE INDEX IF NOT EXISTS idx_trains_operator_uid ON trains(operator_uid);
+CREATE INDEX IF NOT EXISTS idx_trains_departure ON trains(departure_iso_weekday, departure_time);
+
+-- Trigram full-text indexes for substring/fuzzy lookups. Text is stored
+-- lowercased with accents removed ("Köln" → "koln"), see fold().
+CREATE VIRTUAL TABLE IF NOT EXISTS terminals_fts USING fts5(
+    uid UNINDEXED, name, city, country, tokenize='trigram'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS operators_fts USING fts5(
+    uid UNINDEXED, name, tokenize='trigram'
+);
 """
 
+BUILD_FTS_SQL = """
+DELETE FROM terminals_fts;
+INSERT INTO terminals_fts (rowid, uid, name, city, country)
+    SELECT rowid, uid, fold(name), fold(city), fold(country) FROM terminals;
+DELETE FROM operators_fts;
+INSERT INTO operators_fts (rowid, uid, name)
+    SELECT rowid, uid, fold(name) FROM operators;
+"""
+
+# Summary tables for aggregate questions: table → grouping columns and their types
+STATS_TABLES = {
+    "stats_country_pairs": (("from_terminal_country", "TEXT"), ("to_terminal_country", "TEXT")),
+    "stats_city_pairs": (
+        ("from_terminal_city", "TEXT"),
+        ("to_terminal_city", "TEXT"),
+        ("from_terminal_country", "TEXT"),
+        ("to_terminal_country", "TEXT"),
+    ),
+    "stats_operators": (("operator_uid", "TEXT"), ("operator_name", "TEXT")),
+    "stats_weekdays": (("departure_iso_weekday", "INTEGER"), ("departure_day", "TEXT")),
+}
+
+# Column, type and aggregate over trains for every summary table. Trains without
+# a real schedule carry transit_hours = 0 and are left out of the transit figures.
+STATS_MEASURES = (
+    ("trains", "INTEGER", "COUNT(*)"),
+    ("operators", "INTEGER", "COUNT(DISTINCT operator_uid)"),
+    ("min_transit_hours", "REAL", "ROUND(MIN(NULLIF(transit_hours, 0)), 2)"),
+    ("avg_transit_hours", "REAL", "ROUND(AVG(NULLIF(transit_hours, 0)), 2)"),
+    ("max_transit_hours", "REAL", "ROUND(MAX(NULLIF(transit_hours, 0)), 2)"),
+    ("min_distance_km", "REAL", "ROUND(MIN(total_distance), 1)"),
+    ("avg_distance_km", "REAL", "ROUND(AVG(total_distance), 1)"),
+    ("max_distance_km", "REAL", "ROUND(MAX(total_distance), 1)"),
+    ("min_co2_reduction_percent", "REAL", "ROUND(MIN(train_vs_truck_co2e_reduction_percent), 2)"),
+    ("avg_co2_reduction_percent", "REAL", "ROUND(AVG(train_vs_truck_co2e_reduction_percent), 2)"),
+    ("max_co2_reduction_percent", "REAL", "ROUND(MAX(train_vs_truck_co2e_reduction_percent), 2)"),
+    (
+        "co2_saved_ton",
+        "REAL",
+        "ROUND(SUM(truck_emission_co2e_wtw_ton - train_emission_co2e_wtw_ton), 3)",
+    ),
+)
+
+# Trains columns a summary row depends on besides its grouping columns
+_STATS_SOURCES = (
+    "operator_uid", "transit_hours", "total_distance", "train_vs_truck_co2e_reduction_percent",
+    "truck_emission_co2e_wtw_ton", "train_emission_co2e_wtw_ton",
+)
+
+
+def _stats_measures(keys: list[str]) -> list[tuple[str, str, str]]:
+    # Counting distinct operators per operator is always 1
+    return [m for m in STATS_MEASURES if not (m[0] == "operators" and "operator_uid" in keys)]
+
+
+def _stats_refresh(table: str, keys: list[str], row: str) -> str:
+    """Statements recomputing the summary row of the group ``row`` (NEW or OLD) belongs to."""
+    match = " AND ".join(f"{k} IS {row}.{k}" for k in keys)
+    measures = ", ".join(expression for _, _, expression in _stats_measures(keys))
+    return (
+        f"DELETE FROM {table} WHERE {match};\n"
+        f"    INSERT INTO {table} SELECT {', '.join(keys)}, {measures} FROM trains "
+        f"WHERE {match} GROUP BY {', '.join(keys)};"
+    )
+
+
+def _build_stats_sql() -> tuple[str, str]:
+    drop_triggers = []
+    build = []
+    for table, key_types in STATS_TABLES.items():
+        keys = [k for k, _ in key_types]
+        columns = [f"{k} {t}" for k, t in key_types]
+        columns += [f"{name} {kind}" for name, kind, _ in _stats_measures(keys)]
+        measures = ", ".join(expression for _, _, expression in _stats_measures(keys))
+        column_sql = ",\n    ".join(columns)
+        watched = ", ".join(dict.fromkeys([*keys, *_STATS_SOURCES]))
+        drop_triggers += [f"DROP TRIGGER IF EXISTS {table}_{e};" for e in ("ins", "del", "upd")]
+        build.append(f"""
+DROP TABLE IF EXISTS {table};
+CREATE TABLE {table} (
+    {column_sql},
+    PRIMARY KEY ({", ".join(keys)})
+);
+INSERT INTO {table}
+    SELECT {", ".join(keys)}, {measures} FROM trains GROUP BY {", ".join(keys)};
+CREATE TRIGGER {table}_ins AFTER INSERT ON trains BEGIN
+    {_stats_refresh(table, keys, "NEW")}
+END;
+CREATE TRIGGER {table}_del AFTER DELETE ON trains BEGIN
+    {_stats_refresh(table, keys, "OLD")}
+END;
+CREATE TRIGGER {table}_upd AFTER UPDATE OF {watched} ON trains BEGIN
+    {_stats_refresh(table, keys, "OLD")}
+    {_stats_refresh(table, keys, "NEW")}
+END;""")
+    drop = "\n".join(drop_triggers) + "\n"
+    return drop, drop + "".join(build) + "\n"
+
+
+# DROP_STATS_TRIGGERS_SQL stops bulk loads from refreshing summaries row by row;
+# BUILD_STATS_SQL rebuilds the summary tables in one pass, then installs
+# triggers that keep them current by recomputing only the groups a later
+# insert, update or delete touches (an index lookup on trains per group).
+DROP_STATS_TRIGGERS_SQL, BUILD_STATS_SQL = _build_stats_sql()
+
+
+def fold(val: str | None) -> str | None:
+    """Lowercase and strip accents, matching app.rag.utils.fold_accents."""
+    if val is None:
+        return None
+    decomposed = unicodedata.normalize("NFKD", val)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
 
 def parse_bool(val: str) -> int:
     return 1 if val.strip().lower() == "true" else 0
@@ -102,10 +232,12 @@ def seed():
     conn = sqlite3.connect(DB_PATH)
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA foreign_keys=ON")
+    conn.create_function("fold", 1, fold, deterministic=True)
 
     try:
         conn.executescript(CREATE_TABLES_SQL)
         print("Tables created.")
+        conn.executescript(DROP_STATS_TRIGGERS_SQL)
 
         # Clear existing data
         conn.execute("DELETE FROM trains")
@@ -131,7 +263,8 @@ def seed():
             "VALUES (?, ?, ?, ?, ?, ?)",
             terminals,
         )
-        print(f"Inserted {len(terminals)} terminals.")
+        inserted = conn.execute("SELECT COUNT(*) FROM terminals").fetchone()[0]
+        print(f"Inserted {inserted} terminals from {len(terminals)} CSV rows.")
 
         # Seed operators
         with open(DATA_DIR / "operators.csv") as f:
@@ -141,7 +274,8 @@ def seed():
             "INSERT OR IGNORE INTO operators (uid, name) VALUES (?, ?)",
             operators,
         )
-        print(f"Inserted {len(operators)} operators.")
+        inserted = conn.execute("SELECT COUNT(*) FROM operators").fetchone()[0]
+        print(f"Inserted {inserted} operators from {len(operators)} CSV rows.")
 
         # Seed trains
         with open(DATA_DIR / "trains.csv") as f:
@@ -216,7 +350,19 @@ def seed():
             )""",
             trains,
         )
-        print(f"Inserted {len(trains)} trains.")
+        inserted = conn.execute("SELECT COUNT(*) FROM trains").fetchone()[0]
+        print(f"Inserted {inserted} trains from {len(trains)} CSV rows.")
+
+        conn.executescript(BUILD_FTS_SQL)
+        print("Built full-text indexes.")
+
+        conn.executescript(BUILD_STATS_SQL)
+        print("Built summary tables.")
+
+        # Bump the data version so running servers drop cached responses
+        version = conn.execute("PRAGMA user_version").fetchone()[0] + 1
+        conn.execute(f"PRAGMA user_version = {version}")
+        print(f"Data version {version}.")
 
         conn.commit()
 
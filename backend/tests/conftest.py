@@ -0,0 +1,72 @@
+"""Shared fixtures: a small database built with the seed schema."""
+
+import sqlite3
+
+import pytest
+
+from app import db
+from app.config import settings
+from data.seed import BUILD_FTS_SQL, BUILD_STATS_SQL, CREATE_TABLES_SQL, fold
+
+TERMINALS = [
+    ("t-rtm", "Rotterdam RSC", "Rotterdam", 4.38, 51.88, "Netherlands"),
+    ("t-mil", "Milano Smistamento", "Milano", 9.20, 45.50, "Italy"),
+    ("t-kln", "Köln-Eifeltor", "Köln", 6.92, 50.91, "Germany"),
+    ("t-bsl", "Basel Wolf", "Basel", 7.60, 47.54, "Switzerland"),
+]
+
+OPERATORS = [("o-hup", "Hupac Intermodal SA"), ("o-nav", "Naviland Cargo SA")]
+
+# uid, from, to, operator, departure weekday/time, arrival weekday/time, hours, km, co2 %
+TRAINS = [
+    ("r1", "t-rtm", "t-mil", "o-hup", 1, "08:00", 2, "14:00", 30.0, 1100.0, 80.0),
+    ("r2", "t-rtm", "t-kln", "o-nav", 1, "06:00", 1, "14:00", 8.0, 250.0, 70.0),
+    ("r3", "t-kln", "t-bsl", "o-hup", 1, "18:00", 2, "06:00", 12.0, 480.0, 75.0),
+    ("r4", "t-bsl", "t-mil", "o-hup", 2, "09:00", 2, "17:00", 8.0, 330.0, 85.0),
+]
+
+
+def build_test_db(path) -> None:
+    """Create a database at ``path`` with the seed schema and the sample rows above."""
+    cities = {t[0]: (t[1], t[2], t[5]) for t in TERMINALS}
+    operators = dict(OPERATORS)
+    days = ["", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+    conn = sqlite3.connect(path)
+    conn.create_function("fold", 1, fold, deterministic=True)
+    conn.executescript(CREATE_TABLES_SQL)
+    conn.executemany("INSERT INTO terminals VALUES (?, ?, ?, ?, ?, ?)", TERMINALS)
+    conn.executemany("INSERT INTO operators VALUES (?, ?)", OPERATORS)
+    for uid, src, dst, op, dep_wd, dep_t, arr_wd, arr_t, hours, km, co2 in TRAINS:
+        conn.execute(
+            "INSERT INTO trains (uid, capacities_left, departure_iso_weekday, departure_time, "
+            "departure_day, arrival_iso_weekday, arrival_time, arrival_day, transit_hours, "
+            "total_distance, train_emission_co2e_wtw_ton, truck_emission_co2e_wtw_ton, "
+            "train_vs_truck_co2e_reduction_percent, from_terminal_uid, to_terminal_uid, "
+            "from_terminal_name, from_terminal_city, from_terminal_country, to_terminal_name, "
+            "to_terminal_city, to_terminal_country, distance, transit_time_hours, "
+            "sequence_number, operator_uid, operator_name, container40) "
+            "VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, "
+            "1, ?, ?, 1)",
+            (
+                uid, dep_wd, dep_t, days[dep_wd], arr_wd, arr_t, days[arr_wd], hours, km,
+                km * 0.0001, km * 0.0001 / (1 - co2 / 100), co2, src, dst, *cities[src],
+                *cities[dst], km, hours, op, operators[op],
+            ),
+        )
+    conn.executescript(BUILD_FTS_SQL)
+    conn.executescript(BUILD_STATS_SQL)
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+async def seeded_db(tmp_path, monkeypatch):
+    """Initialize the connection pool against a freshly built sample database."""
+    path = tmp_path / "fr8tools.db"
+    build_test_db(path)
+    monkeypatch.setattr(settings, "database_path", str(path))
+    pool = await db.init_db()
+    yield pool
+    await db.close_db()
@@ -3,9 +3,9 @@
 import pytest
 from httpx import ASGITransport, AsyncClient
 
-from app.auth import _request_log
 from app.config import settings
 from app.main import app
+from app.ratelimit import close_rate_limiter
 
 
 @pytest.fixture
@@ -15,10 +15,10 @@ def anyio_backend():
 
 @pytest.fixture(autouse=True)
 def _clean_rate_limiter():
-    """Clear the in-memory rate limiter between tests."""
-    _request_log.clear()
+    """Start each test with a fresh rate limiter."""
+    close_rate_limiter()
     yield
-    _request_log.clear()
+    close_rate_limiter()
 
 
 @pytest.fixture
@@ -101,3 +101,13 @@ async def test_rate_limit(monkeypatch):
         )
     assert response.status_code == 429
     monkeypatch.setattr(settings, "rate_limit_rpm", 20)
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("_enable_auth")
+async def test_stats_and_metrics_need_the_key_but_health_does_not():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        assert (await client.get("/health")).status_code == 200
+        assert (await client.get("/health/stats")).status_code == 401
+        assert (await client.get("/metrics")).status_code == 401
@@ -0,0 +1,70 @@
+"""Tests for the offline benchmark harness."""
+
+import pytest
+
+from app import planner, sql_guard
+from app.geo import terminals, tiles
+from app.rag import retriever
+from bench.compare import compare
+from bench.run import run_benchmark
+from tests.conftest import build_test_db
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def _restore_app_state(monkeypatch):
+    """The benchmark starts the whole app; put back what its startup loads."""
+    for module, name in [
+        (retriever, "_retriever"),
+        (sql_guard, "_guard"),
+        (planner, "_planner"),
+        (terminals, "_registry"),
+        (tiles, "_tiles"),
+    ]:
+        monkeypatch.setattr(module, name, getattr(module, name))
+
+
+SCENARIOS = [
+    {
+        "question": "How many trains does each operator run?",
+        "sql": "SELECT operator_name, COUNT(*) AS trains FROM trains GROUP BY operator_name",
+        "markdown": "Hupac runs the most trains.",
+    },
+    {
+        "question": "On which weekday do most trains depart?",
+        "sql": "SELECT departure_dya, COUNT(*) AS trains FROM trains GROUP BY departure_dya",
+        "fixed_sql": "SELECT departure_day, COUNT(*) AS trains FROM trains GROUP BY departure_day",
+    },
+    {"question": "Trains from Rotterdam to Milano", "markdown": "One direct train."},
+]
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("_restore_app_state")
+async def test_benchmark_runs_offline_against_the_fake_llm(tmp_path):
+    path = tmp_path / "fr8tools.db"
+    build_test_db(path)
+
+    results = await run_benchmark(str(path), SCENARIOS, clients=2, requests=6, rounds=1)
+
+    assert results["workflow"]["failed"] == 0
+    assert {"route_intent", "generate_sql", "fix_sql", "execute_sql"} <= set(
+        results["workflow"]["nodes"]
+    )
+    assert results["chat"]["requests"] == 6
+    assert results["chat"]["errors"] == 0
+    assert results["db"]["queries"]["count"] > 0
+    assert results["llm"]["unmatched"] == 0
+    assert results["llm"]["calls"]["fix_sql:gpt-4o"] >= 1
+
+
+def test_compare_flags_slower_and_lower_throughput():
+    baseline = {"chat": {"end_to_end": {"p95_ms": 100.0}, "requests_per_second": 10.0}}
+    current = {"chat": {"end_to_end": {"p95_ms": 140.0}, "requests_per_second": 9.0}}
+    rows = {row["metric"]: row for row in compare(baseline, current, tolerance=0.25)}
+    assert rows["chat.end_to_end.p95_ms"]["regression"]
+    assert not rows["chat.requests_per_second"]["regression"]
@@ -0,0 +1,92 @@
+"""Tests for the chat response cache and question normalization."""
+
+from app.cache import ResponseCache, ResultCache, estimate_bytes
+from app.rag.utils import normalize_question
+
+
+def test_normalize_question_aliases_and_filler():
+    a = normalize_question("Show me trains from Rotterdam to Milan!")
+    b = normalize_question("trains  from ROTTERDAM to Milano")
+    assert a == b == "trains from rotterdam to milano"
+
+
+def test_normalize_question_folds_accents():
+    assert normalize_question("Terminals in München") == normalize_question("terminals in munich")
+
+
+def test_normalize_question_keeps_spellings_the_data_uses():
+    # Both names exist in the terminals data and select different trains
+    assert normalize_question("trains from Antwerp") != normalize_question("trains from Antwerpen")
+    assert normalize_question("trains from Anvers") == normalize_question("trains from Antwerp")
+
+
+def test_normalize_question_keeps_decimals():
+    assert normalize_question("Trains under 3.5 hours.") == "trains under 3.5 hours"
+    assert normalize_question("under 3.5 hours") != normalize_question("under 3 5 hours")
+
+
+def test_cache_lru_eviction():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", 1, {"markdown": "a"})
+    cache.put("b", 1, {"markdown": "b"})
+    cache.get("a", 1)
+    cache.put("c", 1, {"markdown": "c"})
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) == {"markdown": "a"}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_ttl_expiry():
+    cache = ResponseCache(max_entries=4, ttl_seconds=0)
+    cache.put("a", 1, {"markdown": "a"})
+    assert cache.get("a", 1) is None
+
+
+def test_cache_invalidated_by_data_version():
+    cache = ResponseCache(max_entries=4, ttl_seconds=60)
+    cache.put("a", 1, {"markdown": "a"})
+    assert cache.get("a", 2) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_cache_persists_to_sqlite(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(max_entries=4, ttl_seconds=60, path=path)
+    cache.put("a", 1, {"markdown": "a", "chart": None})
+    cache.close()
+
+    reopened = ResponseCache(max_entries=4, ttl_seconds=60, path=path)
+    assert reopened.get("a", 1) == {"markdown": "a", "chart": None}
+
+
+def test_result_cache_keys_on_canonical_sql():
+    a = ResultCache.key("select city  FROM Terminals -- busiest\n WHERE uid = ?;", ["a"])
+    b = ResultCache.key("SELECT city FROM terminals WHERE uid = ?", ("a",))
+    assert a == b
+    assert ResultCache.key("SELECT 'Basel'") != ResultCache.key("SELECT 'basel'")
+
+
+def test_result_cache_byte_budget_and_lru():
+    rows = [{"city": "Basel", "uid": "t-bsl"}]
+    size = estimate_bytes(rows)
+    cache = ResultCache(max_bytes=size * 16 * 2)
+    cache.max_entry_bytes = size * 2
+    for i in range(33):
+        cache.put(("q", (i,)), 1, rows)
+    assert cache.get(("q", (0,)), 1) is None
+    assert cache.get(("q", (32,)), 1) == rows
+    assert cache.stats()["bytes"] <= cache.max_bytes
+    assert cache.stats()["evictions"] == 1
+
+    cache.put(("big", ()), 1, rows * 3)
+    assert cache.stats()["too_large"] == 1
+
+
+def test_result_cache_returns_copies_and_drops_stale_versions():
+    cache = ResultCache(max_bytes=1 << 20)
+    cache.put(("q", ()), 1, [{"city": "Basel"}])
+    cache.get(("q", ()), 1)[0]["city"] = "changed"
+    assert cache.get(("q", ()), 1) == [{"city": "Basel"}]
+    assert cache.get(("q", ()), 2) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["invalidations"] == 1
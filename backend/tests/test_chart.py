@@ -0,0 +1,66 @@
+"""Tests for the rule-based chart builder."""
+
+from app.agents.chart_agent import build_chart
+
+
+def test_bar_chart_for_operator_measure():
+    results = [
+        {"operator_name": "Hupac", "avg_co2_reduction": 81.2345},
+        {"operator_name": "Naviland Cargo SA", "avg_co2_reduction": 77.5},
+        {"operator_name": "Kombiverkehr", "avg_co2_reduction": 79.0},
+    ]
+    chart = build_chart("Which operator saves the most CO2?", results)
+    assert chart["chart_type"] == "bar"
+    assert chart["x_key"] == "operator_name"
+    assert chart["y_key"] == "avg_co2_reduction"
+    assert chart["data"][0] == {"operator_name": "Hupac", "avg_co2_reduction": 81.23}
+
+
+def test_measure_hints_match_whole_words():
+    results = [
+        {"operator_name": "Hupac", "countries": 6, "terminals": 41, "avg_transit_hours": 20.5},
+        {"operator_name": "Kombiverkehr", "countries": 9, "terminals": 58, "avg_transit_hours": 18},
+    ]
+    # "countries" is not a count column, and "times" doesn't ask for transit time
+    chart = build_chart("How many terminals does each operator reach?", results)
+    assert chart["y_key"] == "terminals"
+    chart = build_chart("How many times is each operator listed with terminals?", results)
+    assert chart["y_key"] == "terminals"
+    chart = build_chart("Which operator is fastest?", results)
+    assert chart["y_key"] == "avg_transit_hours"
+
+
+def test_weekday_ordering():
+    results = [
+        {"departure_day": "Friday", "trains": 40},
+        {"departure_day": "Monday", "trains": 55},
+        {"departure_day": "Wednesday", "trains": 61},
+    ]
+    chart = build_chart("How many trains depart per weekday?", results)
+    assert chart["chart_type"] == "line"
+    assert [d["departure_day"] for d in chart["data"]] == ["Monday", "Wednesday", "Friday"]
+
+
+def test_route_label_and_full_data():
+    results = [
+        {
+            "from_terminal_city": f"City {i}",
+            "to_terminal_city": "Milano",
+            "train_vs_truck_co2e_reduction_percent": 80.0 + i,
+            "latitude": 45.0,
+        }
+        for i in range(45)
+    ]
+    chart = build_chart("Greenest routes to Milan", results)
+    assert chart["x_key"] == "route"
+    assert chart["y_key"] == "train_vs_truck_co2e_reduction_percent"
+    assert len(chart["data"]) == 45
+
+
+def test_unsure_returns_none():
+    # Only ids and coordinates: nothing worth charting without the LLM
+    results = [
+        {"uid": "a", "city": "Basel", "latitude": 47.5, "longitude": 7.6},
+        {"uid": "b", "city": "Köln", "latitude": 50.9, "longitude": 6.9},
+    ]
+    assert build_chart("terminals in Basel and Köln", results) is None
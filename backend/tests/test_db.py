@@ -0,0 +1,133 @@
+"""Tests for the read-only connection pool and query budgets."""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from app import cache, db
+from app.config import settings
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def pool(tmp_path, monkeypatch):
+    # Characters that mean something in a file: URI must still name the file
+    path = tmp_path / "data #1?" / "test.db"
+    path.parent.mkdir()
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE terminals (uid TEXT PRIMARY KEY, city TEXT)")
+    conn.executemany("INSERT INTO terminals VALUES (?, ?)", [("a", "Basel"), ("b", "Köln")])
+    conn.execute("PRAGMA user_version = 3")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(settings, "database_path", str(path))
+    monkeypatch.setattr(settings, "db_pool_size", 2)
+    pool = await db.init_db()
+    yield pool
+    await db.close_db()
+
+
+@pytest.mark.anyio
+async def test_pool_runs_queries_concurrently(pool):
+    results = await asyncio.gather(
+        *(db.execute_parameterized("SELECT city FROM terminals WHERE uid = ?", (u,)) for u in "ab")
+    )
+    assert results == [[{"city": "Basel"}], [{"city": "Köln"}]]
+    assert await db.get_data_version() == 3
+    stats = pool.stats()
+    assert stats["acquisitions"] == 3
+    assert stats["in_use"] == 0
+
+
+@pytest.mark.anyio
+async def test_pool_is_read_only(pool):
+    with pytest.raises(sqlite3.OperationalError):
+        await db.execute_query("DELETE FROM terminals")
+
+
+@pytest.mark.anyio
+async def test_pool_waits_when_exhausted(pool):
+    async def hold():
+        async with pool.acquire():
+            await asyncio.sleep(0.02)
+
+    await asyncio.gather(hold(), hold(), hold())
+    assert pool.stats()["waits"] == 1
+
+
+# Recursive CTE that never finishes on its own
+_RUNAWAY_SQL = (
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n"
+)
+
+
+@pytest.mark.anyio
+async def test_budget_step_limit(pool):
+    budget = db.QueryBudget(timeout_seconds=60, max_steps=100_000, max_rows=10)
+    with pytest.raises(db.QueryBudgetError) as exc:
+        await db.execute_query(_RUNAWAY_SQL, budget)
+    assert exc.value.limit == "steps"
+    assert "WHERE filters" in str(exc.value)
+
+
+@pytest.mark.anyio
+async def test_budget_timeout(pool):
+    budget = db.QueryBudget(timeout_seconds=0.05, max_steps=10**12, max_rows=10)
+    with pytest.raises(db.QueryBudgetError) as exc:
+        await db.execute_query(_RUNAWAY_SQL, budget)
+    assert exc.value.limit == "timeout"
+
+
+@pytest.mark.anyio
+async def test_budget_row_limit(pool):
+    budget = db.QueryBudget(timeout_seconds=5, max_steps=10**9, max_rows=500)
+    sql = (
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n LIMIT 2000) "
+        "SELECT i FROM n"
+    )
+    with pytest.raises(db.QueryBudgetError) as exc:
+        await db.execute_query(sql, budget)
+    assert exc.value.limit == "rows"
+    # The connection is reusable after an interrupted query
+    assert await db.execute_query("SELECT count(*) AS n FROM terminals") == [{"n": 2}]
+
+
+@pytest.mark.anyio
+async def test_results_are_cached_until_the_data_version_changes(pool, monkeypatch):
+    results = cache.ResultCache(max_bytes=1 << 20)
+    monkeypatch.setattr(cache, "_results", results)
+    # Notice the version bump below immediately rather than within a second
+    monkeypatch.setattr(settings, "data_version_check_seconds", 0.0)
+    sql = "SELECT city FROM terminals WHERE uid = ?"
+    await db.execute_parameterized(sql, ("a",))
+    assert await db.execute_parameterized(f"{sql};", ("a",)) == [{"city": "Basel"}]
+    assert results.stats()["hits"] == 1
+
+    conn = sqlite3.connect(settings.database_path)
+    conn.execute("UPDATE terminals SET city = 'Bâle' WHERE uid = 'a'")
+    conn.execute("PRAGMA user_version = 4")
+    conn.commit()
+    conn.close()
+    assert await db.execute_parameterized(sql, ("a",)) == [{"city": "Bâle"}]
+    assert results.stats()["invalidations"] == 1
+
+
+@pytest.mark.anyio
+async def test_cache_hits_skip_the_pool_and_respect_the_callers_row_budget(pool, monkeypatch):
+    monkeypatch.setattr(cache, "_results", cache.ResultCache(max_bytes=1 << 20))
+    sql = "SELECT city FROM terminals ORDER BY city"
+    large = db.QueryBudget(timeout_seconds=5.0, max_steps=10**6, max_rows=10)
+    small = db.QueryBudget(timeout_seconds=5.0, max_steps=10**6, max_rows=1)
+    assert len(await db.execute_parameterized(sql, budget=large)) == 2
+
+    acquisitions = pool.stats()["acquisitions"]
+    assert len(await db.execute_parameterized(sql, budget=large)) == 2
+    assert pool.stats()["acquisitions"] == acquisitions
+    with pytest.raises(db.QueryBudgetError, match="more than 1 rows"):
+        await db.execute_parameterized(sql, budget=small)
@@ -0,0 +1,119 @@
+"""Tests for the few-shot example store."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from app.rag.examples import SEED_EXAMPLES, ExampleStore, render_examples
+
+BUSY_SQL = "SELECT from_terminal_city, COUNT(*) FROM trains GROUP BY 1 ORDER BY 2 DESC"
+
+
+def test_similar_verified_example_is_retrieved_first():
+    store = ExampleStore(max_entries=10)
+    store.add("Which cities have the most departures?", BUSY_SQL)
+    store.add("Average transit hours per operator", "SELECT operator_name, AVG(transit_hours)")
+
+    chosen = store.examples_for("which city has the most departures", k=3)
+    assert chosen[0].sql == BUSY_SQL
+    assert len(chosen) == 3
+    assert store.stats()["hit_rate"] == 1.0
+
+
+def test_seed_examples_fill_in_without_a_match():
+    store = ExampleStore(max_entries=10)
+    chosen = store.examples_for("something entirely unrelated", k=3)
+    assert [e.question for e in chosen] == [q for q, _ in SEED_EXAMPLES[:3]]
+    assert store.stats()["hits"] == 0
+
+
+def test_pending_pairs_are_promoted_or_rejected_by_the_next_message():
+    store = ExampleStore(max_entries=10)
+    store.record_pending("t1", "Which cities have the most departures?", BUSY_SQL)
+    store.observe_question("t1", "And which operators run the most trains?")
+    assert len(store) == 1
+
+    store.record_pending("t2", "Trains from Basel to Köln on Monday", "SELECT 1")
+    store.observe_question("t2", "trains from Basel to Köln on Monday please")
+    store.record_pending("t3", "Terminals in Poland", "SELECT 2")
+    store.observe_question("t3", "That's wrong, I meant Portugal")
+    assert len(store) == 1
+    assert store.stats()["rejected"] == 2
+
+
+def test_without_a_thread_the_previous_message_finds_the_pending_pair():
+    store = ExampleStore(max_entries=10)
+    store.record_pending(None, "Which cities have the most departures?", BUSY_SQL)
+    store.observe_question(None, "And which operators run the most trains?")
+    assert store.stats()["pending"] == 1
+
+    store.observe_question(
+        None,
+        "That's wrong, count arrivals too",
+        previous="Which cities have the most departures?",
+    )
+    assert store.stats()["pending"] == 0
+    assert store.stats()["rejected"] == 1
+
+    store.record_pending(None, "Which cities have the most departures?", BUSY_SQL)
+    store.observe_question(
+        None,
+        "And which operators run the most trains?",
+        previous="which cities have the most departures",
+    )
+    assert len(store) == 1
+
+
+def test_unanswered_pairs_expire_without_being_promoted():
+    store = ExampleStore(max_entries=10, verify_after_seconds=60)
+    store.record_pending(None, "Which cities have the most departures?", BUSY_SQL)
+    store.expire_pending()
+    assert store.stats()["pending"] == 1
+    store.expire_pending(now=float("inf"))
+    assert store.stats()["pending"] == 0
+    assert len(store) == 0
+
+
+def test_bounded_with_lru_eviction_and_pinned_seeds():
+    store = ExampleStore(max_entries=2)
+    store.add("first question about trains", "SELECT 1")
+    store.add("second question about terminals", "SELECT 2")
+    store.examples_for("first question about trains", k=1)
+    store.add("third question about operators", "SELECT 3")
+
+    assert len(store) == 2
+    assert store.stats()["evictions"] == 1
+    remaining = {e.sql for e, _ in store.search("question about", k=10)}
+    assert {"SELECT 1", "SELECT 3"} <= remaining
+    assert "SELECT 2" not in remaining
+
+
+def test_persisted_examples_survive_a_restart(tmp_path):
+    path = str(tmp_path / "examples.db")
+    store = ExampleStore(max_entries=10, path=path)
+    store.add("Which cities have the most departures?", BUSY_SQL)
+    store.close()
+
+    reopened = ExampleStore(max_entries=10, path=path)
+    assert reopened.search("most departures", k=1)[0][0].sql == BUSY_SQL
+    reopened.close()
+
+
+def test_promotions_from_worker_threads_are_all_kept(tmp_path):
+    path = str(tmp_path / "examples.db")
+    store = ExampleStore(max_entries=100, path=path)
+    for i in range(40):
+        store.record_pending(f"t{i}", f"Trains operated by operator {i}", f"SELECT {i}")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for i in range(40):
+            pool.submit(store.observe_question, f"t{i}", "Thanks, now show terminals in Italy")
+            pool.submit(store.examples_for, "trains operated by operator", 3)
+    store.close()
+
+    assert store.stats()["promoted"] == 40
+    reopened = ExampleStore(max_entries=100, path=path)
+    assert len(reopened) == 40
+    reopened.close()
+
+
+def test_render_examples():
+    assert render_examples([("Q?", "SELECT 1")]) == 'User: "Q?"\nSQL: SELECT 1'
@@ -0,0 +1,114 @@
+"""Tests for the streaming bulk export endpoints."""
+
+import csv
+import gzip
+import io
+import json
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.export import _Drain, gzip_stream
+from app.main import app
+from app.routes import export
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def _fresh_slots(monkeypatch):
+    monkeypatch.setattr(export, "_exports", None)
+
+
+async def _get(path: str, **headers):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path, headers=headers)
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_ndjson_streams_every_train():
+    response = await _get("/api/export/routes")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert 'filename="trains.ndjson"' in response.headers["content-disposition"]
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["uid"] for r in rows] == ["r1", "r2", "r3", "r4"]
+    assert rows[0]["from_terminal_city"] == "Rotterdam"
+    assert "text" not in rows[0]
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_csv_applies_the_route_filters():
+    response = await _get("/api/export/routes?format=csv&from_city=rotterdam")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [r["uid"] for r in rows] == ["r1", "r2"]
+    assert {r["to_terminal_city"] for r in rows} == {"Milano", "Köln"}
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_text_exports_are_gzipped_when_accepted():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        async with client.stream(
+            "GET", "/api/export/terminals?format=csv", headers={"Accept-Encoding": "gzip"}
+        ) as response:
+            raw = b"".join([chunk async for chunk in response.aiter_raw()])
+    assert response.headers["content-encoding"] == "gzip"
+    lines = gzip.decompress(raw).decode().splitlines()
+    assert lines[0].startswith("uid,name,city")
+    assert len(lines) == 5
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_parquet_and_arrow_round_trip():
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    parquet = await _get("/api/export/routes?format=parquet&operator=hupac")
+    assert "content-encoding" not in parquet.headers
+    table = pq.read_table(io.BytesIO(parquet.content))
+    assert table.column("uid").to_pylist() == ["r1", "r3", "r4"]
+    assert table.schema.field("total_distance").type == pa.float64()
+    assert table.schema.field("sequence_number").type == pa.int64()
+
+    arrow = await _get("/api/export/terminals?format=arrow&country=italy")
+    table = pa.ipc.open_stream(arrow.content).read_all()
+    assert table.column("name").to_pylist() == ["Milano Smistamento"]
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_busy_exporter_refuses_with_retry_after():
+    slots = export._export_slots()
+    for _ in range(slots._value):
+        await slots.acquire()
+    response = await _get("/api/export/routes")
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "5"
+
+
+@pytest.mark.anyio
+async def test_gzip_stream_is_incremental():
+    async def blocks():
+        for i in range(3):
+            yield f"line {i}\n".encode() * 100
+
+    compressed = b"".join([part async for part in gzip_stream(blocks())])
+    assert gzip.decompress(compressed).count(b"\n") == 300
+
+
+def test_drain_returns_only_new_bytes():
+    sink = _Drain()
+    sink.write(b"abc")
+    assert sink.drain() == b"abc"
+    sink.write(b"de")
+    assert sink.tell() == 5
+    assert sink.drain() == b"de"
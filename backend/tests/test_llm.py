@@ -0,0 +1,151 @@
+"""Tests for the shared LLM client against a mock OpenAI-compatible server."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from langchain_core.output_parsers import StrOutputParser
+
+from app.agents import llm
+from app.agents.llm import ResilientTransport, chat_model
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _completion(content: str) -> dict:
+    return {
+        "id": "chatcmpl-1",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+    }
+
+
+def _stream(tokens: list[str]) -> bytes:
+    lines = []
+    for token in tokens:
+        chunk = {
+            "id": "chatcmpl-1",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-4o",
+            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+        }
+        lines.append(f"data: {json.dumps(chunk)}\n\n")
+    lines.append("data: [DONE]\n\n")
+    return "".join(lines).encode()
+
+
+def _chain(transport: ResilientTransport):
+    client = httpx.AsyncClient(transport=transport)
+    return chat_model(http_client=client) | StrOutputParser()
+
+
+@pytest.mark.anyio
+async def test_retries_transient_errors_with_backoff():
+    calls = []
+
+    async def server(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if len(calls) < 3:
+            return httpx.Response(503, json={"error": {"message": "overloaded"}})
+        return httpx.Response(200, json=_completion("SELECT 1"))
+
+    transport = ResilientTransport(httpx.MockTransport(server), retry_base_seconds=0.001)
+    assert await _chain(transport).ainvoke("q") == "SELECT 1"
+    assert calls == ["/v1/chat/completions"] * 3
+    assert transport.stats()["retries"] == 2
+
+
+@pytest.mark.anyio
+async def test_gives_up_at_the_deadline():
+    async def server(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(1)
+        return httpx.Response(200, json=_completion("late"))
+
+    transport = ResilientTransport(httpx.MockTransport(server), deadline_seconds=0.05)
+    with pytest.raises(Exception, match="timed out"):
+        await _chain(transport).ainvoke("q")
+    assert transport.stats()["failures"] == 1
+
+
+@pytest.mark.anyio
+async def test_hedged_request_wins_when_the_first_is_slow():
+    calls = []
+
+    async def server(request: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(1)
+        return httpx.Response(200, json=_completion("fast"))
+
+    transport = ResilientTransport(httpx.MockTransport(server), hedge=True, hedge_min_samples=3)
+    transport.latencies.extend([0.01, 0.01, 0.02])
+    assert await _chain(transport).ainvoke("q") == "fast"
+    stats = transport.stats()
+    assert stats["hedges"] == stats["hedge_wins"] == 1
+
+
+@pytest.mark.anyio
+async def test_streams_tokens_through_the_transport():
+    async def server(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(
+            200,
+            content=_stream(["Two ", "terminals"]),
+            headers={"content-type": "text/event-stream"},
+        )
+
+    transport = ResilientTransport(httpx.MockTransport(server))
+    tokens = [token async for token in _chain(transport).astream("q")]
+    assert "".join(tokens) == "Two terminals"
+    assert transport.stats()["requests"] == 1
+
+
+@pytest.mark.anyio
+async def test_usage_is_accounted_per_tier(monkeypatch):
+    async def server(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["model"] == "gpt-4o-mini"
+        return httpx.Response(200, json=_completion("SELECT 1"))
+
+    monkeypatch.setattr(llm, "_usage", {})
+    client = httpx.AsyncClient(transport=ResilientTransport(httpx.MockTransport(server)))
+    chain = chat_model("small", http_client=client) | StrOutputParser()
+    await chain.ainvoke("q")
+    await chain.ainvoke("q")
+
+    small = llm.usage_stats()["small"]
+    assert small["calls"] == 2
+    assert (small["input_tokens"], small["output_tokens"]) == (10, 4)
+    assert small["cost_usd"] == pytest.approx((10 * 0.15 + 4 * 0.6) / 1e6)
+
+
+@pytest.mark.anyio
+async def test_models_outlive_a_closed_lifespan(monkeypatch):
+    async def server(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=_completion("SELECT 1"))
+
+    monkeypatch.setattr(llm, "_client", None)
+    monkeypatch.setattr(llm, "_transport", None)
+    chain = chat_model() | StrOutputParser()
+    llm.use_transport(httpx.MockTransport(server))
+    await llm.close_http_client()
+
+    # A new lifespan reuses the models built at import time
+    previous = llm.use_transport(httpx.MockTransport(server))
+    assert isinstance(previous, httpx.AsyncHTTPTransport)
+    assert await chain.ainvoke("q") == "SELECT 1"
+    assert not llm.get_http_client().is_closed
+    await llm.close_http_client()
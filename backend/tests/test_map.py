@@ -0,0 +1,43 @@
+"""Tests for the deterministic GeoJSON builder."""
+
+from app.agents.map_agent import build_geojson, has_geo_columns
+from app.geo.terminals import Terminal, TerminalRegistry
+
+REGISTRY = TerminalRegistry([
+    Terminal("t1", "Rotterdam RSC", "Rotterdam", "Netherlands", 51.88, 4.38),
+    Terminal("t2", "Milano Smistamento", "Milano", "Italy", 45.50, 9.20),
+    Terminal("t3", "München-Riem", "München", "Germany", 48.13, 11.69),
+])
+
+
+def test_routes_become_deduplicated_linestrings():
+    rows = [
+        {"from_terminal_uid": "t1", "to_terminal_uid": "t2", "operator_name": "Hupac"}
+        for _ in range(3000)
+    ]
+    geojson = build_geojson(rows, REGISTRY)
+    lines = [f for f in geojson["features"] if f["geometry"]["type"] == "LineString"]
+    points = [f for f in geojson["features"] if f["geometry"]["type"] == "Point"]
+    assert len(lines) == 1
+    assert lines[0]["properties"]["trains"] == 3000
+    assert lines[0]["geometry"]["coordinates"] == [[4.38, 51.88], [9.2, 45.5]]
+    assert len(points) == 2
+
+
+def test_city_join_uses_aliases():
+    rows = [{"from_terminal_city": "Munich", "to_terminal_city": "Milan", "distance": 500.0}]
+    geojson = build_geojson(rows, REGISTRY)
+    line = geojson["features"][0]
+    assert line["properties"]["name"] == "München → Milano"
+    assert line["properties"]["distance"] == 500.0
+
+
+def test_terminal_rows_become_points():
+    rows = [{"name": "Somewhere", "city": "Basel", "latitude": 47.56, "longitude": 7.59}]
+    geojson = build_geojson(rows, REGISTRY)
+    assert geojson["features"][0]["geometry"] == {"type": "Point", "coordinates": [7.59, 47.56]}
+
+
+def test_unlocatable_rows():
+    assert not has_geo_columns([{"operator_name": "Hupac", "trains": 4}])
+    assert build_geojson([{"city": "Atlantis"}], REGISTRY) is None
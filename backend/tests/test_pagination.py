@@ -0,0 +1,129 @@
+"""Tests for keyset pagination of the data endpoints."""
+
+import sqlite3
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.config import settings
+from app.main import app
+from app.queries import ROUTE_KEY, decode_cursor, encode_cursor, routes_query, terminals_query
+from tests.conftest import build_test_db
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+async def _get(path: str, **params):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path, params=params)
+
+
+async def _walk(path: str, **params) -> tuple[list[dict], list[int]]:
+    rows, totals = [], []
+    cursor = None
+    while True:
+        response = await _get(path, **params, **({"cursor": cursor} if cursor else {}))
+        assert response.status_code == 200
+        rows.extend(response.json())
+        totals.append(int(response.headers["x-total-count"]))
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return rows, totals
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    cursor = encode_cursor({"from_terminal_city": "Köln", "uid": "r3"}, ROUTE_KEY)
+    assert decode_cursor(cursor, ROUTE_KEY) == ["Köln", "r3"]
+    null_city = encode_cursor({"from_terminal_city": None, "uid": "r9"}, ROUTE_KEY)
+    assert decode_cursor(null_city, ROUTE_KEY) == [None, "r9"]
+    no_uid = encode_cursor({"from_terminal_city": "Köln", "uid": None}, ROUTE_KEY)
+    for bad in ("%%%", "bm90IGpzb24", encode_cursor({"city": "Köln"}, ("city",)), no_uid):
+        with pytest.raises(ValueError):
+            decode_cursor(bad, ROUTE_KEY)
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_routes_page_through_every_train_once():
+    rows, totals = await _walk("/api/routes", limit=1)
+    assert [r["uid"] for r in rows] == ["r4", "r3", "r1", "r2"]
+    assert totals == [4, 4, 4, 4]
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_terminal_pages_follow_the_city_order():
+    first = await _get("/api/terminals", limit=3)
+    assert [t["city"] for t in first.json()] == ["Basel", "Köln", "Milano"]
+    second = await _get("/api/terminals", limit=3, cursor=first.headers["x-next-cursor"])
+    assert [t["city"] for t in second.json()] == ["Rotterdam"]
+    assert "x-next-cursor" not in second.headers
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_route_filters_apply_to_pages_and_total():
+    rows, totals = await _walk(
+        "/api/routes", limit=1, to_country="italy", operator="hupac", cargo="container40"
+    )
+    assert [r["uid"] for r in rows] == ["r4", "r1"]
+    assert totals == [2, 2]
+
+    response = await _get("/api/routes", cargo="hazardous_goods")
+    assert response.json() == []
+    assert response.headers["x-total-count"] == "0"
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_bad_cursor_or_cargo_is_rejected():
+    assert (await _get("/api/routes", cursor="nope")).status_code == 422
+    assert (await _get("/api/routes", cargo="pianos")).status_code == 422
+
+
+def test_pages_after_a_cursor_are_index_range_scans(tmp_path):
+    path = tmp_path / "plan.db"
+    build_test_db(path)
+    conn = sqlite3.connect(path)
+    for sql, params in (
+        routes_query(limit=51, after=["Köln", "r3"]),
+        terminals_query(limit=101, after=["Basel", "t-bsl"]),
+    ):
+        (plan,) = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        assert "SEARCH" in plan[3] and "_uid ((" in plan[3]
+    conn.close()
+
+
+def test_filtered_pages_walk_the_key_index_without_sorting(tmp_path):
+    path = tmp_path / "plan.db"
+    build_test_db(path)
+    conn = sqlite3.connect(path)
+    for sql, params in (
+        routes_query(limit=51, from_city="rotterdam", paged=True),
+        routes_query(limit=51, to_city="milano", operator="hupac", after=["Köln", "r3"]),
+        terminals_query(country="germany", limit=101, paged=True),
+    ):
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        assert "_city_uid" in plan[0], plan
+        assert not any("TEMP B-TREE" in step for step in plan), plan
+    conn.close()
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_trains_without_an_origin_city_are_paged_too():
+    conn = sqlite3.connect(settings.database_path)
+    conn.execute(
+        "INSERT INTO trains (uid, from_terminal_uid, to_terminal_uid, operator_uid) "
+        "VALUES ('r0', 't-rtm', 't-mil', 'o-hup'), ('r00', 't-rtm', 't-mil', 'o-hup')"
+    )
+    conn.execute("PRAGMA user_version = 2")
+    conn.commit()
+    conn.close()
+    rows, totals = await _walk("/api/routes", limit=1)
+    assert [r["uid"] for r in rows] == ["r0", "r00", "r4", "r3", "r1", "r2"]
+    assert set(totals) == {6}
@@ -0,0 +1,171 @@
+"""Tests for the in-memory route planner and its workflow hook."""
+
+import sqlite3
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.config import settings
+from app.geo.terminals import Terminal, TerminalRegistry, load_terminal_registry
+from app.main import app
+from app.planner import (
+    Connection,
+    RoutePlanner,
+    Transfer,
+    itinerary_rows,
+    load_planner,
+    parse_minute_of_week,
+    resolve_timetable_city,
+)
+from app.workflow import graph, router
+
+MONDAY_MIDNIGHT = parse_minute_of_week(1, "00:00")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def planner(seeded_db):
+    await load_terminal_registry()
+    return await load_planner()
+
+
+def _trains(itinerary) -> list[str]:
+    return [leg["train_uid"] for leg in itinerary.legs if leg["type"] == "train"]
+
+
+@pytest.mark.anyio
+async def test_fastest_route_is_direct(planner):
+    itinerary = planner.plan_cities("Rotterdam", "Milano", MONDAY_MIDNIGHT, "time")
+    assert _trains(itinerary) == ["r1"]
+    result = itinerary.to_dict()
+    assert result["departure"] == {"day": "Monday", "time": "08:00", "week_offset": 0}
+    assert result["arrival"]["day"] == "Tuesday"
+    assert result["arrival"]["time"] == "14:00"
+
+
+@pytest.mark.anyio
+async def test_lowest_co2_route_changes_trains(planner):
+    itinerary = planner.plan_cities("Rotterdam", "Milano", MONDAY_MIDNIGHT, "co2")
+    assert _trains(itinerary) == ["r2", "r3", "r4"]
+    assert itinerary.to_dict()["transfers"] == 2
+    assert [row["to_terminal_city"] for row in itinerary_rows(itinerary)] == [
+        "Köln", "Basel", "Milano",
+    ]
+
+
+@pytest.mark.anyio
+async def test_max_legs_and_aliases(planner):
+    assert planner.plan_cities("Rotterdam", "Basel", MONDAY_MIDNIGHT, "time", max_legs=1) is None
+    itinerary = planner.plan_cities("Rotterdam", "Milan", MONDAY_MIDNIGHT, "legs")
+    assert _trains(itinerary) == ["r1"]
+
+
+@pytest.mark.anyio
+async def test_only_close_spellings_resolve_to_a_timetable_city(planner):
+    assert await resolve_timetable_city(planner, "Rotterdm") == "Rotterdam"
+    assert await resolve_timetable_city(planner, "Xyzzyville") is None
+    # A country is not a city, even though the terminal search finds its terminals
+    assert await resolve_timetable_city(planner, "Germany") is None
+
+
+@pytest.mark.anyio
+async def test_plan_endpoint_rejects_unknown_cities(planner):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        unknown = await client.get(
+            "/api/plan", params={"from_city": "Rotterdam", "to_city": "Xyzzyville"}
+        )
+        country = await client.get(
+            "/api/plan", params={"from_city": "Italy", "to_city": "Rotterdam"}
+        )
+    assert unknown.status_code == 404
+    assert unknown.json()["detail"] == "Unknown city: Xyzzyville"
+    assert country.status_code == 404
+    assert country.json()["detail"] == "Unknown city: Italy"
+
+
+@pytest.mark.anyio
+async def test_missed_departure_waits_for_next_week(planner):
+    itinerary = planner.plan_cities("Rotterdam", "Milano", parse_minute_of_week(1, "09:00"))
+    assert _trains(itinerary) == ["r1"]
+    assert itinerary.to_dict()["departure"]["week_offset"] == 1
+
+
+@pytest.mark.anyio
+async def test_departures_snap_to_the_same_cached_plan(planner):
+    first = planner.plan_cities("Rotterdam", "Milano", parse_minute_of_week(1, "07:00"))
+    second = planner.plan_cities("Rotterdam", "Milano", parse_minute_of_week(1, "07:45"))
+    assert second is first
+    assert planner.stats()["cache_hits"] == 1
+
+
+def test_parse_route_question():
+    request = router.parse_route_question(
+        "What's the greenest route from Hamburg to Milano on Friday at 14:00?"
+    )
+    assert request["origin"] == "Hamburg"
+    assert request["destination"] == "Milano"
+    assert request["objective"] == "co2"
+    assert request["depart_at"] == parse_minute_of_week(5, "14:00")
+    assert router.parse_route_question("How many trains go from Rotterdam to Milano?") is None
+
+
+@pytest.mark.anyio
+async def test_workflow_answers_route_questions_without_sql(planner, monkeypatch):
+    async def no_sql(question, schema=None, examples=None, on_token=None, tier=None):
+        raise AssertionError("route questions should not reach SQL generation")
+
+    async def fake_markdown(question, results, on_token=None):
+        return "plan"
+
+    monkeypatch.setattr(graph, "generate_sql", no_sql)
+    monkeypatch.setattr(graph, "generate_markdown", fake_markdown)
+
+    state = await graph.workflow.ainvoke(
+        {"question": "How do I get from Rotterdam to Milano on Monday?"}
+    )
+    assert state["markdown"] == "plan"
+    assert state["query_results"][0]["from_terminal_uid"] == "t-rtm"
+    assert state["map_geojson"]["features"]
+
+
+@pytest.mark.anyio
+async def test_placeholder_trains_are_not_instant_connections(seeded_db):
+    # Placeholder rows: no transit time and a Monday 00:00 → 00:00 schedule
+    conn = sqlite3.connect(settings.database_path)
+    conn.execute(
+        "INSERT INTO trains (uid, from_terminal_uid, to_terminal_uid, departure_iso_weekday, "
+        "departure_time, arrival_iso_weekday, arrival_time, transit_hours, operator_name) "
+        "VALUES ('r0', 't-rtm', 't-mil', 1, '00:00', 1, '00:00', 0.0, 'Hupac Intermodal SA')"
+    )
+    conn.commit()
+    conn.close()
+    await load_terminal_registry()
+    planner = await load_planner()
+
+    assert planner.connection_count == 4
+    itinerary = planner.plan_cities("Rotterdam", "Milano", MONDAY_MIDNIGHT, "time")
+    assert _trains(itinerary) == ["r1"]
+
+
+def test_a_transfer_arrival_does_not_block_a_train_arrival():
+    registry = TerminalRegistry([
+        Terminal(uid, uid, uid, "Nowhere", 50.0, 8.0 + i / 100)
+        for i, uid in enumerate(["a", "b", "x", "y", "z"])
+    ])
+    connections = [
+        Connection("ab", "a", "b", 0, 60, 0.0, 10.0, "op"),
+        Connection("ax", "a", "x", 0, 120, 0.0, 10.0, "op"),
+        Connection("yz", "y", "z", 600, 60, 0.0, 10.0, "op"),
+    ]
+    transfers = [Transfer("b", "x", 30, 1.0), Transfer("x", "y", 30, 1.0)]
+    planner = RoutePlanner(connections, registry, transfers)
+
+    # x is first reached by transfer from b, which may not transfer on to y;
+    # the later train arrival at x still has to be expanded
+    itinerary = planner.plan(["a"], ["z"], 0)
+    assert _trains(itinerary) == ["ax", "yz"]
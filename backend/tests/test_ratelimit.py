@@ -0,0 +1,107 @@
+"""Tests for the GCRA rate limiter backends."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.config import settings
+from app.main import app
+from app.ratelimit import MemoryRateLimiter, SQLiteRateLimiter, close_rate_limiter
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def limiter(request, tmp_path):
+    clock = Clock()
+    if request.param == "memory":
+        limiter = MemoryRateLimiter(clock=clock)
+    else:
+        limiter = SQLiteRateLimiter(str(tmp_path / "limits.db"), clock=clock)
+    yield limiter, clock
+    limiter.close()
+
+
+def test_burst_then_steady_rate(limiter):
+    limiter, clock = limiter
+    # 60 rpm with a burst of 3: three at once, then one per second
+    assert [limiter.check("ip:a", 60, 3).allowed for _ in range(4)] == [True] * 3 + [False]
+    assert limiter.check("ip:a", 60, 3).retry_after == pytest.approx(1.0)
+
+    clock.now += 1.0
+    assert limiter.check("ip:a", 60, 3).allowed
+    assert not limiter.check("ip:a", 60, 3).allowed
+    # Other clients have their own budget
+    assert limiter.check("ip:b", 60, 3).allowed
+
+    clock.now += 10.0
+    assert [limiter.check("ip:a", 60, 3).allowed for _ in range(4)] == [True] * 3 + [False]
+    assert limiter.stats()["limited"] == 4
+
+
+def test_concurrent_checks_never_exceed_the_burst(limiter):
+    limiter, _ = limiter
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        decisions = list(pool.map(lambda _: limiter.check("ip:a", 60, 5).allowed, range(200)))
+    assert decisions.count(True) == 5
+    stats = limiter.stats()
+    assert (stats["allowed"], stats["limited"]) == (5, 195)
+
+
+def test_memory_limiter_evicts_least_recent_keys():
+    limiter = MemoryRateLimiter(max_keys=2, clock=Clock())
+    for key in ("a", "b", "a", "c"):
+        limiter.check(key, 1, 1)
+    assert limiter.stats()["keys"] == 2
+    assert limiter.stats()["evictions"] == 1
+    # "a" was refused after "b" was last seen, so "b" went first and starts over
+    assert not limiter.check("a", 1, 1).allowed
+    assert limiter.check("b", 1, 1).allowed
+
+
+def test_sqlite_limiter_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "limits.db")
+    clock = Clock()
+    workers = [SQLiteRateLimiter(path, clock=clock) for _ in range(2)]
+    decisions = [workers[i % 2].check("ip:a", 60, 4).allowed for i in range(6)]
+    assert decisions == [True] * 4 + [False] * 2
+    for worker in workers:
+        worker.close()
+
+
+@pytest.mark.anyio
+async def test_api_keys_and_anonymous_ips_have_separate_limits(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_rpm", 1)
+    monkeypatch.setattr(settings, "rate_limit_key_rpm", 3)
+    close_rate_limiter()
+
+    async def statuses(client, n, headers=None):
+        # An empty body fails validation (422) after the limit is checked, so nothing runs
+        return [
+            (await client.post("/api/chat", json={}, headers=headers)).status_code
+            for _ in range(n)
+        ]
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        limited = await statuses(client, 2)
+        monkeypatch.setattr(settings, "api_secret_key", "secret")
+        keyed = await statuses(client, 4, {"X-API-Key": "secret"})
+        response = await client.post("/api/chat", json={}, headers={"X-API-Key": "secret"})
+    close_rate_limiter()
+
+    assert limited == [422, 429]
+    assert keyed == [422, 422, 422, 429]
+    assert int(response.headers["Retry-After"]) >= 1
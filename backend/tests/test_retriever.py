@@ -0,0 +1,81 @@
+"""Tests for the live schema retriever used by the SQL prompts."""
+
+import pytest
+
+from app.rag import retriever
+from app.rag.schema import STATIC_SCHEMA
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def schema(seeded_db, monkeypatch):
+    # Keep tests offline: count tokens with the estimate instead of tiktoken
+    monkeypatch.setattr(retriever, "_load_encoding", lambda: None)
+    monkeypatch.setattr(retriever, "_retriever", None)
+    return await retriever.load_schema_retriever()
+
+
+@pytest.mark.anyio
+async def test_reads_live_schema_without_fts_shadow_tables(schema):
+    assert list(schema.tables) == [
+        "terminals", "operators", "trains", "terminals_fts", "operators_fts",
+        "stats_country_pairs", "stats_city_pairs", "stats_operators", "stats_weekdays",
+    ]
+    columns = {c.name: c for c in schema.tables["trains"].columns}
+    assert columns["uid"].primary_key
+    assert columns["from_terminal_uid"].references == "terminals.uid"
+    assert columns["transit_hours"].description == "total transit time in hours"
+
+
+@pytest.mark.anyio
+async def test_selects_only_relevant_columns(schema):
+    selected = schema.select("Which routes save the most CO2?")
+    assert set(selected) == {"trains", "terminals_fts"}
+    assert "train_vs_truck_co2e_reduction_percent" in selected["trains"]
+    assert "from_terminal_city" in selected["trains"]
+    assert "hazardous_goods" not in selected["trains"]
+    assert "departure_day" not in selected["trains"]
+
+    selected = schema.select("List terminals in Germany")
+    assert set(selected) == {"terminals", "terminals_fts"}
+
+    selected = schema.select("Which trains accept hazardous goods on Friday?")
+    assert {"hazardous_goods", "departure_day"} <= selected["trains"]
+
+
+@pytest.mark.anyio
+async def test_aggregate_questions_get_the_summary_tables(schema):
+    selected = schema.select("Which operator saves the most CO2?")
+    assert "stats_operators" in selected
+    assert "co2_saved_ton" in selected["stats_operators"]
+    assert "stats_country_pairs" not in selected
+
+    selected = schema.select("Average transit time from Germany to Italy")
+    assert {"stats_country_pairs", "stats_city_pairs"} <= set(selected)
+    assert "stats_weekdays" not in selected
+
+    assert "stats_weekdays" in schema.select("How many trains leave on each weekday?")
+    assert not any(t.startswith("stats_") for t in schema.select("Fastest trains to Basel"))
+
+
+@pytest.mark.anyio
+async def test_rendering_is_compact_and_cached_per_class(schema):
+    text = schema.retrieve("Fastest trains from Rotterdam to Milano")
+    assert "transit_hours REAL — total transit time in hours" in text
+    assert "container20" not in text
+    assert schema.retrieve("Fastest trains from Basel to Köln") == text
+
+    stats = schema.stats()
+    assert stats["cached_classes"] == 1
+    assert stats["retrievals"] == 2
+    assert stats["avg_schema_tokens"] < stats["full_schema_tokens"] / 2
+
+
+@pytest.mark.anyio
+async def test_static_schema_until_loaded(monkeypatch):
+    monkeypatch.setattr(retriever, "_retriever", None)
+    assert await retriever.retrieve_schema("anything") == STATIC_SCHEMA
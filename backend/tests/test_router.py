@@ -0,0 +1,104 @@
+"""Tests for the intent router and its template queries."""
+
+import pytest
+
+from app.db import execute_parameterized
+from app.geo.terminals import load_terminal_registry
+from app.workflow import graph
+from app.workflow.router import (
+    PLAN_ROUTE,
+    build_query,
+    match_intent,
+    resolve_city,
+    resolve_country,
+)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def registry(seeded_db):
+    return await load_terminal_registry()
+
+
+def test_match_intent():
+    intent = match_intent("Show me all trains from Rotterdam to Milan operated by Hupac?")
+    assert intent.name == "trains"
+    assert intent.slots == {"origin": "Rotterdam", "destination": "Milan", "operator": "Hupac"}
+
+    assert match_intent("List terminals in the Netherlands").slots == {"place": "Netherlands"}
+    assert match_intent("greenest routes from Köln").slots == {"origin": "Köln"}
+    assert match_intent("How do I get from Rotterdam to Milano?").name == PLAN_ROUTE
+    assert match_intent("How many trains go from Rotterdam to Milano each week?") is None
+
+
+def test_route_questions_with_other_constraints_go_to_sql():
+    for question in (
+        "Is there a direct connection from Rotterdam to Verona?",
+        "Is there a connection from Rotterdam to Lyon with hazardous goods?",
+        "Which connection from Hamburg to Verona is cheapest?",
+        "Which route from Rotterdam to Milan has the most departures per week?",
+        "Best connection from Rotterdam to Verona by Hupac",
+    ):
+        assert match_intent(question) is None, question
+
+    intent = match_intent("Route from Duisburg to Frankfurt am Main with the fewest changes")
+    assert intent.name == PLAN_ROUTE
+    assert (intent.slots["destination"], intent.slots["objective"]) == (
+        "Frankfurt am Main", "legs",
+    )
+
+
+@pytest.mark.anyio
+async def test_templates_resolve_entities_and_run(registry):
+    sql, params = await build_query(match_intent("trains from rotterdam to Milan"))
+    rows = await execute_parameterized(sql, params)
+    assert [row["uid"] for row in rows] == ["r1"]
+
+    sql, params = await build_query(match_intent("Which are the greenest routes from Rotterdam"))
+    rows = await execute_parameterized(sql, params)
+    assert [row["uid"] for row in rows] == ["r1", "r2"]
+
+    sql, params = await build_query(match_intent("terminals in switzerland"))
+    rows = await execute_parameterized(sql, params)
+    assert [row["city"] for row in rows] == ["Basel"]
+
+
+@pytest.mark.anyio
+async def test_places_resolve_to_filters_that_keep_the_user_spelling(registry):
+    # Filters match the spelling and its alias, so a data spelling is never dropped
+    assert await resolve_city("Cologne") == "Cologne"
+    sql, params = await build_query(match_intent("trains from Cologne to Basel"))
+    assert {"%cologne%", "%koln%"} <= set(params)
+    assert [row["uid"] for row in await execute_parameterized(sql, params)] == ["r3"]
+
+    assert await resolve_country("SWITZERLAND") == "Switzerland"
+    assert registry.countries["netherlands"] == "Netherlands"
+
+
+@pytest.mark.anyio
+async def test_unknown_entities_fall_back_to_the_llm(registry):
+    assert await build_query(match_intent("trains from Atlantis to Milano")) is None
+    assert await build_query(match_intent("trains from Basel to Milano by Nobody")) is None
+    assert await build_query(match_intent("terminals in Narnia")) is None
+
+
+@pytest.mark.anyio
+async def test_workflow_skips_sql_generation_for_templates(registry, monkeypatch):
+    async def no_sql(question, schema=None, examples=None, on_token=None, tier=None):
+        raise AssertionError("template questions should not reach SQL generation")
+
+    async def fake_markdown(question, results, on_token=None):
+        return "trains"
+
+    monkeypatch.setattr(graph, "generate_sql", no_sql)
+    monkeypatch.setattr(graph, "generate_markdown", fake_markdown)
+
+    state = await graph.workflow.ainvoke({"question": "Trains from Köln to Basel"})
+    assert state["intent"] == "trains"
+    assert state["sql_params"][-1] == 50
+    assert [row["uid"] for row in state["query_results"]] == ["r3"]
+    assert state["markdown"] == "trains"
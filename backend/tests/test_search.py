@@ -0,0 +1,100 @@
+"""Tests for the trigram-indexed lookups and data endpoint filters."""
+
+import sqlite3
+
+import pytest
+from fastapi import Response
+
+from app.config import settings
+from app.db import execute_parameterized
+from app.queries import routes_query
+from app.routes.data import list_routes, list_terminals
+from app.search import (
+    fold_term,
+    fold_terms,
+    fuzzy_match_expression,
+    search_operators,
+    search_terminals,
+)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def test_fold_term():
+    assert fold_term(" Köln ") == "koln"
+    assert fold_term("Cologne") == "koln"
+    assert fold_term("Milan") == "milano"
+
+
+def test_fuzzy_match_expression():
+    assert fuzzy_match_expression("Bâle") == '"ase" OR "bas" OR "sel"'
+    assert fuzzy_match_expression("ro") is None
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_search_terminals_substring_and_fuzzy():
+    assert [r["uid"] for r in await search_terminals("otterd")] == ["t-rtm"]
+    assert [r["uid"] for r in await search_terminals("cologne")] == ["t-kln"]
+    # Misspelling falls back to trigram-overlap ranking
+    assert (await search_terminals("Rotterdm"))[0]["uid"] == "t-rtm"
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_search_operators():
+    assert [r["uid"] for r in await search_operators("hupak")] == ["o-hup"]
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_endpoint_filters_use_index_lookups():
+    unfiltered = {"from_country": None, "to_country": None, "cargo": None, "cursor": None}
+    routes = await list_routes(
+        Response(), from_city="Rotterdam", to_city="Milan", operator=None, limit=50, **unfiltered
+    )
+    assert [r["uid"] for r in routes] == ["r1"]
+    routes = await list_routes(
+        Response(), from_city=None, to_city=None, operator="naviland", limit=50, **unfiltered
+    )
+    assert [r["uid"] for r in routes] == ["r2"]
+    terminals = await list_terminals(
+        Response(), country="germany", city=None, limit=100, cursor=None
+    )
+    assert [t["uid"] for t in terminals] == ["t-kln"]
+
+
+@pytest.mark.anyio
+async def test_filters_match_every_spelling_the_data_uses(seeded_db):
+    # The real data has trains from both "Antwerp" and "Antwerpen", and "Cologne"
+    # would otherwise be replaced by its alias "koln"
+    conn = sqlite3.connect(settings.database_path)
+    for uid, city in (("t-ant", "Antwerp"), ("t-antw", "Antwerpen"), ("t-cgn", "Cologne")):
+        conn.execute(
+            "INSERT INTO terminals VALUES (?, ?, ?, 4.4, 51.2, 'Belgium')", (uid, city, city)
+        )
+        conn.execute(
+            "INSERT INTO terminals_fts (uid, name, city, country) VALUES (?, ?, ?, 'belgium')",
+            (uid, city.lower(), city.lower()),
+        )
+        conn.execute(
+            "INSERT INTO trains (uid, from_terminal_uid, to_terminal_uid, from_terminal_city) "
+            "VALUES (?, ?, 't-mil', ?)",
+            (f"r-{uid}", uid, city),
+        )
+    conn.commit()
+    conn.close()
+
+    assert fold_terms("Cologne") == ["cologne", "koln"]
+    for city, expected in (
+        ("Antwerp", ["r-t-ant", "r-t-antw"]),
+        ("Anvers", ["r-t-ant", "r-t-antw"]),
+        ("Antwerpen", ["r-t-antw"]),
+        ("Cologne", ["r-t-cgn", "r2", "r3"]),
+    ):
+        rows = await execute_parameterized(*routes_query(from_city=city, to_city=None))
+        rows += await execute_parameterized(*routes_query(to_city=city))
+        assert sorted(r["uid"] for r in rows) == expected, city
@@ -0,0 +1,90 @@
+"""Tests for coalescing identical in-flight chat questions."""
+
+import asyncio
+
+import pytest
+
+from app.models import ChatRequest
+from app.routes import chat
+from app.singleflight import SingleFlight
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+async def _collect(events) -> list:
+    return [event async for event in events]
+
+
+@pytest.mark.anyio
+async def test_late_subscribers_catch_up_then_follow_live():
+    flights = SingleFlight()
+    release = asyncio.Event()
+    runs = []
+
+    async def produce():
+        runs.append(1)
+        yield "first"
+        await release.wait()
+        yield "second"
+
+    early = asyncio.create_task(_collect(flights.stream("q", produce)))
+    await asyncio.sleep(0.01)
+    late = asyncio.create_task(_collect(flights.stream("q", produce)))
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await early == await late == ["first", "second"]
+    assert runs == [1]
+    assert flights.stats() == {
+        "in_flight": 0, "started": 1, "coalesced": 1, "coalesced_rate": 0.5,
+    }
+
+
+@pytest.mark.anyio
+async def test_run_is_cancelled_when_every_subscriber_leaves():
+    flights = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def produce():
+        try:
+            yield "first"
+            await asyncio.sleep(10)
+        finally:
+            cancelled.set()
+
+    events = flights.stream("q", produce)
+    assert await anext(events) == "first"
+    await events.aclose()
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    await asyncio.sleep(0)
+    assert flights.stats()["in_flight"] == 0
+
+
+@pytest.mark.anyio
+async def test_identical_chat_questions_share_one_workflow(monkeypatch):
+    runs = []
+
+    async def fake_run(user_message, thread_id):
+        runs.append(user_message)
+        await asyncio.sleep(0.02)
+        yield {"event": "data", "data": "answer"}
+        yield {"event": "done", "data": "complete"}
+
+    monkeypatch.setattr(chat, "_run_workflow", fake_run)
+    monkeypatch.setattr(chat, "flights", SingleFlight())
+
+    def ask(text):
+        request = ChatRequest(messages=[{"role": "user", "content": text}])
+        return _collect(chat._stream_response(request))
+
+    first, second, _ = await asyncio.gather(
+        ask("Show me trains from Rotterdam to Milan"),
+        ask("trains from rotterdam to milano!"),
+        ask("terminals in Germany"),
+    )
+    assert first == second
+    assert first[-1]["event"] == "done"
+    assert len(runs) == 2
@@ -0,0 +1,65 @@
+"""Tests for the grid spatial index and the nearby/bbox terminal endpoints."""
+
+import random
+
+import pytest
+
+from app.geo.spatial import SpatialIndex, haversine_km
+from app.geo.terminals import Terminal, load_terminal_registry
+from app.routes.data import nearby_terminals, terminals_in_bbox
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _random_terminals(n: int) -> list[Terminal]:
+    rng = random.Random(8)
+    return [
+        Terminal(f"t{i}", f"T{i}", f"C{i}", "X", rng.uniform(36, 60), rng.uniform(-9, 28))
+        for i in range(n)
+    ]
+
+
+TERMINALS = _random_terminals(800)
+INDEX = SpatialIndex(TERMINALS)
+
+
+def _brute_force(lat: float, lon: float) -> list[tuple[float, str]]:
+    return sorted((haversine_km(lat, lon, t.latitude, t.longitude), t.uid) for t in TERMINALS)
+
+
+@pytest.mark.parametrize("point", [(47.56, 7.59), (51.9, 4.4), (60.5, 28.5), (30.0, -20.0)])
+def test_nearest_matches_brute_force(point):
+    expected = [uid for _, uid in _brute_force(*point)[:7]]
+    assert [t.uid for t, _ in INDEX.nearest(*point, k=7)] == expected
+
+
+def test_radius_queries_match_brute_force():
+    lat, lon = 48.2, 16.4
+    expected = [uid for km, uid in _brute_force(lat, lon) if km <= 150]
+    assert [t.uid for t, _ in INDEX.within(lat, lon, 150)] == expected
+    assert [t.uid for t, _ in INDEX.nearest(lat, lon, k=1000, max_km=150)] == expected
+
+
+def test_bbox_matches_brute_force():
+    hits = INDEX.in_bbox(45.0, 5.0, 48.0, 10.0)
+    expected = {t.uid for t in TERMINALS if 45 <= t.latitude <= 48 and 5 <= t.longitude <= 10}
+    assert {t.uid for t in hits} == expected
+    assert len(INDEX.in_bbox(-90, -180, 90, 180)) == len(TERMINALS)
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_nearby_and_bbox_endpoints():
+    await load_terminal_registry()
+    rows = await nearby_terminals(lat=None, lon=None, near="Bâle", k=2, radius_km=None)
+    assert [r["uid"] for r in rows] == ["t-bsl", "t-mil"]
+    assert rows[0]["distance_km"] == 0
+
+    rows = await nearby_terminals(lat=51.0, lon=7.0, near=None, k=10, radius_km=100)
+    assert [r["uid"] for r in rows] == ["t-kln"]
+
+    rows = await terminals_in_bbox(min_lat=47, min_lon=4, max_lat=52, max_lon=8, limit=10)
+    assert [r["city"] for r in rows] == ["Basel", "Köln", "Rotterdam"]
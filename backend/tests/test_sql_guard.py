@@ -0,0 +1,105 @@
+"""Tests for validation and row limits on generated SQL."""
+
+import pytest
+
+from app import sql_guard
+from app.config import settings
+from app.sql_guard import QueryRejectedError, enforce_limit, load_sql_guard
+from app.workflow import graph
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def guard(seeded_db, monkeypatch):
+    # The sample tables are tiny, so treat anything over two rows as large
+    monkeypatch.setattr(settings, "chat_query_max_scan_rows", 2)
+    monkeypatch.setattr(settings, "chat_query_limit", 100)
+    # Unloaded again afterwards, so later tests without a database skip it
+    monkeypatch.setattr(sql_guard, "_guard", None)
+    return await load_sql_guard()
+
+
+def test_enforce_limit():
+    assert enforce_limit("SELECT * FROM trains;", 100) == (
+        "SELECT * FROM trains LIMIT 100", "injected"
+    )
+    assert enforce_limit("SELECT 1 -- note", 100)[0] == "SELECT 1 LIMIT 100"
+    assert enforce_limit("SELECT 1 LIMIT 5000", 100) == ("SELECT 1 LIMIT 100", "clamped")
+    assert enforce_limit("SELECT 1 LIMIT -1 OFFSET 5", 100)[0] == "SELECT 1 LIMIT 100 OFFSET 5"
+    assert enforce_limit("SELECT 1 LIMIT 5, 20", 100) == ("SELECT 1 LIMIT 5, 20", None)
+    # Limits in subqueries and strings don't count
+    sql = "SELECT * FROM (SELECT uid FROM trains LIMIT 5) WHERE uid != 'LIMIT 3'"
+    assert enforce_limit(sql, 100)[0] == f"{sql} LIMIT 100"
+    assert enforce_limit("SELECT 1 LIMIT 10 * 10", 100)[0] == (
+        "SELECT * FROM (SELECT 1 LIMIT 10 * 10) LIMIT 100"
+    )
+
+
+def test_only_single_select_statements():
+    for sql in (
+        "DELETE FROM trains",
+        "DROP TABLE trains",
+        "INSERT INTO trains VALUES (1)",
+        "PRAGMA table_info(trains)",
+    ):
+        with pytest.raises(QueryRejectedError) as rejected:
+            enforce_limit(sql, 100)
+        assert rejected.value.retryable is False
+    with pytest.raises(QueryRejectedError):
+        enforce_limit("", 100)
+    with pytest.raises(QueryRejectedError, match="single statement") as rejected:
+        enforce_limit("SELECT 1; DROP TABLE trains", 100)
+    assert rejected.value.retryable is False
+
+
+@pytest.mark.anyio
+async def test_guard_accepts_indexed_queries(guard):
+    sql = (
+        "SELECT t.uid, o.name FROM trains t JOIN operators o ON o.uid = t.operator_uid "
+        "WHERE t.from_terminal_uid IN (SELECT uid FROM terminals_fts WHERE city LIKE '%rot%')"
+    )
+    assert guard.check(sql) == f"{sql} LIMIT 100"
+    guard.check("SELECT COUNT(*) FROM terminals_fts WHERE terminals_fts MATCH 'basel'")
+    assert guard.stats()["limits_injected"] == 2
+
+
+@pytest.mark.anyio
+async def test_guard_rejects_unknown_names_and_writes(guard):
+    with pytest.raises(QueryRejectedError, match="no such column"):
+        guard.check("SELECT created FROM trains")
+    with pytest.raises(QueryRejectedError, match="not available"):
+        guard.check("SELECT name FROM sqlite_master")
+    with pytest.raises(QueryRejectedError, match="not available"):
+        guard.check("SELECT block FROM terminals_fts_data")
+    with pytest.raises(QueryRejectedError) as rejected:
+        guard.check("WITH doomed AS (SELECT uid FROM trains) DELETE FROM trains")
+    assert rejected.value.retryable is False
+    assert guard.stats()["rejected"] == 4
+
+
+@pytest.mark.anyio
+async def test_guard_rejects_full_scans_inside_joins(guard):
+    with pytest.raises(QueryRejectedError, match="scan all 4 rows of trains"):
+        guard.check("SELECT a.uid FROM trains AS a, trains b WHERE a.distance < b.distance")
+    # An equality join gets an automatic index, so it's allowed
+    guard.check("SELECT a.uid FROM trains a JOIN trains b ON a.distance = b.distance")
+
+
+@pytest.mark.anyio
+async def test_writes_fail_without_a_fix_attempt(guard, monkeypatch):
+    async def delete_everything(question, schema=None, examples=None, on_token=None, tier=None):
+        return "DELETE FROM trains"
+
+    async def no_fix(sql, error, schema=None):
+        raise AssertionError("writes should not be sent back for fixing")
+
+    monkeypatch.setattr(graph, "generate_sql", delete_everything)
+    monkeypatch.setattr(graph, "fix_sql", no_fix)
+
+    state = await graph.workflow.ainvoke({"question": "Remove all trains"})
+    assert state["sql_retryable"] is False
+    assert "only read" in state["markdown"]
@@ -0,0 +1,70 @@
+"""Tests for the summary tables and the stats endpoint."""
+
+import sqlite3
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from data.seed import BUILD_STATS_SQL, STATS_TABLES
+from tests.conftest import build_test_db
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _snapshot(conn: sqlite3.Connection) -> dict[str, list]:
+    return {
+        table: sorted(conn.execute(f"SELECT * FROM {table}").fetchall(), key=repr)
+        for table in STATS_TABLES
+    }
+
+
+def test_triggers_keep_summaries_equal_to_a_rebuild(tmp_path):
+    path = tmp_path / "stats.db"
+    build_test_db(path)
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM trains WHERE uid = 'r2'")
+    conn.execute(
+        "INSERT INTO trains (uid, from_terminal_city, to_terminal_city, from_terminal_country, "
+        "to_terminal_country, operator_uid, operator_name, departure_iso_weekday, "
+        "departure_day, transit_hours, total_distance) "
+        "VALUES ('r5', 'Basel', 'Köln', 'Switzerland', 'Germany', 'o-nav', "
+        "'Naviland Cargo SA', 3, 'Wednesday', 9.0, 480.0), "
+        "('r6', 'Rotterdam', 'Milano', 'Netherlands', 'Italy', 'o-hup', "
+        "'Hupac Intermodal SA', 1, 'Monday', 0.0, 1100.0)"
+    )
+    conn.execute("UPDATE trains SET transit_hours = 40.0, operator_uid = 'o-nav' WHERE uid = 'r1'")
+    incremental = _snapshot(conn)
+    conn.executescript(BUILD_STATS_SQL)
+    assert incremental == _snapshot(conn)
+
+    (row,) = conn.execute(
+        "SELECT trains, operators, min_transit_hours, avg_transit_hours, max_transit_hours "
+        "FROM stats_country_pairs WHERE from_terminal_country = 'Netherlands'"
+    ).fetchall()
+    assert row == (2, 2, 40.0, 40.0, 40.0)
+    conn.close()
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_stats_endpoint_reads_the_summaries():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        operators = (await client.get("/api/stats", params={"by": "operators"})).json()
+        pairs = await client.get(
+            "/api/stats",
+            params={"by": "city_pairs", "from_country": "netherlands", "order": "fastest"},
+        )
+        refused = await client.get("/api/stats", params={"by": "weekdays", "to_country": "Italy"})
+
+    assert [(o["operator_name"], o["trains"]) for o in operators] == [
+        ("Hupac Intermodal SA", 3),
+        ("Naviland Cargo SA", 1),
+    ]
+    assert operators[0]["avg_distance_km"] == 636.7
+    assert [p["to_terminal_city"] for p in pairs.json()] == ["Köln", "Milano"]
+    assert refused.status_code == 422
@@ -0,0 +1,112 @@
+"""Tests for workflow tracing and the metrics endpoint."""
+
+import json
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app import telemetry
+from app.main import app
+from app.routes import chat
+from app.workflow import graph
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def exported(tmp_path, monkeypatch):
+    """Export traces to a file for the test; returns a reader for the exported spans."""
+    path = tmp_path / "traces.jsonl"
+    exporter = telemetry.TraceExporter(str(path))
+    monkeypatch.setattr(telemetry, "_exporter", exporter)
+
+    def spans() -> list[dict]:
+        exporter._file.flush()
+        return [
+            span
+            for line in path.read_text().splitlines()
+            for span in json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        ]
+
+    return spans
+
+
+@pytest.mark.anyio
+async def test_chat_run_is_exported_as_one_trace(seeded_db, exported, monkeypatch):
+    async def fake_sql(question, schema=None, examples=None, on_token=None, tier=None):
+        return "SELECT city, country FROM terminals"
+
+    async def fake_markdown(question, results, on_token=None):
+        return "Four terminals."
+
+    async def fake_chart(question, results, rows=None):
+        return None
+
+    monkeypatch.setattr(graph, "generate_sql", fake_sql)
+    monkeypatch.setattr(graph, "generate_markdown", fake_markdown)
+    monkeypatch.setattr(graph, "build_chart", lambda question, results: None)
+    monkeypatch.setattr(graph, "generate_chart", fake_chart)
+
+    events = [event async for event in chat._run_workflow("which terminals?", None)]
+    assert events[-1]["event"] == "done"
+
+    spans = {span["name"]: span for span in exported()}
+    root = spans["chat"]
+    assert "parentSpanId" not in root
+    assert {span["traceId"] for span in spans.values()} == {root["traceId"]}
+    attributes = {a["key"]: a["value"] for a in root["attributes"]}
+    assert attributes["chat.outcome"] == {"stringValue": "ok"}
+    assert "chat.first_event_ms" in attributes
+
+    execute = spans["node execute_sql"]
+    assert execute["parentSpanId"] == root["spanId"]
+    (query,) = [s for s in exported() if s.get("parentSpanId") == execute["spanId"]]
+    assert query["name"] == "db.query"
+    assert {"key": "db.rows", "value": {"intValue": "4"}} in query["attributes"]
+    assert {"node generate_sql", "node format_markdown", "node format_chart"} <= set(spans)
+
+
+def test_llm_calls_become_child_spans(exported):
+    with telemetry.span("chat", root=True):
+        with telemetry.span("node format_markdown"):
+            telemetry.record_llm_call("gpt-4o-mini", 0.25, 120, 30)
+
+    spans = {span["name"]: span for span in exported()}
+    llm = spans["llm gpt-4o-mini"]
+    assert llm["parentSpanId"] == spans["node format_markdown"]["spanId"]
+    duration = int(llm["endTimeUnixNano"]) - int(llm["startTimeUnixNano"])
+    assert duration == pytest.approx(0.25e9, rel=0.01)
+    assert {"key": "gen_ai.usage.input_tokens", "value": {"intValue": "120"}} in llm["attributes"]
+
+
+def test_spans_outside_a_trace_are_not_exported(exported):
+    with telemetry.span("db.query"):
+        pass
+    assert exported() == []
+
+
+@pytest.mark.anyio
+async def test_metrics_endpoint_renders_prometheus_text(seeded_db):
+    telemetry.SQL_RETRIES.inc()
+    telemetry.NODE_SECONDS.observe(0.02, node="execute_sql", status="ok")
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert "# TYPE fr8_workflow_node_seconds histogram" in lines
+    assert any(
+        line.startswith('fr8_workflow_node_seconds_bucket{node="execute_sql",status="ok",le="0.025"}')
+        for line in lines
+    )
+    assert any(line.startswith("fr8_sql_retries_total ") for line in lines)
+    assert "# TYPE fr8_db_pool_size gauge" in lines
+    assert "fr8_db_pool_size 4" in lines
+    assert "# TYPE fr8_db_pool_acquisitions_total counter" in lines
+    assert not any(line.startswith("fr8_db_pool_acquisitions ") for line in lines)
@@ -0,0 +1,122 @@
+"""Tests for clustered map tiles and the tile endpoint."""
+
+import asyncio
+import json
+import sqlite3
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.config import settings
+from app.geo import tiles
+from app.geo.terminals import Terminal, TerminalRegistry, load_terminal_registry
+from app.geo.tiles import Corridor, TileSet, mercator
+from app.main import app
+
+REGISTRY = TerminalRegistry([
+    Terminal("t1", "Rotterdam RSC", "Rotterdam", "Netherlands", 51.88, 4.38),
+    Terminal("t2", "Rotterdam Maasvlakte", "Rotterdam", "Netherlands", 51.95, 4.03),
+    Terminal("t3", "Milano Smistamento", "Milano", "Italy", 45.50, 9.20),
+])
+CORRIDORS = [Corridor("t1", "t3", 5, 2), Corridor("t2", "t3", 3, 1), Corridor("t1", "t2", 1, 1)]
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _tile_of(lat: float, lon: float, z: int) -> tuple[int, int]:
+    x, y = mercator(lat, lon)
+    return int(x * 2**z), int(y * 2**z)
+
+
+def _features(tile_set: TileSet, z: int, lat: float, lon: float) -> list[dict]:
+    return json.loads(tile_set.tile(z, *_tile_of(lat, lon, z)).body)["features"]
+
+
+def test_low_zoom_merges_terminals_and_corridors():
+    tile_set = TileSet(REGISTRY, CORRIDORS)
+    features = _features(tile_set, 4, 51.9, 4.2)
+    clusters = [f["properties"] for f in features if f["properties"]["kind"] == "cluster"]
+    lines = [f["properties"] for f in features if f["properties"]["kind"] == "corridor"]
+    assert clusters == [{"kind": "cluster", "count": 2, "cities": ["Rotterdam"], "city_count": 1}]
+    # Both Rotterdam → Milano corridors merge; the intra-cluster one disappears
+    assert lines == [{"kind": "corridor", "trains": 8, "corridors": 2, "operators": 2}]
+
+
+def test_corridors_are_drawn_only_on_tiles_they_cross():
+    tile_set = TileSet(REGISTRY, CORRIDORS)
+    # Rotterdam → Milano runs south-east: the tile at Milano's latitude and
+    # Rotterdam's longitude is inside its bounding box but off the line
+    z = 7
+    (mx, my), (rx, ry) = _tile_of(45.5, 9.2, z), _tile_of(51.9, 4.2, z)
+    assert rx < mx and ry < my
+    off_line = _features(tile_set, z, 45.5, 4.2)
+    assert not any(f["properties"]["kind"] == "corridor" for f in off_line)
+    on_line = _features(tile_set, z, 48.7, 6.7)
+    assert any(f["properties"]["kind"] == "corridor" for f in on_line)
+
+
+def test_high_zoom_shows_individual_terminals():
+    tile_set = TileSet(REGISTRY, CORRIDORS)
+    features = _features(tile_set, 12, 51.88, 4.38)
+    points = [f["properties"]["uid"] for f in features if f["properties"]["kind"] == "terminal"]
+    assert points == ["t1"]
+    assert tile_set.stats()["misses"] == 1
+
+
+def test_precompute_serves_low_zoom_from_memory():
+    tile_set = TileSet(REGISTRY, CORRIDORS)
+    assert tile_set.precompute(3) > 0
+    tile_set.tile(3, *_tile_of(45.5, 9.2, 3))
+    assert tile_set.stats()["hits"] == 1
+    assert tile_set.stats()["misses"] == 0
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_tile_endpoint_etags(monkeypatch):
+    monkeypatch.setattr(tiles, "_tiles", None)
+    await load_terminal_registry()
+    x, y = _tile_of(51.88, 4.38, 5)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get(f"/api/tiles/5/{x}/{y}")
+        assert response.status_code == 200
+        assert response.headers["cache-control"].startswith("public, max-age=")
+        assert response.json()["features"]
+
+        etag = response.headers["etag"]
+        cached = await client.get(f"/api/tiles/5/{x}/{y}", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.headers["etag"] == etag
+
+        assert (await client.get("/api/tiles/2/4/0")).status_code == 404
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("seeded_db")
+async def test_concurrent_requests_rebuild_a_reseeded_tile_set_once(monkeypatch):
+    monkeypatch.setattr(tiles, "_tiles", None)
+    await load_terminal_registry()
+    first = await tiles.get_tiles()
+    conn = sqlite3.connect(settings.database_path)
+    conn.execute("PRAGMA user_version = 2")
+    conn.commit()
+    conn.close()
+
+    loads = 0
+    load_tiles = tiles.load_tiles
+
+    async def counted():
+        nonlocal loads
+        loads += 1
+        return await load_tiles()
+
+    monkeypatch.setattr(tiles, "load_tiles", counted)
+    monkeypatch.setattr(settings, "data_version_check_seconds", 0.0)
+    rebuilt = await asyncio.gather(*(tiles.get_tiles() for _ in range(5)))
+    assert loads == 1
+    assert {id(t) for t in rebuilt} == {id(rebuilt[0])}
+    assert rebuilt[0] is not first and rebuilt[0].data_version == 2
@@ -0,0 +1,130 @@
+"""Tests for the LangGraph workflow routing and formatting branches."""
+
+import asyncio
+import json
+
+import pytest
+
+from app.config import settings
+from app.routes import chat
+from app.workflow import graph
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def _fake_sql(monkeypatch):
+    """Replace SQL generation and execution with canned results."""
+
+    async def fake_generate_sql(question, schema=None, examples=None, on_token=None, tier=None):
+        return "SELECT city, latitude, longitude FROM terminals LIMIT 2"
+
+    async def fake_execute_query(sql):
+        return [
+            {"city": "Basel", "latitude": 47.56, "longitude": 7.59},
+            {"city": "Duisburg", "latitude": 51.43, "longitude": 6.76},
+        ]
+
+    monkeypatch.setattr(graph, "generate_sql", fake_generate_sql)
+    monkeypatch.setattr(graph, "execute_query", fake_execute_query)
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("_fake_sql")
+async def test_formatters_stream_independently(monkeypatch):
+    """Each formatter branch is emitted as it finishes; failures are isolated."""
+
+    async def fast_map(question, results):
+        return {"type": "FeatureCollection", "features": []}
+
+    async def slow_markdown(question, results, on_token=None):
+        await asyncio.sleep(0.05)
+        return "summary"
+
+    async def broken_chart(question, results, rows=None):
+        raise ValueError("bad json")
+
+    monkeypatch.setattr(graph, "generate_map", fast_map)
+    monkeypatch.setattr(graph, "generate_markdown", slow_markdown)
+    monkeypatch.setattr(graph, "generate_chart", broken_chart)
+
+    order = []
+    async for event in graph.workflow.astream({"question": "q"}, stream_mode="updates"):
+        order.extend(event)
+
+    assert order.index("format_map") < order.index("format_markdown")
+    assert "format_chart" in order
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("_fake_sql")
+async def test_formatter_timeout(monkeypatch):
+    """A formatter exceeding its timeout yields no output instead of failing."""
+    monkeypatch.setattr(settings, "format_timeout_seconds", 0.01)
+
+    async def hanging(question, results, rows=None, on_token=None):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(graph, "generate_chart", hanging)
+    monkeypatch.setattr(graph, "generate_map", hanging)
+    monkeypatch.setattr(graph, "generate_markdown", hanging)
+
+    state = await graph.workflow.ainvoke({"question": "q"})
+    assert state["chart"] is None
+    assert state["map_geojson"] is None
+    assert state["markdown"]
+
+
+@pytest.mark.anyio
+async def test_chat_streams_llm_tokens_as_they_arrive(monkeypatch):
+    async def streaming_sql(question, schema=None, examples=None, on_token=None, tier=None):
+        for token in ("SELECT city ", "FROM terminals"):
+            on_token(token)
+        return "SELECT city FROM terminals"
+
+    async def streaming_markdown(question, results, on_token=None):
+        for token in ("Two ", "terminals."):
+            on_token(token)
+        return "Two terminals."
+
+    async def fake_execute_query(sql):
+        return [{"city": "Basel"}, {"city": "Duisburg"}]
+
+    monkeypatch.setattr(graph, "generate_sql", streaming_sql)
+    monkeypatch.setattr(graph, "execute_query", fake_execute_query)
+    monkeypatch.setattr(graph, "generate_markdown", streaming_markdown)
+
+    events = [event async for event in chat._run_workflow("q", None)]
+    names = [event["event"] for event in events]
+    assert names[:3] == ["sql_delta", "sql_delta", "sql"]
+    assert json.loads(events[2]["data"])["sql"] == "SELECT city FROM terminals"
+    content = [json.loads(e["data"])["content"] for e in events if e["event"] == "data"]
+    assert content == ["Two ", "terminals."]
+    assert names[-1] == "done"
+
+
+@pytest.mark.anyio
+async def test_empty_results_from_the_small_model_escalate(monkeypatch):
+    tiers = []
+
+    async def tiered_sql(question, schema=None, examples=None, on_token=None, tier=None):
+        tiers.append(tier)
+        return f"SELECT '{tier}' AS city"
+
+    async def fake_execute_query(sql):
+        return [{"city": "Basel"}, {"city": "Köln"}] if "large" in sql else []
+
+    async def fake_markdown(question, results, on_token=None):
+        return "found"
+
+    monkeypatch.setattr(graph, "generate_sql", tiered_sql)
+    monkeypatch.setattr(graph, "execute_query", fake_execute_query)
+    monkeypatch.setattr(graph, "generate_markdown", fake_markdown)
+
+    state = await graph.workflow.ainvoke({"question": "q"})
+    assert tiers == ["small", "large"]
+    assert state["model_tier"] == "large"
+    assert len(state["query_results"]) == 2
@@ -96,6 +96,19 @@ export function useChat() {
                 return updated;
               });
             },
+            onSqlDelta: (text) => {
+              setMessages((prev) => {
+                const updated = [...prev];
+                const last = updated[updated.length - 1];
+                if (last.role === "assistant") {
+                  updated[updated.length - 1] = {
+                    ...last,
+                    sql: (last.sql || "") + text,
+                  };
+                }
+                return updated;
+              });
+            },
             onError: (error) => {
               setMessages((prev) => {
                 const updated = [...prev];
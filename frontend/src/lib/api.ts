@@ -10,6 +10,7 @@ export interface StreamCallbacks {
   onChart: (chart: unknown) => void;
   onMap: (geojson: unknown) => void;
   onSql: (sql: string) => void;
+  onSqlDelta: (content: string) => void;
   onError: (error: string) => void;
   onDone: () => void;
 }
@@ -84,6 +85,9 @@ export async function streamChat(
               case "sql":
                 callbacks.onSql(parsed.sql || "");
                 break;
+              case "sql_delta":
+                callbacks.onSqlDelta(parsed.content || "");
+                break;
               case "error":
                 callbacks.onError(parsed.error || "Unknown error");
                 break;